@@ -0,0 +1,405 @@
+"""按设备序列号共享的设备中心
+
+每个浏览器会话都会重新执行 main() 并创建自己的 DeviceView。设备中心让同一台
+设备的所有视图共享：
+    - 一个 Client（一次服务端部署、一次解码）
+    - 一次画面变化检测（解码线程中每帧执行一次，结果以内容版本号表示）
+    - 每个显示档位（编码后端 + 编码尺寸）一次编码，结果发布到帧服务的同一通道
+    - 直通流和分块流
+    - 输入通道：文本输入管线、滚动引擎和UHID键盘鼠标（UHID设备另按使用的视图引用计数）
+中心按订阅数引用计数，最后一个视图释放后停止 Client。显示档位记录使用它的视图，
+最后一个视图离开档位时删除档位及其帧服务通道。
+"""
+import base64
+import math
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from frame_change import FrameChangeDetector
+from frame_encoder import AdaptiveEncoder, AdaptiveQualityController, create_encoder
+from frame_server import FrameServer
+from tile_stream import TileStream, get_tile_stream, remove_tile_stream
+from video_passthrough import PassthroughStream, attach_passthrough, detach_passthrough
+
+# 添加scrcpy模块路径
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scrcpy'))
+from scrcpy.core import Client
+from scrcpy import uhid
+import scrcpy.const as const
+from scroll_engine import ScrollEngine
+from text_input import TextInputEngine
+
+
+# 编码宽度按该步长向上取整，布局相近的视图共用同一档位
+TIER_WIDTH_STEP = 32
+
+
+class EncodedFrame:
+    """某个档位编码后的一帧"""
+
+    def __init__(self, version: int, data: bytes, mime: str, seq: int = 0, url: Optional[str] = None):
+        self.version = version
+        self.data = data
+        self.mime = mime
+        self.seq = seq
+        self.url = url
+        self._base64: Optional[str] = None
+
+    @property
+    def base64(self) -> str:
+        """base64编码结果，多个base64模式的视图共用"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode('utf-8')
+        return self._base64
+
+
+class DisplayTier:
+    """显示档位：相同编码后端和编码尺寸的视图共用一次编码"""
+
+    def __init__(self, hub: "DeviceHub", encoder: str, adaptive_quality: bool, size: Tuple[int, int]):
+        self.hub = hub
+        self.size = size
+        self.encoder = AdaptiveEncoder(
+            create_encoder(encoder), AdaptiveQualityController() if adaptive_quality else None
+        )
+        self.channel = f"{hub.serial}@{size[0]}x{size[1]}-{self.encoder.encoder.name}"
+        self.lock = threading.Lock()
+        self.last: Optional[EncodedFrame] = None
+        self.encodes = 0
+        self.shared = 0
+
+    def encode(self, frame: np.ndarray, version: int) -> EncodedFrame:
+        """编码指定版本的画面，同一版本只编码一次"""
+        with self.lock:
+            if self.last is not None and self.last.version == version:
+                self.shared += 1
+                return self.last
+            width, height = self.size
+            if (width, height) != (frame.shape[1], frame.shape[0]):
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            data = self.encoder.encode(frame)
+            encoded = EncodedFrame(version, data, self.encoder.mime)
+            frame_server = self.hub.frame_server
+            if frame_server is not None:
+                encoded.seq = frame_server.publish(self.channel, data, self.encoder.mime)
+                encoded.url = frame_server.frame_url(self.channel, encoded.seq)
+            self.last = encoded
+            self.encodes += 1
+            return encoded
+
+
+class DeviceHub:
+    """单台设备的共享中心"""
+
+    def __init__(self, serial: str, frame_server: Optional[FrameServer] = None, **client_kwargs):
+        """
+        Args:
+            serial: 设备序列号
+            frame_server: 旁路帧服务，None表示只使用base64
+            **client_kwargs: 传给 Client 的参数
+        """
+        self.serial = serial
+        self.frame_server = frame_server
+        self.client = Client(device=serial, **client_kwargs)
+        self.lock = threading.Lock()
+        self.refcount = 0
+        # 需要解码帧的引用数，降为0时关闭解码（只剩直通视图）
+        self.decoders = 0
+        # 首个获取者启动客户端后置位，其他获取者等待启动完成或失败
+        self.started = threading.Event()
+        self.start_error: Optional[Exception] = None
+        self.subscribers: List[Callable[[np.ndarray, int], None]] = []
+        self.tiers: Dict[tuple, DisplayTier] = {}
+        # 视图 -> 所在档位，档位 -> 使用它的视图
+        self.viewer_tiers: Dict[int, tuple] = {}
+        self.tier_viewers: Dict[tuple, set] = {}
+        self.change_detector = FrameChangeDetector()
+        self.version = 0
+        self.passthrough: Optional[PassthroughStream] = None
+        self.tile_stream: Optional[TileStream] = None
+        self.tile_version = 0
+        self.tile_lock = threading.Lock()
+        # 共享的输入通道，首次使用时创建
+        self.text_input: Optional[TextInputEngine] = None
+        self.scroll_engine: Optional[ScrollEngine] = None
+        self.uhid_keyboard: Optional[uhid.UhidKeyboard] = None
+        self.uhid_mouse: Optional[uhid.UhidMouse] = None
+        self.uhid_refcount = 0
+
+        self.client.add_listener(const.EVENT_FRAME, self._on_frame)
+        self.client.add_listener(const.EVENT_PACKET, self.change_detector.note_packet)
+        self.client.add_listener(const.EVENT_DISCONNECT, self._on_disconnect)
+
+    def start(self):
+        self.client.start(threaded=True)
+
+    def _on_frame(self, frame):
+        """解码线程：检测一次画面变化，再分发给所有订阅的视图"""
+        if frame is None or frame.size == 0:
+            return
+        if self.change_detector.check(frame):
+            self.version += 1
+        version = self.version
+        for callback in list(self.subscribers):
+            try:
+                callback(frame, version)
+            except Exception as e:
+                print(f"❌ 帧分发失败: {e}")
+
+    def _on_disconnect(self):
+        with _hubs_lock:
+            if _hubs.get(self.serial) is self:
+                del _hubs[self.serial]
+
+    def subscribe(self, callback: Callable[[np.ndarray, int], None]):
+        """订阅解码帧，回调参数为 (帧, 内容版本号)，版本号不变表示画面未变化"""
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[np.ndarray, int], None]):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def tier_size(self, frame_width: int, frame_height: int, target_width: int) -> Tuple[int, int]:
+        """把目标宽度归入档位，返回编码尺寸"""
+        width = min(frame_width, max(TIER_WIDTH_STEP, math.ceil(target_width / TIER_WIDTH_STEP) * TIER_WIDTH_STEP))
+        return width, max(1, round(frame_height * width / frame_width))
+
+    def tier(self, encoder: str, adaptive_quality: bool, size: Tuple[int, int], viewer=None) -> DisplayTier:
+        """获取或创建显示档位
+
+        Args:
+            viewer: 使用该档位的视图，切换档位后旧档位没有其他视图时被删除
+        """
+        key = (encoder, adaptive_quality, size)
+        with self.lock:
+            tier = self.tiers.get(key)
+            if tier is None:
+                tier = DisplayTier(self, encoder, adaptive_quality, size)
+                self.tiers[key] = tier
+            if viewer is not None:
+                viewer_id = id(viewer)
+                previous = self.viewer_tiers.get(viewer_id)
+                if previous != key:
+                    if previous is not None:
+                        self._leave_tier(viewer_id, previous)
+                    self.viewer_tiers[viewer_id] = key
+                    self.tier_viewers.setdefault(key, set()).add(viewer_id)
+            return tier
+
+    def leave_tier(self, viewer):
+        """视图不再显示（断开或销毁）时调用"""
+        with self.lock:
+            key = self.viewer_tiers.pop(id(viewer), None)
+            if key is not None:
+                self._leave_tier(id(viewer), key)
+
+    def _leave_tier(self, viewer_id: int, key: tuple):
+        viewers = self.tier_viewers.get(key)
+        if viewers is None:
+            return
+        viewers.discard(viewer_id)
+        if viewers:
+            return
+        del self.tier_viewers[key]
+        tier = self.tiers.pop(key, None)
+        if tier is not None and self.frame_server is not None:
+            self.frame_server.remove_channel(tier.channel)
+
+    def get_text_input(self) -> TextInputEngine:
+        """共享的文本输入管线，所有视图的输入按顺序经同一缓冲发送"""
+        with self.lock:
+            if self.text_input is None:
+                self.text_input = TextInputEngine(self.client.control)
+            return self.text_input
+
+    def get_scroll_engine(self) -> ScrollEngine:
+        """共享的滚动引擎"""
+        with self.lock:
+            if self.scroll_engine is None:
+                self.scroll_engine = ScrollEngine(self.client.control)
+            return self.scroll_engine
+
+    def acquire_uhid(self) -> Tuple[uhid.UhidKeyboard, uhid.UhidMouse]:
+        """获取UHID键盘和鼠标（引用计数加一），第一个使用的视图在设备端创建"""
+        with self.lock:
+            if self.uhid_refcount == 0:
+                keyboard = uhid.UhidKeyboard(self.client.control)
+                keyboard.open()
+                mouse = uhid.UhidMouse(self.client.control)
+                try:
+                    mouse.open()
+                except Exception:
+                    keyboard.close()
+                    raise
+                self.uhid_keyboard, self.uhid_mouse = keyboard, mouse
+            self.uhid_refcount += 1
+            return self.uhid_keyboard, self.uhid_mouse
+
+    def release_uhid(self):
+        """释放UHID设备，最后一个使用的视图释放后在设备端销毁"""
+        with self.lock:
+            if self.uhid_refcount == 0:
+                return
+            self.uhid_refcount -= 1
+            if self.uhid_refcount > 0:
+                return
+        self._destroy_uhid()
+
+    def _destroy_uhid(self):
+        with self.lock:
+            devices = (self.uhid_keyboard, self.uhid_mouse)
+            self.uhid_keyboard = None
+            self.uhid_mouse = None
+        for device in devices:
+            if device is None:
+                continue
+            try:
+                device.close()
+            except Exception as e:
+                print(f"销毁UHID设备失败: {e}")
+
+    def require_decode(self):
+        """有视图需要解码帧时开启解码，并请求关键帧让解码器立即开始"""
+        with self.lock:
+            self.decoders += 1
+            if self.client.decode:
+                return
+            self.client.decode = True
+        if self.client.alive:
+            self.client.control.reset_video()
+
+    def _release_decode(self):
+        """最后一个需要解码的视图释放后关闭解码，直通流不受影响"""
+        with self.lock:
+            self.decoders = max(self.decoders - 1, 0)
+            if self.decoders == 0:
+                self.client.decode = False
+
+    def get_passthrough(self) -> PassthroughStream:
+        """共享的 H.264 直通流"""
+        with self.lock:
+            if self.passthrough is None:
+                self.passthrough = attach_passthrough(self.client, self.serial, self.frame_server)
+            return self.passthrough
+
+    def get_tile_stream(self, encoder: str = "auto") -> TileStream:
+        """共享的分块流
+
+        Args:
+            encoder: 分块编码后端名称，由第一个使用分块模式的视图决定
+        """
+        with self.lock:
+            if self.tile_stream is None:
+                self.tile_stream = get_tile_stream(self.serial, self.frame_server, encoder=create_encoder(encoder))
+            return self.tile_stream
+
+    def push_tiles(self, frame: np.ndarray, version: int):
+        """推送分块更新，同一内容版本只推送一次"""
+        tile_stream = self.get_tile_stream()
+        with self.tile_lock:
+            if version <= self.tile_version:
+                return
+            self.tile_version = version
+            tile_stream.push(frame)
+
+    def get_stats(self) -> dict:
+        """获取共享统计信息"""
+        return {
+            "viewers": self.refcount,
+            "version": self.version,
+            "tiers": {
+                tier.channel: {"encodes": tier.encodes, "shared": tier.shared}
+                for tier in self.tiers.values()
+            },
+            "change": self.change_detector.get_stats(),
+        }
+
+    def release(self, decode: bool = True):
+        """释放一个引用，最后一个引用释放后停止设备
+
+        Args:
+            decode: 获取时是否需要解码帧，与 acquire_hub 的参数相同
+        """
+        with _hubs_lock:
+            self.refcount -= 1
+            if self.refcount > 0:
+                if decode:
+                    self._release_decode()
+                return
+            if _hubs.get(self.serial) is self:
+                del _hubs[self.serial]
+        print(f"设备中心已关闭: {self.serial}")
+        if self.passthrough is not None:
+            detach_passthrough(self.serial)
+        if self.tile_stream is not None:
+            remove_tile_stream(self.serial)
+            self.tile_stream = None
+        if self.text_input is not None:
+            self.text_input.close()
+        if self.scroll_engine is not None:
+            self.scroll_engine.close()
+        with self.lock:
+            self.uhid_refcount = 0
+        self._destroy_uhid()
+        if self.frame_server is not None:
+            for tier in self.tiers.values():
+                self.frame_server.remove_channel(tier.channel)
+        self.tiers.clear()
+        self.client.stop()
+
+
+_hubs: Dict[str, DeviceHub] = {}
+_hubs_lock = threading.Lock()
+
+
+def acquire_hub(serial: str, frame_server: Optional[FrameServer] = None, decode: bool = True,
+                **client_kwargs) -> DeviceHub:
+    """获取设备中心（引用计数加一），首次获取时创建并启动 Client
+
+    同一设备并发获取时，只有第一个调用者启动客户端，其他调用者等待启动完成；
+    启动失败时所有调用者都收到异常。
+
+    Args:
+        serial: 设备序列号
+        frame_server: 旁路帧服务
+        decode: 是否需要解码帧，已存在的中心会按需开启解码，释放时以相同参数调用 release
+        **client_kwargs: 首次创建时传给 Client 的参数
+    """
+    with _hubs_lock:
+        hub = _hubs.get(serial)
+        created = hub is None
+        if created:
+            hub = DeviceHub(serial, frame_server, decode=decode, **client_kwargs)
+            hub.decoders = 1 if decode else 0
+            _hubs[serial] = hub
+        elif hub.frame_server is None:
+            hub.frame_server = frame_server
+        hub.refcount += 1
+    if created:
+        try:
+            hub.start()
+        except Exception as e:
+            hub.start_error = e
+            with _hubs_lock:
+                if _hubs.get(serial) is hub:
+                    del _hubs[serial]
+            hub.started.set()
+            hub.release(decode)
+            raise
+        hub.started.set()
+        print(f"设备中心已创建: {serial}")
+        return hub
+    hub.started.wait()
+    if hub.start_error is not None:
+        hub.release(False)
+        raise ConnectionError(f"设备 {serial} 启动失败: {hub.start_error}")
+    if decode:
+        hub.require_decode()
+    return hub
@@ -3,9 +3,22 @@ import flet as ft
 import base64
 import io
 from PIL import Image, ImageDraw
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Optional
 
+import cv2
+
+from screenshot_diff import diff_heatmap, diff_images
+from screenshot_service import decode_screenshot, get_screenshot_service
+from ui_dispatcher import schedule_update
+
+# Flet图像控件可以直接显示的截图格式
+DISPLAYABLE_MIME = ("image/png", "image/jpeg", "image/webp")
+
+# 与基准截图对比时的逐像素容差（抵消视频压缩噪声）
+DIFF_TOLERANCE = 16
+
 
 class DeviceScreenshot(ft.Container):
     """设备截图显示组件，与DeviceView保持相同的布局和样式"""
@@ -13,6 +26,13 @@ class DeviceScreenshot(ft.Container):
     def __init__(self, bgcolor=None, **kwargs):
         # 创建图像引用
         self.device_image_ref = ft.Ref[ft.Image]()
+        # 当前显示的截图在截图历史中的条目
+        self.entry = None
+        # 当前截图帧、对比基准帧，以及是否显示与基准的差异热力图
+        self.frame = None
+        self.baseline = None
+        self.show_diff = False
+        self.last_diff = None
         
         # 创建设备屏幕图像控件 - 与DeviceView完全相同的配置
         placeholder_image = self._create_placeholder_image()
@@ -28,10 +48,20 @@ class DeviceScreenshot(ft.Container):
             visible=True
         )
         
-        # 创建与DeviceView相同的布局结构 - 只包含图像，不显示时间戳
+        # 基准对比控件
+        self.diff_status = ft.Text("未设置基准", size=11, color=ft.Colors.GREY_700)
+        self.diff_switch = ft.Switch(label="对比", value=False, disabled=True, on_change=self._on_diff_toggle)
+        diff_controls = ft.Row([
+            ft.TextButton("设为基准", on_click=lambda e: self.set_baseline()),
+            self.diff_switch,
+            self.diff_status,
+        ], spacing=4, wrap=True)
+        
+        # 创建与DeviceView相同的布局结构 - 图像下方为基准对比控件，不显示时间戳
         device_content = ft.Column([
-            # 设备屏幕图像 - 占满整个容器
-            self.device_image
+            # 设备屏幕图像 - 占满剩余空间
+            ft.Container(content=self.device_image, expand=True, alignment=ft.alignment.center),
+            diff_controls,
         ], spacing=0, alignment=ft.MainAxisAlignment.CENTER, expand=True)
         
         # 调用父类构造函数 - 与DeviceView完全相同的样式
@@ -66,40 +96,130 @@ class DeviceScreenshot(ft.Container):
         img.save(buffer, format='PNG')
         return base64.b64encode(buffer.getvalue()).decode('utf-8')
     
-    def update_screenshot(self, current_frame):
-        """更新截图显示 - 直接复制DeviceView的图像数据"""
+    def update_screenshot(self, current_frame) -> Optional[Future]:
+        """在截图服务中编码帧并显示（不保存文件），调用方线程不做编码"""
+        if current_frame is None:
+            return None
+        future = get_screenshot_service().capture("preview", current_frame, fmt="png", save=False)
+        future.add_done_callback(self.show_screenshot)
+        return future
+    
+    def show_screenshot(self, result):
+        """显示截图服务的结果，可直接作为 Future 的完成回调（在编码线程中执行）"""
         try:
-            # 直接使用OpenCV帧数据转换为base64
-            if current_frame is not None:
-                import cv2
-                
-                # 将OpenCV图像转换为PIL图像
-                frame_rgb = cv2.cvtColor(current_frame, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(frame_rgb)
-                
-                # 转换为base64
-                buffer = io.BytesIO()
-                pil_image.save(buffer, format='PNG')
-                img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                
-                # 更新图像显示 - 使用与DeviceView相同的逻辑
-                if self.device_image_ref.current:
-                    self.device_image_ref.current.src_base64 = img_base64
-                    self.device_image_ref.current.src = None
-                    self.device_image_ref.current.update()
-                    
-                print(f"截图已更新")
-                
+            if isinstance(result, Future):
+                result = result.result()
+            self.entry = result.entry
+            self.frame = result.frame
+            if self.show_diff and self.baseline is not None:
+                self._show_diff()
+                return
+            data = result.data
+            if result.mime not in DISPLAYABLE_MIME:
+                # 浏览器不能直接显示的格式（如QOI）另行编码JPEG用于预览
+                _, buffer = cv2.imencode('.jpg', result.frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+                data = buffer.tobytes()
+            img_base64 = base64.b64encode(data).decode('utf-8')
+            
+            # 更新图像显示 - 使用与DeviceView相同的逻辑
+            if self.device_image_ref.current:
+                self.device_image_ref.current.src_base64 = img_base64
+                self.device_image_ref.current.src = None
+                schedule_update(self.device_image_ref.current)
+            
+            print(f"截图已更新")
+            
         except Exception as e:
             print(f"更新截图失败: {e}")
     
+    def set_baseline(self, baseline=None):
+        """设置对比基准
+        
+        Args:
+            baseline: BGR帧或截图文件路径，默认使用当前显示的截图
+        """
+        if isinstance(baseline, str):
+            baseline = decode_screenshot(baseline)
+        elif baseline is None:
+            baseline = self.frame
+        if baseline is None:
+            print("❌ 没有可作为基准的截图")
+            return
+        self.baseline = baseline
+        self.last_diff = None
+        self.diff_switch.disabled = False
+        self.diff_status.value = f"基准 {baseline.shape[1]}x{baseline.shape[0]}"
+        schedule_update(self.diff_switch)
+        schedule_update(self.diff_status)
+        print(f"✅ 已设置对比基准 {baseline.shape[1]}x{baseline.shape[0]}")
+    
+    def clear_baseline(self):
+        """清除对比基准，恢复显示原始截图"""
+        self.baseline = None
+        self.last_diff = None
+        self.show_diff = False
+        self.diff_switch.value = False
+        self.diff_switch.disabled = True
+        self.diff_status.value = "未设置基准"
+        schedule_update(self.diff_switch)
+        schedule_update(self.diff_status)
+        self._show_frame()
+    
+    def _on_diff_toggle(self, e):
+        self.show_diff = bool(self.diff_switch.value)
+        if self.frame is None:
+            return
+        # 对比计算在截图服务线程池中进行，不阻塞UI事件处理
+        get_screenshot_service().executor.submit(self._show_diff if self.show_diff else self._show_frame)
+    
+    def _show_diff(self):
+        """计算当前截图与基准的差异，显示热力图"""
+        frame, baseline = self.frame, self.baseline
+        if frame is None or baseline is None:
+            return
+        try:
+            result = diff_images(frame, baseline, DIFF_TOLERANCE, ssim_levels=2)
+            heatmap = diff_heatmap(frame, result, max_width=max(360, min(frame.shape[1], 720)),
+                                   tolerance=DIFF_TOLERANCE)
+            self.last_diff = result
+            summary = result.summary()
+            status = (f"差异 {summary['changed_ratio']:.2%}  SSIM {summary['ssim']:.3f}"
+                      + ("  尺寸不同" if result.size_mismatch else ""))
+            self.diff_status.value = status
+            schedule_update(self.diff_status)
+            self._show_image(heatmap)
+            print(f"截图对比: {status}, 差异块 {summary['changed_tiles']}")
+        except Exception as e:
+            print(f"❌ 截图对比失败: {e}")
+    
+    def _show_frame(self):
+        """重新显示当前截图（关闭对比时）"""
+        if self.frame is not None:
+            self._show_image(self.frame)
+    
+    def _show_image(self, image):
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if self.device_image_ref.current:
+            self.device_image_ref.current.src_base64 = base64.b64encode(buffer.tobytes()).decode('utf-8')
+            self.device_image_ref.current.src = None
+            schedule_update(self.device_image_ref.current)
+    
+    def get_last_diff(self):
+        """获取最近一次与基准对比的结果（DiffResult），未对比时为None"""
+        return self.last_diff
+    
     def clear_screenshot(self):
         """清除截图，显示占位符"""
         placeholder_image = self._create_placeholder_image()
+        self.frame = None
         if self.device_image_ref.current:
             self.device_image_ref.current.src_base64 = placeholder_image
             self.device_image_ref.current.src = None
-            self.device_image_ref.current.update()
+            schedule_update(self.device_image_ref.current)
+    
+    def get_screenshot_entry(self):
+        """获取当前截图在截图历史中的条目（StoreEntry），可用于读取文件、缩略图和预览"""
+        return self.entry
     
     def get_screenshot_data(self) -> Optional[str]:
         """获取当前截图的base64数据"""
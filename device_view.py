@@ -1,4 +1,5 @@
 import flet as ft
+import flet.canvas as cv
 from typing import Optional, Callable
 import threading
 import sys
@@ -11,21 +12,200 @@ import math
 
 # 添加scrcpy模块路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'scrcpy'))
-from scrcpy.core import Client
 import scrcpy.const as const
+from scrcpy import uhid
+from scrcpy.fingerprint import StateIndex, StateMatch, StateTracker
+from scrcpy.overlay import Overlay
+from text_input import TextInputEngine
+from ui_dispatcher import get_dispatcher, schedule_update
+from scroll_engine import ScrollEngine
+from device_hub import DeviceHub, acquire_hub
+from frame_server import get_frame_server
+from render_loop import RenderLoop
+from tile_stream import tile_view_url
+from video_passthrough import passthrough_url
+
+# 设置环境变量 DEBUG=1 时输出逐键调试日志
+DEBUG = bool(os.environ.get("DEBUG"))
+# 显示设备像素比（Flet不提供该信息），高分屏可设置 DEVICE_PIXEL_RATIO=2
+DEFAULT_DEVICE_PIXEL_RATIO = float(os.environ.get("DEVICE_PIXEL_RATIO", "1.0"))
+# 画面传输方式，默认沿用Flet控件协议（base64）；设置 DISPLAY_MODE=http 等启用旁路帧服务
+DEFAULT_DISPLAY_MODE = os.environ.get("DISPLAY_MODE", "base64")
+# 画面状态指纹索引文件，设置 STATE_INDEX=states.json 时每个视图启动即加载
+DEFAULT_STATE_INDEX = os.environ.get("STATE_INDEX")
+
+
+# Flet键名到Android按键码的特殊键映射
+FLET_KEY_MAPPING = {
+    'Space': const.KEYCODE_SPACE,
+    'Enter': const.KEYCODE_ENTER,
+    'Backspace': const.KEYCODE_DEL,
+    'Delete': const.KEYCODE_FORWARD_DEL,
+    'Tab': const.KEYCODE_TAB,
+    'Escape': const.KEYCODE_ESCAPE,
+    'Arrow Up': const.KEYCODE_DPAD_UP,
+    'Arrow Down': const.KEYCODE_DPAD_DOWN,
+    'Arrow Left': const.KEYCODE_DPAD_LEFT,
+    'Arrow Right': const.KEYCODE_DPAD_RIGHT,
+    'Home': const.KEYCODE_HOME,
+    'End': const.KEYCODE_MOVE_END,
+    'Page Up': const.KEYCODE_PAGE_UP,
+    'Page Down': const.KEYCODE_PAGE_DOWN,
+    'Insert': const.KEYCODE_INSERT,
+    'F1': const.KEYCODE_F1,
+    'F2': const.KEYCODE_F2,
+    'F3': const.KEYCODE_F3,
+    'F4': const.KEYCODE_F4,
+    'F5': const.KEYCODE_F5,
+    'F6': const.KEYCODE_F6,
+    'F7': const.KEYCODE_F7,
+    'F8': const.KEYCODE_F8,
+    'F9': const.KEYCODE_F9,
+    'F10': const.KEYCODE_F10,
+    'F11': const.KEYCODE_F11,
+    'F12': const.KEYCODE_F12,
+    'Shift Left': const.KEYCODE_SHIFT_LEFT,
+    'Shift Right': const.KEYCODE_SHIFT_RIGHT,
+    'Control Left': const.KEYCODE_CTRL_LEFT,
+    'Control Right': const.KEYCODE_CTRL_RIGHT,
+    'Alt Left': const.KEYCODE_ALT_LEFT,
+    'Alt Right': const.KEYCODE_ALT_RIGHT,
+    'Meta Left': const.KEYCODE_META_LEFT,
+    'Meta Right': const.KEYCODE_META_RIGHT,
+    'Caps Lock': const.KEYCODE_CAPS_LOCK,
+    'Num Lock': const.KEYCODE_NUM_LOCK,
+    'Scroll Lock': const.KEYCODE_SCROLL_LOCK,
+    # 标点符号
+    ',': const.KEYCODE_COMMA,
+    '.': const.KEYCODE_PERIOD,
+    '/': const.KEYCODE_SLASH,
+    ';': const.KEYCODE_SEMICOLON,
+    "'": const.KEYCODE_APOSTROPHE,
+    '[': const.KEYCODE_LEFT_BRACKET,
+    ']': const.KEYCODE_RIGHT_BRACKET,
+    '\\': const.KEYCODE_BACKSLASH,
+    '-': const.KEYCODE_MINUS,
+    '=': const.KEYCODE_EQUALS,
+    '`': const.KEYCODE_GRAVE,
+    # 数字键盘
+    'Numpad 0': const.KEYCODE_NUMPAD_0,
+    'Numpad 1': const.KEYCODE_NUMPAD_1,
+    'Numpad 2': const.KEYCODE_NUMPAD_2,
+    'Numpad 3': const.KEYCODE_NUMPAD_3,
+    'Numpad 4': const.KEYCODE_NUMPAD_4,
+    'Numpad 5': const.KEYCODE_NUMPAD_5,
+    'Numpad 6': const.KEYCODE_NUMPAD_6,
+    'Numpad 7': const.KEYCODE_NUMPAD_7,
+    'Numpad 8': const.KEYCODE_NUMPAD_8,
+    'Numpad 9': const.KEYCODE_NUMPAD_9,
+    'Numpad Divide': const.KEYCODE_NUMPAD_DIVIDE,
+    'Numpad Multiply': const.KEYCODE_NUMPAD_MULTIPLY,
+    'Numpad Subtract': const.KEYCODE_NUMPAD_SUBTRACT,
+    'Numpad Add': const.KEYCODE_NUMPAD_ADD,
+    'Numpad Decimal': const.KEYCODE_NUMPAD_DOT,
+    'Numpad Enter': const.KEYCODE_NUMPAD_ENTER,
+}
+
+# 按文件路径共享的画面状态索引，多个视图加载同一文件时使用同一个实例
+_state_indexes = {}
+_state_indexes_lock = threading.Lock()
+
+
+def get_state_index(path: str) -> StateIndex:
+    """获取指定文件的画面状态索引，同一路径只加载一次（文件不存在时创建空索引）"""
+    key = os.path.abspath(path)
+    with _state_indexes_lock:
+        index = _state_indexes.get(key)
+        if index is None:
+            index = StateIndex.load(path) if os.path.exists(path) else StateIndex()
+            _state_indexes[key] = index
+        return index
 
 
 class DeviceView(ft.Container):
     """设备屏幕显示视图类"""
     
-    def __init__(self, device_name: str = None, bgcolor=None, **kwargs):
+    def __init__(self, device_name: str = None, bgcolor=None, use_uhid: bool = False,
+                 display_mode: str = DEFAULT_DISPLAY_MODE, display_fps: float = 20.0,
+                 device_pixel_ratio: float = DEFAULT_DEVICE_PIXEL_RATIO, encoder: str = "auto",
+                 adaptive_quality: bool = True, state_index=DEFAULT_STATE_INDEX, **kwargs):
+        """
+        Args:
+            device_name: 设备序列号
+            bgcolor: 背景色
+            use_uhid: 使用UHID键盘代替keycode注入，右键经UHID鼠标发送（返回）。
+                UHID鼠标是相对指针，Android会加速移动，无法定位到画面坐标，
+                所以点击、拖动和滚轮仍使用带坐标的触摸/滚动注入
+            display_mode: "base64"（默认）通过Flet控件协议传输；"http" 通过端口8551上的旁路帧服务传输二进制JPEG，
+                服务无法启动时回退到base64；
+                "passthrough" 主机不解码，H.264 重新封装为fMP4由浏览器 /mse/<设备> 页面播放。
+                该模式下视图本身只显示播放地址，current_frame / Client.last_frame 保持为None，
+                依赖解码帧的功能（F2截图、同步截图、画面状态识别）不可用，截图请使用 Ctrl+`（原始分辨率截图）；
+                "tiles" 只发送变化的分块，由浏览器 /tileview/<设备> 页面合成，视图本身显示该页面地址
+            display_fps: 最大显示帧率，与解码帧率无关
+            device_pixel_ratio: 显示设备像素比，按控件实际尺寸乘以该值编码
+            encoder: 显示帧编码后端 "auto"/"jpeg"/"turbojpeg"/"webp"/"raw"（raw 为未压缩位图，适合本机桌面模式）
+            adaptive_quality: 根据编码耗时和每帧字节预算自动调整质量和色度抽样
+            state_index: 画面状态指纹索引（StateIndex 或索引文件路径），用于识别当前所在界面
+        """
         self.device_name = device_name or "未选择设备"
         self.device_image_ref = ft.Ref[ft.Image]()
         self.rlock = threading.RLock()
         self.current_frame = None
         self.client = None
+        # 同一设备的所有视图（包括其他浏览器会话）共享一个设备中心
+        self.hub: Optional[DeviceHub] = None
+        self.text_input: Optional[TextInputEngine] = None
+        self.scroll_engine: Optional[ScrollEngine] = None
         self.is_ui_active = True  # 标记UI是否仍然活跃
         
+        # 画面传输方式：http模式下图像只更新URL，帧数据走旁路HTTP服务
+        self.frame_server = None
+        self.frame_base_url = None
+        self.frame_channel = self.device_name
+        self.display_mode = display_mode
+        self.passthrough = None
+        self.tile_stream = None
+        if display_mode in ("http", "passthrough", "tiles"):
+            try:
+                self.frame_server = get_frame_server()
+            except OSError as e:
+                print(f"帧服务启动失败，回退到base64模式: {e}")
+                self.display_mode = "base64"
+        self.last_published_seq = 0
+        self.published_channel = None
+        # 已显示的内容版本号，与设备中心的版本号相同时画面未变化
+        self.displayed_version = 0
+        
+        # 显示循环：解码线程只提交最新帧，编码和UI更新在独立线程中按显示帧率进行
+        self.render_loop = RenderLoop(self._render_frame, fps=display_fps, ready=self._frame_delivered,
+                                      name=f"render-{self.device_name}")
+        self.hidden_reasons = set()
+        # 控件实际显示尺寸（逻辑像素），由画布的 on_resize 更新
+        self.viewport_size = (0, 0)
+        self.device_pixel_ratio = device_pixel_ratio
+        # 显示帧编码设置，相同设置和尺寸的视图共用设备中心的一次编码
+        self.encoder_name = encoder
+        self.adaptive_quality = adaptive_quality
+        
+        # 叠加层：其他模块在设备帧坐标上添加矩形、标签和掩码。叠加层单独编码为透明PNG，
+        # 叠放在画面上方，只在叠加层或布局变化时重新编码，不参与每帧编码
+        self.overlay = Overlay()
+        self.overlay_lock = threading.Lock()
+        self.overlay_key = None
+        
+        # 画面状态识别：只在内容版本变化时计算指纹并查询最近的已知状态
+        self.state_tracker: Optional[StateTracker] = None
+        self.state_version = 0
+        self.state_index_path: Optional[str] = None
+        if state_index is not None:
+            self.load_state_index(state_index)
+        
+        # UHID输入模式：键盘以HID报告形式发送，绕过Android的keycode注入
+        self.use_uhid = use_uhid
+        self.uhid_keyboard: Optional[uhid.UhidKeyboard] = None
+        self.uhid_mouse: Optional[uhid.UhidMouse] = None
+        
         # 鼠标状态跟踪
         self.mouse_left_down = False
         self.mouse_right_down = False
@@ -54,9 +234,31 @@ class DeviceView(ft.Container):
             visible=True
         )
         
+        # 透明画布铺满显示区域，只用于获取控件的实际尺寸；图像叠放在其上按比例居中显示
+        self.viewport_canvas = cv.Canvas(
+            expand=True,
+            on_resize=self._on_viewport_resize,
+            resize_interval=200,
+        )
+        self.overlay_image = ft.Image(
+            src_base64=placeholder_image,
+            left=0, top=0, width=1, height=1,
+            fit=ft.ImageFit.FILL,
+            gapless_playback=True,
+            visible=False,
+        )
+        self.device_stack = ft.Stack([
+            self.viewport_canvas,
+            ft.Container(content=self.device_image, alignment=ft.alignment.center,
+                         left=0, top=0, right=0, bottom=0),
+            self.overlay_image,
+        ], expand=True)
+        self.overlay.add_listener(self._refresh_overlay)
+        
         # 使用GestureDetector来处理手势事件，使用Container包装来处理鼠标事件
         self.gesture_detector = ft.GestureDetector(
-            content=self.device_image,
+            content=self.device_stack,
+            expand=True,
             on_scroll=self._on_scroll,  # 滚轮事件监听
             on_tap_down=self.on_tap_down,  # 鼠标按下事件
             on_tap_up=self.on_tap_up,  # 鼠标释放事件
@@ -122,6 +324,23 @@ class DeviceView(ft.Container):
         
         return img_base64
     
+    def _open_uhid(self):
+        """使用设备中心共享的UHID键盘和鼠标（第一个使用的视图在设备端创建）"""
+        try:
+            self.uhid_keyboard, self.uhid_mouse = self.hub.acquire_uhid()
+            print(f"UHID键盘和鼠标已就绪: {self.device_name}")
+        except Exception as e:
+            print(f"创建UHID设备失败，回退到keycode注入: {e}")
+            self.uhid_keyboard = None
+            self.uhid_mouse = None
+    
+    def _close_uhid(self):
+        """释放UHID设备，最后一个使用的视图释放后设备中心才销毁"""
+        if self.uhid_keyboard and self.hub:
+            self.hub.release_uhid()
+        self.uhid_keyboard = None
+        self.uhid_mouse = None
+    
     def _on_connect_click(self, e):
         """连接设备按钮点击事件"""
         if self.client is None:
@@ -138,16 +357,52 @@ class DeviceView(ft.Container):
                 return
                 
             print(f"正在连接设备: {self.device_name}")
-            self.client = Client(device=self.device_name, max_width=800, bitrate=4000000, max_fps=20, connection_timeout=10000)
-            print("正在添加帧监听器...")
-            self.client.add_listener("frame", self.on_frame)
-            print("正在启动客户端...")
-            self.client.start(threaded=True)
+            # 直通模式下主机不解码视频，画面由浏览器直接播放H.264
+            use_passthrough = self.display_mode == "passthrough"
+            self.hub = acquire_hub(self.device_name, self.frame_server, decode=not use_passthrough,
+                                   max_width=800, bitrate=4000000, max_fps=20, connection_timeout=10000)
+            self.client = self.hub.client
+            if self.frame_server:
+                # 远程浏览器通过页面所在主机访问旁路帧服务
+                self.frame_base_url = self.frame_server.base_url(self.page)
+            if use_passthrough:
+                self.passthrough = self.hub.get_passthrough()
+                url = passthrough_url(self.frame_channel, self.frame_server, self.page)
+                print(f"直通播放地址: {url}")
+                self._show_browser_placeholder("H.264 passthrough", url)
+            else:
+                if self.display_mode == "tiles":
+                    self.tile_stream = self.hub.get_tile_stream(self.encoder_name)
+                    url = tile_view_url(self.frame_channel, self.frame_server, self.page)
+                    print(f"分块合成页面: {url}")
+                    self._show_browser_placeholder("Tile view", url)
+                print("正在添加帧监听器...")
+                self.displayed_version = 0
+                self.hub.subscribe(self.on_frame)
+            # 输入管线由设备中心共享，多个视图的输入在同一控制连接上按顺序发送
+            self.text_input = self.hub.get_text_input()
+            self.scroll_engine = self.hub.get_scroll_engine()
+            if self.use_uhid:
+                self._open_uhid()
             print(f"成功连接到设备 {self.device_name}")
                 
         except Exception as e:
             print(f"连接设备失败: {e}")
-            self.client = None
+            self.text_input = None
+            self.scroll_engine = None
+            self._close_uhid()
+            self._release_hub()
+    
+    def _release_hub(self):
+        """取消订阅并释放设备中心，最后一个视图释放时设备中心停止客户端"""
+        if self.hub:
+            self.hub.unsubscribe(self.on_frame)
+            self.hub.leave_tier(self)
+            self.hub.release(decode=self.display_mode != "passthrough")
+            self.hub = None
+        self.client = None
+        self.passthrough = None
+        self.tile_stream = None
     
     def _auto_connect(self):
         """自动连接设备的方法"""
@@ -158,8 +413,13 @@ class DeviceView(ft.Container):
         """断开设备连接"""
         if self.client:
             try:
-                self.client.stop()
-                self.client = None
+                if self.text_input:
+                    # 共享管线由设备中心关闭，这里只发送本视图缓冲的文本
+                    self.text_input.flush()
+                    self.text_input = None
+                self.scroll_engine = None
+                self._close_uhid()
+                self._release_hub()
                 print("设备连接已断开")
                 
                 # 更新按钮状态
@@ -174,68 +434,228 @@ class DeviceView(ft.Container):
             except Exception as e:
                 print(f"断开连接失败: {e}")
     
-    def on_frame(self, frame):
-        """处理从scrcpy接收到的帧数据 - 优化版本"""
-        if frame is not None and frame.size > 0:
-            try:
-                self.rlock.acquire()
-                # 存储当前帧
-                self.current_frame = frame
-                
-                if not hasattr(self, 'frame_count'):
-                    self.frame_count = 0
-                    self.last_frame_info_time = time.time()
-                
-                self.frame_count += 1
-                
-                # 优化：减少不必要的shape访问
-                # 减少日志输出频率
-                current_time = time.time()
-                if current_time - self.last_frame_info_time > 2.0:  # 增加到2秒减少日志频率
-                    image_height, image_width = frame.shape[:2]
-                    print(f"收到帧: {image_width}x{image_height}, FPS: {self.frame_count/2:.1f}")
-                    self.frame_count = 0
-                    self.last_frame_info_time = current_time
-                
-                # 将OpenCV图像转换为base64格式并更新UI
-                self._update_ui_with_frame(frame, 0, 0)  # 不需要传递宽高参数
-                        
-            except Exception as e:
-                print(f"帧处理错误: {e}")
-            finally:
-                self.rlock.release()
+    def on_frame(self, frame, version: int = 0):
+        """处理设备中心分发的帧数据（解码线程），只保存最新帧并交给显示循环
+        
+        Args:
+            frame: 解码后的帧
+            version: 内容版本号，画面未变化时保持不变
+        """
+        if frame is None or frame.size == 0:
+            return
+        with self.rlock:
+            # 存储当前帧
+            self.current_frame = frame
+            
+            if not hasattr(self, 'frame_count'):
+                self.frame_count = 0
+                self.last_frame_info_time = time.time()
+            
+            self.frame_count += 1
+            
+            # 减少日志输出频率
+            current_time = time.time()
+            if current_time - self.last_frame_info_time > 2.0:
+                image_height, image_width = frame.shape[:2]
+                stats = self.render_loop.get_stats()
+                change_stats = self.hub.change_detector.get_stats() if self.hub else {"skip_ratio": 0.0}
+                print(f"收到帧: {image_width}x{image_height}, FPS: {self.frame_count/2:.1f}, "
+                      f"已显示: {stats['rendered']}, 丢弃: {stats['dropped']}, "
+                      f"未变化跳过率: {change_stats['skip_ratio']:.1%}")
+                if self.page:
+                    ui_stats = get_dispatcher(self.page).get_stats()
+                    print(f"UI更新: {ui_stats['updates_per_sec']:.1f} 控件/秒, "
+                          f"{ui_stats['batches_per_sec']:.1f} 批/秒, {ui_stats['bytes_per_sec'] / 1024:.1f} KB/秒")
+                self.frame_count = 0
+                self.last_frame_info_time = current_time
+        
+        if self.state_tracker is not None and version != self.state_version:
+            # 指纹计算和查询在微秒级，直接在解码线程中进行
+            self.state_version = version
+            self.state_tracker.update(frame)
+        self.render_loop.submit((frame, version))
+    
+    def _render_frame(self, item):
+        """显示循环回调：画面有变化时编码并更新UI"""
+        frame, version = item
+        try:
+            if version == self.displayed_version:
+                return
+            if self.tile_stream and self.hub:
+                # 分块模式：只编码变化的分块，推送给浏览器合成页面
+                self.hub.push_tiles(frame, version)
+            else:
+                self._update_ui_with_frame(frame, version)
+            # 分辨率变化（如旋转）后重新定位叠加层，未变化时只比较一次键值
+            self._refresh_overlay()
+            self.displayed_version = version
+        except Exception as e:
+            print(f"帧处理错误: {e}")
+    
+    def _frame_delivered(self) -> bool:
+        """上一帧是否已被浏览器取走（仅http模式需要等待）"""
+        if not self.frame_server or not self.last_published_seq:
+            return True
+        channel = self.frame_server.channels.get(self.published_channel)
+        return channel is None or channel.served_seq >= self.last_published_seq
+    
+    def _on_viewport_resize(self, e: cv.CanvasResizeEvent):
+        """显示区域尺寸变化：后续帧按新尺寸编码"""
+        self.viewport_size = (e.width, e.height)
+        # 新尺寸下即使画面不变也需要重新显示一次
+        self.displayed_version = 0
+        self._refresh_overlay()
+        if DEBUG:
+            print(f"显示区域尺寸: {e.width:.0f}x{e.height:.0f}")
+    
+    def _display_size(self, width: int, height: int):
+        """按控件尺寸和像素比计算编码尺寸（等比缩放，只缩小不放大）"""
+        view_width, view_height = self.viewport_size
+        if not view_width or not view_height:
+            return width, height
+        scale = min(view_width * self.device_pixel_ratio / width,
+                    view_height * self.device_pixel_ratio / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+    
+    def _event_position(self, e):
+        """把控件内的指针坐标换算为设备帧坐标（考虑CONTAIN缩放和留白）"""
+        x = getattr(e, 'local_x', 0) or 0
+        y = getattr(e, 'local_y', 0) or 0
+        resolution = self.client.resolution if self.client else None
+        view_width, view_height = self.viewport_size
+        if not resolution or not view_width or not view_height:
+            return int(x), int(y)
+        frame_width, frame_height = resolution
+        scale = min(view_width / frame_width, view_height / frame_height)
+        offset_x = (view_width - frame_width * scale) / 2
+        offset_y = (view_height - frame_height * scale) / 2
+        device_x = min(max((x - offset_x) / scale, 0), frame_width - 1)
+        device_y = min(max((y - offset_y) / scale, 0), frame_height - 1)
+        return int(device_x), int(device_y)
     
-    def _update_ui_with_frame(self, display_frame, image_width, image_height):
+    def _refresh_overlay(self):
+        """叠加层、设备分辨率或显示区域变化时重新编码叠加层并按CONTAIN布局定位"""
+        resolution = self.client.resolution if self.client else None
+        view_width, view_height = self.viewport_size
+        key = (self.overlay.version, resolution, self.viewport_size)
+        with self.overlay_lock:
+            if key == self.overlay_key:
+                return
+            self.overlay_key = key
+            layer = None
+            if resolution and view_width and view_height:
+                layer = self.overlay.render(*resolution)
+            if layer is None:
+                if not self.overlay_image.visible:
+                    return
+                self.overlay_image.visible = False
+            else:
+                frame_width, frame_height = resolution
+                scale = min(view_width / frame_width, view_height / frame_height)
+                offset_x = (view_width - frame_width * scale) / 2
+                offset_y = (view_height - frame_height * scale) / 2
+                # 只编码叠加层的包围区域，PNG保留alpha通道
+                _, buffer = cv2.imencode('.png', layer.bgra)
+                self.overlay_image.src_base64 = base64.b64encode(buffer).decode('utf-8')
+                self.overlay_image.left = offset_x + layer.x * scale
+                self.overlay_image.top = offset_y + layer.y * scale
+                self.overlay_image.width = layer.width * scale
+                self.overlay_image.height = layer.height * scale
+                self.overlay_image.visible = True
+        schedule_update(self.overlay_image)
+    
+    def load_state_index(self, state_index, min_interval: float = 0.0):
+        """加载画面状态指纹索引
+        
+        Args:
+            state_index: StateIndex 或索引文件路径（文件不存在时创建空索引，保存时写入该路径；
+                同一路径的索引在所有视图间共享）
+            min_interval: 两次识别的最小间隔（秒）
+        """
+        if isinstance(state_index, str):
+            self.state_index_path = state_index
+            state_index = get_state_index(state_index)
+        self.state_tracker = StateTracker(state_index, min_interval)
+        self.state_tracker.add_listener(self._on_state_change)
+        self.state_version = 0
+        print(f"✅ {self.device_name}: 已加载 {len(state_index)} 个画面状态指纹")
+    
+    def _on_state_change(self, previous: Optional[StateMatch], current: Optional[StateMatch]):
+        if current is None:
+            print(f"📍 {self.device_name}: 未知画面（上一个: {previous.label if previous else '无'}）")
+        else:
+            print(f"📍 {self.device_name}: 画面状态 {current.label}（距离 {current.distance}/{current.bits}）")
+    
+    def get_screen_state(self) -> Optional[StateMatch]:
+        """当前画面最接近的已知状态，未加载索引或没有足够接近的状态时为None"""
+        return self.state_tracker.current if self.state_tracker else None
+    
+    def add_screen_state(self, label: str, save: bool = True) -> bool:
+        """把当前画面记录为指定状态的参考指纹
+        
+        Args:
+            label: 状态名称
+            save: 立即写回索引文件
+        """
+        if self.current_frame is None:
+            print("❌ 没有可用的画面")
+            return False
+        if self.state_tracker is None:
+            self.load_state_index(DEFAULT_STATE_INDEX or "states.json")
+        index = self.state_tracker.index
+        index.add(label, self.current_frame)
+        self.state_tracker.update(self.current_frame)
+        if save and self.state_index_path:
+            index.save(self.state_index_path)
+        print(f"✅ {self.device_name}: 已记录画面状态 {label}（共 {len(index)} 个参考）")
+        return True
+    
+    def set_visible(self, visible: bool, reason: str = "view"):
+        """设置视图是否可见，任一原因不可见时暂停显示循环
+        
+        Args:
+            visible: 是否可见
+            reason: 不可见的原因，如 "scroll"（滚出可视区域）、"app"（窗口隐藏）
+        """
+        if visible:
+            self.hidden_reasons.discard(reason)
+        else:
+            self.hidden_reasons.add(reason)
+        self.render_loop.set_visible(not self.hidden_reasons)
+    
+    def _update_ui_with_frame(self, display_frame, version: int):
         """更新UI显示帧数据 - 优化版本"""
         # 检查UI是否仍然活跃
         if not self.is_ui_active:
             return
             
-        if self.device_image_ref.current:
+        if self.device_image_ref.current and self.hub:
             try:
                 # 确保数据类型为uint8
                 if display_frame.dtype != np.uint8:
                     display_frame = display_frame.astype(np.uint8)
                 
-                # 优化：使用更高效的JPEG编码参数
-                encode_params = [cv2.IMWRITE_JPEG_QUALITY, 85]  # 降低质量以提升性能
-                _, buffer = cv2.imencode('.jpg', display_frame, encode_params)
-                img_str = base64.b64encode(buffer).decode('utf-8')
+                # 按控件实际显示尺寸编码（区域插值缩小），尺寸相近的视图归入同一档位共用一次编码
+                frame_height, frame_width = display_frame.shape[:2]
+                target_width, _ = self._display_size(frame_width, frame_height)
+                size = self.hub.tier_size(frame_width, frame_height, target_width)
+                tier = self.hub.tier(self.encoder_name, self.adaptive_quality, size, viewer=self)
+                encoded = tier.encode(display_frame, version)
                 
                 # 更新图像
-                self.device_image_ref.current.src_base64 = img_str
-                self.device_image_ref.current.src = None
+                if self.frame_server and encoded.url:
+                    # 二进制帧已发布到旁路服务，控件只更新一个很短的URL
+                    self.published_channel = tier.channel
+                    self.last_published_seq = encoded.seq
+                    self.device_image_ref.current.src = self.frame_server.frame_url(
+                        tier.channel, encoded.seq, self.frame_base_url)
+                    self.device_image_ref.current.src_base64 = None
+                else:
+                    self.device_image_ref.current.src_base64 = encoded.base64
+                    self.device_image_ref.current.src = None
                 
-                # 安全地更新UI
-                try:
-                    self.device_image_ref.current.update()
-                except Exception as update_error:
-                    # 如果更新失败，可能是因为event loop已关闭
-                    if "Event loop is closed" in str(update_error):
-                        self.is_ui_active = False
-                        print("检测到Event loop已关闭，停止UI更新")
-                    else:
-                        print(f"UI更新错误: {update_error}")
+                # 交给更新调度器，与同一节拍内的其他更新合并发送（页面断开由调度器处理）
+                schedule_update(self.device_image_ref.current)
                 
             except Exception as e:
                 print(f"UI更新错误: {e}")
@@ -264,7 +684,7 @@ class DeviceView(ft.Container):
                     self.device_image_ref.current.src = None
                 
                 # 更新图像控件
-                self.device_image_ref.current.update()
+                schedule_update(self.device_image_ref.current)
                 print(f"DEBUG: Image updated successfully")
                 
             except Exception as e:
@@ -282,7 +702,24 @@ class DeviceView(ft.Container):
             waiting_image = self._create_placeholder_image()
             self.device_image_ref.current.src_base64 = waiting_image
             self.device_image_ref.current.src = None
-            self.device_image_ref.current.update()
+            schedule_update(self.device_image_ref.current)
+    
+    def _show_browser_placeholder(self, title: str, url: str):
+        """直通和分块模式：画面只在浏览器页面中显示，视图中给出页面地址"""
+        img = np.full((350, 280, 3), 224, dtype=np.uint8)
+        cv2.rectangle(img, (5, 5), (275, 345), (128, 128, 128), 2)
+        cv2.putText(img, title, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+        cv2.putText(img, "Video plays in the browser:", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (64, 64, 64), 1)
+        # 地址按宽度折行
+        for i in range(0, len(url), 34):
+            cv2.putText(img, url[i:i + 34], (10, 85 + 18 * (i // 34)), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.4, (160, 80, 0), 1)
+        _, buffer = cv2.imencode('.png', img)
+        if self.device_image_ref.current:
+            self.device_image_ref.current.src_base64 = base64.b64encode(buffer).decode('utf-8')
+            self.device_image_ref.current.src = None
+            self.device_image_ref.current.tooltip = url
+            schedule_update(self.device_image_ref.current)
     
     def _show_error_placeholder(self):
         """显示错误占位符图像 - 使用OpenCV替代PIL"""
@@ -300,7 +737,7 @@ class DeviceView(ft.Container):
         if self.device_image_ref.current:
             self.device_image_ref.current.src_base64 = img_base64
             self.device_image_ref.current.src = None
-            self.device_image_ref.current.update()
+            schedule_update(self.device_image_ref.current)
     
     def get_device_image_control(self) -> Optional[ft.Image]:
         """获取设备图像控件引用"""
@@ -310,49 +747,33 @@ class DeviceView(ft.Container):
         """清理资源"""
         print(f"开始清理DeviceView资源: {self.device_name}")
         self.is_ui_active = False  # 标记UI不再活跃
+        self.render_loop.close()
+        if self.text_input:
+            self.text_input.flush()
+            self.text_input = None
+        self.scroll_engine = None
         if self.client:
-            print(f"正在停止客户端: {self.device_name}")
-            self.client.stop()
-            self.client = None
-            print(f"客户端已停止: {self.device_name}")
+            self._close_uhid()
+            print(f"正在释放设备中心: {self.device_name}")
+            self._release_hub()
         print(f"DeviceView资源清理完成: {self.device_name}")
-        
-        # 清理滚轮定时器
-        if hasattr(self, 'scroll_timer') and self.scroll_timer:
-            self.scroll_timer.cancel()
-            self.scroll_timer = None
     
     def _on_scroll(self, e):
-        """处理滚轮事件，直接使用delta值进行滚动"""
+        """处理滚轮事件，增量交给滚动引擎，不阻塞UI线程"""
         if not self.client or not self.client.control:
             return
         
         delta_x = getattr(e, 'scroll_delta_x', 0)
         delta_y = getattr(e, 'scroll_delta_y', 0)
         
-        # 获取设备分辨率
-        try:
-            device_width = self.client.resolution[0] if hasattr(self.client, 'resolution') and self.client.resolution else 800
-            device_height = self.client.resolution[1] if hasattr(self.client, 'resolution') and self.client.resolution else 600
-        except:
-            device_width, device_height = 800, 600
+        if not self.scroll_engine:
+            return
         
-        # 固定使用屏幕中心点作为滚动坐标
-        device_x = device_width // 2
-        device_y = device_height // 2
+        # 在指针位置滚动，与触摸事件使用相同的坐标
+        x, y = self._event_position(e)
         
-        try:
-            # 直接使用delta值进行滚动
-            # scrcpy的滚动方向与常规相反，所以需要取负值
-            scroll_x = int(-delta_x)
-            scroll_y = int(-delta_y)
-            self.client.control.scroll(device_x, device_y, scroll_x/2, scroll_y/2)
-            time.sleep(0.1)
-            self.client.control.scroll(device_x, device_y, scroll_x/2, scroll_y/2)
-                
-        except Exception as ex:
-            print(f"❌ 滚动操作失败: {ex}")
-   
+        # scrcpy的滚动方向与常规相反，所以需要取负值；由滚动引擎在后台平滑发送
+        self.scroll_engine.add(x, y, -delta_x, -delta_y)
 
     # 新的GestureDetector事件处理方法
     def on_tap_down(self, e):
@@ -360,8 +781,7 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
         
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 鼠标按下: x={x}, y={y}")
         
@@ -378,8 +798,7 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
         
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 鼠标释放: x={x}, y={y}")
         
@@ -391,20 +810,17 @@ class DeviceView(ft.Container):
     
     def on_tap(self, e):
         """点击事件 - 使用GestureDetector的on_tap"""
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         print(f"GestureDetector - 点击: x={x}, y={y}")
     
     def on_double_tap(self, e):
         """双击事件 - 使用GestureDetector的on_double_tap"""
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         print(f"GestureDetector - 双击: x={x}, y={y}")
     
     def on_secondary_tap(self, e):
         """右键点击事件 - 使用GestureDetector的on_secondary_tap"""
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         print(f"GestureDetector - 右键点击: x={x}, y={y}")
     
     def on_secondary_tap_down(self, e):
@@ -412,8 +828,7 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
         
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 右键按下: x={x}, y={y}")
         
@@ -421,8 +836,12 @@ class DeviceView(ft.Container):
             self.mouse_right_down = True
             self.ori_x = x
             self.ori_y = y
-            # 右键可以用于特殊操作，这里暂时使用相同的触摸操作
-            self.client.control.touch(x, y, const.ACTION_DOWN)
+            if self.uhid_mouse:
+                # HID右键由Android处理为返回，与指针位置无关
+                self.uhid_mouse.press(uhid.HID_BUTTON_RIGHT)
+            else:
+                # 右键可以用于特殊操作，这里暂时使用相同的触摸操作
+                self.client.control.touch(x, y, const.ACTION_DOWN)
         except Exception as ex:
             print(f"右键按下事件发送失败: {ex}")
     
@@ -431,14 +850,16 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
         
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 右键释放: x={x}, y={y}")
         
         try:
             self.mouse_right_down = False
-            self.client.control.touch(x, y, const.ACTION_UP)
+            if self.uhid_mouse:
+                self.uhid_mouse.release(uhid.HID_BUTTON_RIGHT)
+            else:
+                self.client.control.touch(x, y, const.ACTION_UP)
         except Exception as ex:
             print(f"右键释放事件发送失败: {ex}")
     
@@ -447,8 +868,7 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
             
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 拖拽开始: x={x}, y={y}")
         
@@ -466,8 +886,7 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
         
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 拖拽更新: x={x}, y={y}")
         
@@ -482,8 +901,7 @@ class DeviceView(ft.Container):
         if not self.client or not self.client.alive:
             return
             
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         
         print(f"GestureDetector - 拖拽结束: x={x}, y={y}")
         
@@ -504,12 +922,12 @@ class DeviceView(ft.Container):
     
     def on_mouse_hover(self, e):
         """鼠标悬停事件 - 使用GestureDetector的on_hover"""
-        x = int(getattr(e, 'local_x', 0))
-        y = int(getattr(e, 'local_y', 0))
+        x, y = self._event_position(e)
         # 不打印悬停事件，避免日志过多
         # print(f"GestureDetector - 鼠标悬停: x={x}, y={y}")
     
-    def _flet_key_to_android_keycode(self, flet_key: str) -> int:
+    @staticmethod
+    def _flet_key_to_android_keycode(flet_key: str) -> int:
         """将Flet键盘事件的key转换为Android按键码"""
         # 字母键映射
         if len(flet_key) == 1 and flet_key.isalpha():
@@ -520,81 +938,12 @@ class DeviceView(ft.Container):
             return const.KEYCODE_0 + int(flet_key)
         
         # 特殊键映射
-        key_mapping = {
-            'Space': const.KEYCODE_SPACE,
-            'Enter': const.KEYCODE_ENTER,
-            'Backspace': const.KEYCODE_DEL,
-            'Delete': const.KEYCODE_FORWARD_DEL,
-            'Tab': const.KEYCODE_TAB,
-            'Escape': const.KEYCODE_ESCAPE,
-            'Arrow Up': const.KEYCODE_DPAD_UP,
-            'Arrow Down': const.KEYCODE_DPAD_DOWN,
-            'Arrow Left': const.KEYCODE_DPAD_LEFT,
-            'Arrow Right': const.KEYCODE_DPAD_RIGHT,
-            'Home': const.KEYCODE_HOME,
-            'End': const.KEYCODE_MOVE_END,
-            'Page Up': const.KEYCODE_PAGE_UP,
-            'Page Down': const.KEYCODE_PAGE_DOWN,
-            'Insert': const.KEYCODE_INSERT,
-            'F1': const.KEYCODE_F1,
-            'F2': const.KEYCODE_F2,
-            'F3': const.KEYCODE_F3,
-            'F4': const.KEYCODE_F4,
-            'F5': const.KEYCODE_F5,
-            'F6': const.KEYCODE_F6,
-            'F7': const.KEYCODE_F7,
-            'F8': const.KEYCODE_F8,
-            'F9': const.KEYCODE_F9,
-            'F10': const.KEYCODE_F10,
-            'F11': const.KEYCODE_F11,
-            'F12': const.KEYCODE_F12,
-            'Shift Left': const.KEYCODE_SHIFT_LEFT,
-            'Shift Right': const.KEYCODE_SHIFT_RIGHT,
-            'Control Left': const.KEYCODE_CTRL_LEFT,
-            'Control Right': const.KEYCODE_CTRL_RIGHT,
-            'Alt Left': const.KEYCODE_ALT_LEFT,
-            'Alt Right': const.KEYCODE_ALT_RIGHT,
-            'Meta Left': const.KEYCODE_META_LEFT,
-            'Meta Right': const.KEYCODE_META_RIGHT,
-            'Caps Lock': const.KEYCODE_CAPS_LOCK,
-            'Num Lock': const.KEYCODE_NUM_LOCK,
-            'Scroll Lock': const.KEYCODE_SCROLL_LOCK,
-            # 标点符号
-            ',': const.KEYCODE_COMMA,
-            '.': const.KEYCODE_PERIOD,
-            '/': const.KEYCODE_SLASH,
-            ';': const.KEYCODE_SEMICOLON,
-            "'": const.KEYCODE_APOSTROPHE,
-            '[': const.KEYCODE_LEFT_BRACKET,
-            ']': const.KEYCODE_RIGHT_BRACKET,
-            '\\': const.KEYCODE_BACKSLASH,
-            '-': const.KEYCODE_MINUS,
-            '=': const.KEYCODE_EQUALS,
-            '`': const.KEYCODE_GRAVE,
-            # 数字键盘
-            'Numpad 0': const.KEYCODE_NUMPAD_0,
-            'Numpad 1': const.KEYCODE_NUMPAD_1,
-            'Numpad 2': const.KEYCODE_NUMPAD_2,
-            'Numpad 3': const.KEYCODE_NUMPAD_3,
-            'Numpad 4': const.KEYCODE_NUMPAD_4,
-            'Numpad 5': const.KEYCODE_NUMPAD_5,
-            'Numpad 6': const.KEYCODE_NUMPAD_6,
-            'Numpad 7': const.KEYCODE_NUMPAD_7,
-            'Numpad 8': const.KEYCODE_NUMPAD_8,
-            'Numpad 9': const.KEYCODE_NUMPAD_9,
-            'Numpad Divide': const.KEYCODE_NUMPAD_DIVIDE,
-            'Numpad Multiply': const.KEYCODE_NUMPAD_MULTIPLY,
-            'Numpad Subtract': const.KEYCODE_NUMPAD_SUBTRACT,
-            'Numpad Add': const.KEYCODE_NUMPAD_ADD,
-            'Numpad Decimal': const.KEYCODE_NUMPAD_DOT,
-            'Numpad Enter': const.KEYCODE_NUMPAD_ENTER,
-        }
-        
-        return key_mapping.get(flet_key, const.KEYCODE_UNKNOWN)
+        return FLET_KEY_MAPPING.get(flet_key, const.KEYCODE_UNKNOWN)
     
     def keyPressEvent(self, e):
         """处理键盘按键事件"""
-        print(f"🔑 键盘事件: key='{e.key}', shift={e.shift}, ctrl={e.ctrl}, alt={e.alt}")
+        if DEBUG:
+            print(f"🔑 键盘事件: key='{e.key}', shift={e.shift}, ctrl={e.ctrl}, alt={e.alt}")
         
         # 详细检查设备连接状态
         if not self.client:
@@ -612,8 +961,6 @@ class DeviceView(ft.Container):
         if not self.client.control:
             print("❌ 错误: control对象为None")
             return
-            
-        print(f"✅ 设备连接正常，control对象存在")
         
         try:
             # 处理修饰键状态
@@ -627,6 +974,10 @@ class DeviceView(ft.Container):
                 self.key_alt_down = True
                 return
             
+            # UHID模式下可映射的按键直接发送HID报告（带修饰键）
+            if self.uhid_keyboard and self._send_uhid_key(e):
+                return
+            
             # 系统功能键使用keycode方法
             system_keys = {
                 'Escape': const.KEYCODE_BACK,
@@ -658,7 +1009,9 @@ class DeviceView(ft.Container):
             
             if e.key in system_keys:
                 keycode = system_keys[e.key]
-                print(f"🎮 发送系统按键: {e.key} (keycode: {keycode})")
+                if DEBUG:
+                    print(f"🎮 发送系统按键: {e.key} (keycode: {keycode})")
+                self._flush_text_input()
                 self.client.control.keycode(keycode, const.ACTION_DOWN)
                 self.client.control.keycode(keycode, const.ACTION_UP)
                 return
@@ -675,23 +1028,30 @@ class DeviceView(ft.Container):
                 # 这些功能键使用keycode方法
                 android_keycode = self._flet_key_to_android_keycode(e.key)
                 if android_keycode != const.KEYCODE_UNKNOWN:
-                    print(f"🎮 发送功能按键: {e.key} (keycode: {android_keycode})")
+                    if DEBUG:
+                        print(f"🎮 发送功能按键: {e.key} (keycode: {android_keycode})")
+                    self._flush_text_input()
                     self.client.control.keycode(android_keycode, const.ACTION_DOWN)
                     self.client.control.keycode(android_keycode, const.ACTION_UP)
                 else:
                     print(f"❓ 未知功能按键: '{e.key}'")
                 return
             
-            # 只有可打印的单字符才使用text方法
+            # 只有可打印的单字符才使用text方法，交给文本管线合并发送
             if (len(e.key) == 1 and e.key.isprintable()):
-                print(f"📝 发送文本: '{e.key}'")
-                result = self.client.control.text(e.key)
-                print(f"📤 文本发送结果: {len(result) if result else 0} bytes")
+                if DEBUG:
+                    print(f"📝 缓冲文本: '{e.key}'")
+                if self.text_input:
+                    self.text_input.feed(e.key)
+                else:
+                    self.client.control.text(e.key)
             else:
                 # 其他未处理的按键尝试使用keycode方法
                 android_keycode = self._flet_key_to_android_keycode(e.key)
                 if android_keycode != const.KEYCODE_UNKNOWN:
-                    print(f"🎮 发送其他按键: {e.key} (keycode: {android_keycode})")
+                    if DEBUG:
+                        print(f"🎮 发送其他按键: {e.key} (keycode: {android_keycode})")
+                    self._flush_text_input()
                     self.client.control.keycode(android_keycode, const.ACTION_DOWN)
                     self.client.control.keycode(android_keycode, const.ACTION_UP)
                 else:
@@ -700,6 +1060,41 @@ class DeviceView(ft.Container):
         except Exception as ex:
             print(f"键盘事件发送失败: {ex}")
     
+    def _send_uhid_key(self, e) -> bool:
+        """通过UHID键盘发送按键，返回False表示该键没有HID映射
+        
+        Flet只提供按下事件、没有释放事件，无法按住HID按键交给Android重复，
+        所以每个事件发送一次按下+释放；按住时主机系统重复产生的按下事件会逐个发送，
+        按键重复速率由主机决定
+        """
+        usage = FLET_KEY_TO_HID.get(e.key)
+        if usage is None:
+            return False
+        self._flush_text_input()
+        modifiers = uhid.modifier_bits(
+            shift=e.shift, ctrl=e.ctrl, alt=e.alt, meta=getattr(e, 'meta', False)
+        )
+        if DEBUG:
+            print(f"⌨️ 发送HID按键: {e.key} (usage: 0x{usage:02X}, modifiers: 0x{modifiers:02X})")
+        self.uhid_keyboard.tap(usage, modifiers)
+        return True
+    
+    def _flush_text_input(self):
+        """发送keycode前先发出缓冲中的文本，保证输入顺序"""
+        if self.text_input:
+            self.text_input.flush()
+    
+    def input_text(self, text: str) -> bool:
+        """向设备输入一段文本（脚本/批量输入），长文本自动走剪贴板粘贴
+        
+        Returns:
+            bool: 文本是否确认送达
+        """
+        if not self.client or not self.client.alive or not self.text_input:
+            print("❌ 错误: 设备未连接，无法输入文本")
+            return False
+        return self.text_input.send_text(text)
+    
     def keyReleaseEvent(self, e):
         """处理键盘释放事件"""
         # 处理修饰键状态
@@ -709,3 +1104,25 @@ class DeviceView(ft.Container):
             self.key_ctrl_down = False
         elif e.key in ['Alt Left', 'Alt Right']:
             self.key_alt_down = False
+
+
+# 映射为Android导航操作的按键（Escape=返回、Home=主屏幕），UHID模式下仍按keycode发送
+NAVIGATION_KEYS = ('Escape', 'Home', 'Menu')
+
+
+def _build_flet_key_to_hid() -> dict:
+    """由Flet键名经Android按键码生成HID usage映射表，导航键除外"""
+    flet_keys = [chr(c) for c in range(ord('A'), ord('Z') + 1)]
+    flet_keys += [str(d) for d in range(10)]
+    flet_keys += [key for key in FLET_KEY_MAPPING if key not in NAVIGATION_KEYS]
+    
+    mapping = {}
+    for flet_key in flet_keys:
+        usage = uhid.android_keycode_to_hid(DeviceView._flet_key_to_android_keycode(flet_key))
+        if usage is not None:
+            mapping[flet_key] = usage
+    return mapping
+
+
+# Flet键名到HID usage的映射
+FLET_KEY_TO_HID = _build_flet_key_to_hid()
@@ -0,0 +1,102 @@
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector:
+    """画面变化检测
+
+    把帧缩小为低分辨率亮度图（INTER_AREA 取区域平均，细小变化也会改变平均值），
+    按网格分块与上一次显示的亮度图比较。没有任何分块变化时跳过编码和UI更新，基准保持为
+    上一次显示的帧，缓慢的渐变累积超过容差后仍会被发现。
+    视频包提示：关键帧（例如 reset_video 或分辨率变化后）强制视为变化。
+    """
+
+    def __init__(self, sample_width: int = 160, tile_size: int = 16, tolerance: int = 0):
+        """
+        Args:
+            sample_width: 缩小后亮度图的宽度（像素）
+            tile_size: 分块边长（缩小后的像素）
+            tolerance: 亮度差容差，分块内最大差值超过该值才算变化
+        """
+        self.sample_width = sample_width
+        self.tile_size = tile_size
+        self.tolerance = tolerance
+
+        self.lock = threading.Lock()
+        self.signature: Optional[np.ndarray] = None
+        self.changed_tiles: Optional[np.ndarray] = None
+        self.force_next = True
+
+        # 统计信息
+        self.checked = 0
+        self.skipped = 0
+        self.key_frames = 0
+
+    def note_packet(self, packet):
+        """Client 的 packet 事件回调，关键帧之后的下一帧强制视为变化"""
+        if packet.config or not packet.key_frame:
+            return
+        self.key_frames += 1
+        with self.lock:
+            self.force_next = True
+
+    def _sample(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        sample_height = max(1, round(height * self.sample_width / width))
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (self.sample_width, sample_height), interpolation=cv2.INTER_AREA)
+
+    def check(self, frame: np.ndarray) -> bool:
+        """判断帧与上一次显示的帧相比是否变化，变化时更新基准
+
+        Returns:
+            True 表示需要显示，False 表示画面未变化可以跳过
+        """
+        sample = self._sample(frame)
+        with self.lock:
+            self.checked += 1
+            previous = self.signature
+            force = self.force_next
+            self.force_next = False
+
+            if force or previous is None or previous.shape != sample.shape:
+                rows = -(-sample.shape[0] // self.tile_size)
+                cols = -(-sample.shape[1] // self.tile_size)
+                self.changed_tiles = np.ones((rows, cols), dtype=bool)
+                self.signature = sample
+                return True
+
+            self.changed_tiles = self._diff_tiles(previous, sample)
+            if self.changed_tiles.any():
+                self.signature = sample
+                return True
+            self.skipped += 1
+            return False
+
+    def _diff_tiles(self, previous: np.ndarray, sample: np.ndarray) -> np.ndarray:
+        """按分块计算变化掩码"""
+        diff = cv2.absdiff(previous, sample) > self.tolerance
+        height, width = diff.shape
+        tile = self.tile_size
+        rows = -(-height // tile)
+        cols = -(-width // tile)
+        padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+        padded[:height, :width] = diff
+        return padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+    def reset(self):
+        """下一帧强制视为变化（例如显示端重新连接后）"""
+        with self.lock:
+            self.force_next = True
+
+    def get_stats(self) -> dict:
+        """获取检测统计信息"""
+        return {
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / self.checked if self.checked else 0.0,
+            "key_frames": self.key_frames,
+        }
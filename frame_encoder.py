@@ -0,0 +1,361 @@
+"""显示帧编码后端与自适应质量控制
+
+后端:
+    jpeg        OpenCV JPEG（默认）
+    turbojpeg   libjpeg-turbo（需要安装 PyTurboJPEG，未安装时不可用）
+    webp        OpenCV WebP
+    raw         未压缩的32位BMP，编码几乎只有内存拷贝，适合本机桌面模式
+
+基准测试（对录制的帧比较各后端的编码耗时和大小）:
+    python frame_encoder.py recorded.mp4
+    python frame_encoder.py frames_dir/ --quality 80 --subsampling 420
+"""
+import abc
+import argparse
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TJPF_BGR, TJSAMP_420, TJSAMP_422, TJSAMP_444, TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+
+SUBSAMPLING_444 = "444"
+SUBSAMPLING_422 = "422"
+SUBSAMPLING_420 = "420"
+
+
+class FrameEncoder(abc.ABC):
+    """编码后端基类，encode 输入BGR帧，返回编码后的字节"""
+
+    name = ""
+    mime = ""
+    # 是否支持质量和色度抽样参数
+    lossy = True
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @abc.abstractmethod
+    def encode(self, frame: np.ndarray, quality: int = 85, subsampling: str = SUBSAMPLING_420) -> bytes:
+        raise NotImplementedError
+
+
+class OpenCVJpegEncoder(FrameEncoder):
+    name = "jpeg"
+    mime = "image/jpeg"
+
+    SAMPLING_FACTORS = {
+        SUBSAMPLING_444: cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+        SUBSAMPLING_422: cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+        SUBSAMPLING_420: cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    }
+
+    def encode(self, frame, quality=85, subsampling=SUBSAMPLING_420):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality),
+                  cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self.SAMPLING_FACTORS[subsampling]]
+        ok, buffer = cv2.imencode(".jpg", frame, params)
+        if not ok:
+            raise ValueError("JPEG编码失败")
+        return buffer.tobytes()
+
+
+class TurboJpegEncoder(FrameEncoder):
+    name = "turbojpeg"
+    mime = "image/jpeg"
+
+    def __init__(self):
+        self.turbo = TurboJPEG()
+        self.subsamplings = {
+            SUBSAMPLING_444: TJSAMP_444,
+            SUBSAMPLING_422: TJSAMP_422,
+            SUBSAMPLING_420: TJSAMP_420,
+        }
+
+    @classmethod
+    def available(cls) -> bool:
+        if TurboJPEG is None:
+            return False
+        try:
+            TurboJPEG()
+        except (OSError, RuntimeError):
+            # 已安装Python绑定但找不到libjpeg-turbo动态库
+            return False
+        return True
+
+    def encode(self, frame, quality=85, subsampling=SUBSAMPLING_420):
+        return self.turbo.encode(frame, quality=int(quality), pixel_format=TJPF_BGR,
+                                 jpeg_subsample=self.subsamplings[subsampling])
+
+
+class WebpEncoder(FrameEncoder):
+    name = "webp"
+    mime = "image/webp"
+
+    def encode(self, frame, quality=85, subsampling=SUBSAMPLING_420):
+        # WebP有损模式固定为4:2:0，忽略色度抽样参数
+        ok, buffer = cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, int(quality)])
+        if not ok:
+            raise ValueError("WebP编码失败")
+        return buffer.tobytes()
+
+
+class RawBmpEncoder(FrameEncoder):
+    """未压缩位图：32位自上而下BMP，行无需补齐，浏览器和Flutter都能直接显示"""
+
+    name = "raw"
+    mime = "image/bmp"
+    lossy = False
+
+    def encode(self, frame, quality=85, subsampling=SUBSAMPLING_420):
+        height, width = frame.shape[:2]
+        bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+        pixels = bgra.tobytes()
+        header_size = 14 + 40
+        file_header = struct.pack("<2sIHHI", b"BM", header_size + len(pixels), 0, 0, header_size)
+        # 负高度表示自上而下存储
+        info_header = struct.pack("<IiiHHIIiiII", 40, width, -height, 1, 32, 0, len(pixels), 2835, 2835, 0, 0)
+        return file_header + info_header + pixels
+
+
+ENCODERS = {
+    OpenCVJpegEncoder.name: OpenCVJpegEncoder,
+    TurboJpegEncoder.name: TurboJpegEncoder,
+    WebpEncoder.name: WebpEncoder,
+    RawBmpEncoder.name: RawBmpEncoder,
+}
+
+
+def available_encoders() -> List[str]:
+    """当前环境可用的后端名称"""
+    return [name for name, cls in ENCODERS.items() if cls.available()]
+
+
+def create_encoder(name: str = "auto") -> FrameEncoder:
+    """按名称创建编码后端，auto 优先使用 libjpeg-turbo，不可用的后端回退到OpenCV JPEG"""
+    if name == "auto":
+        name = TurboJpegEncoder.name if TurboJpegEncoder.available() else OpenCVJpegEncoder.name
+    cls = ENCODERS.get(name)
+    if cls is None:
+        raise ValueError(f"未知的编码后端: {name}，可选: {', '.join(ENCODERS)}")
+    if not cls.available():
+        print(f"编码后端 {name} 不可用，回退到OpenCV JPEG")
+        cls = OpenCVJpegEncoder
+    return cls()
+
+
+class AdaptiveQualityController:
+    """自适应质量控制
+
+    根据最近几帧的编码耗时和大小（指数平滑）调整质量和色度抽样：
+    超出目标编码时间或每帧字节预算时降低质量并改用4:2:0；
+    两者都有明显余量时逐步提高质量，质量接近上限时改用4:4:4使文字边缘更清晰。
+    """
+
+    def __init__(self, target_ms: float = 10.0, byte_budget: Optional[int] = 120 * 1024,
+                 quality: int = 85, min_quality: int = 40, max_quality: int = 92,
+                 step: int = 5, smoothing: float = 0.3):
+        """
+        Args:
+            target_ms: 每帧目标编码时间（毫秒）
+            byte_budget: 每帧字节预算，None表示不限制
+            quality: 初始质量
+            min_quality: 最低质量
+            max_quality: 最高质量
+            step: 每次调整的质量步长
+            smoothing: 指数平滑系数 (0-1]，越大对最新一帧越敏感
+        """
+        self.target_ms = target_ms
+        self.byte_budget = byte_budget
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.step = step
+        self.smoothing = smoothing
+
+        self.quality = max(min_quality, min(max_quality, quality))
+        self.subsampling = SUBSAMPLING_420
+        self.avg_ms: Optional[float] = None
+        self.avg_bytes: Optional[float] = None
+        self.adjustments = 0
+
+    def settings(self) -> Tuple[int, str]:
+        """当前使用的 (质量, 色度抽样)"""
+        return self.quality, self.subsampling
+
+    def update(self, encode_ms: float, size: int) -> Tuple[int, str]:
+        """记录一次编码结果并返回下一帧的设置"""
+        if self.avg_ms is None:
+            self.avg_ms, self.avg_bytes = encode_ms, float(size)
+        else:
+            self.avg_ms += (encode_ms - self.avg_ms) * self.smoothing
+            self.avg_bytes += (size - self.avg_bytes) * self.smoothing
+
+        time_ratio = self.avg_ms / self.target_ms if self.target_ms else 0.0
+        byte_ratio = self.avg_bytes / self.byte_budget if self.byte_budget else 0.0
+        load = max(time_ratio, byte_ratio)
+
+        quality, subsampling = self.quality, self.subsampling
+        if load > 1.0:
+            if subsampling != SUBSAMPLING_420:
+                subsampling = SUBSAMPLING_420
+            else:
+                quality = max(self.min_quality, quality - self.step)
+        elif load < 0.6:
+            if quality < self.max_quality:
+                quality = min(self.max_quality, quality + 1)
+            elif load < 0.4:
+                subsampling = SUBSAMPLING_444
+
+        if (quality, subsampling) != (self.quality, self.subsampling):
+            self.quality, self.subsampling = quality, subsampling
+            self.adjustments += 1
+            # 设置变化后重新开始统计，避免用旧设置的数据连续调整
+            self.avg_ms = self.avg_bytes = None
+        return self.settings()
+
+    def get_stats(self) -> dict:
+        return {
+            "quality": self.quality,
+            "subsampling": self.subsampling,
+            "avg_ms": self.avg_ms,
+            "avg_bytes": self.avg_bytes,
+            "adjustments": self.adjustments,
+        }
+
+
+class AdaptiveEncoder:
+    """编码后端 + 自适应质量控制"""
+
+    def __init__(self, encoder: FrameEncoder, controller: Optional[AdaptiveQualityController] = None):
+        self.encoder = encoder
+        self.controller = controller if controller is not None and encoder.lossy else None
+        self.frames = 0
+        self.total_bytes = 0
+        self.total_ms = 0.0
+
+    @property
+    def mime(self) -> str:
+        return self.encoder.mime
+
+    def encode(self, frame: np.ndarray) -> bytes:
+        if self.controller is not None:
+            quality, subsampling = self.controller.settings()
+        else:
+            quality, subsampling = 85, SUBSAMPLING_420
+        start = time.perf_counter()
+        data = self.encoder.encode(frame, quality, subsampling)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        if self.controller is not None:
+            self.controller.update(elapsed_ms, len(data))
+        self.frames += 1
+        self.total_bytes += len(data)
+        self.total_ms += elapsed_ms
+        return data
+
+    def get_stats(self) -> dict:
+        stats = {
+            "encoder": self.encoder.name,
+            "frames": self.frames,
+            "avg_ms": self.total_ms / self.frames if self.frames else 0.0,
+            "avg_bytes": self.total_bytes / self.frames if self.frames else 0.0,
+        }
+        if self.controller is not None:
+            stats.update({f"controller_{k}": v for k, v in self.controller.get_stats().items()})
+        return stats
+
+
+def load_frames(source: str, limit: int = 200, max_width: int = 0) -> List[np.ndarray]:
+    """读取录制的帧：图片目录或视频文件"""
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".webp")):
+                frame = cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    frames.append(frame)
+            if len(frames) >= limit:
+                break
+    else:
+        capture = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+    if max_width:
+        frames = [
+            cv2.resize(f, (max_width, round(f.shape[0] * max_width / f.shape[1])), interpolation=cv2.INTER_AREA)
+            if f.shape[1] > max_width else f
+            for f in frames
+        ]
+    return frames
+
+
+def benchmark(frames: List[np.ndarray], encoders: List[str], quality: int = 85,
+              subsampling: str = SUBSAMPLING_420, repeat: int = 1) -> Dict[str, dict]:
+    """比较各后端的编码耗时（毫秒）和大小"""
+    results = {}
+    for name in encoders:
+        encoder = create_encoder(name)
+        if encoder.name != name:
+            continue
+        timings, sizes = [], []
+        for _ in range(repeat):
+            for frame in frames:
+                start = time.perf_counter()
+                data = encoder.encode(frame, quality, subsampling)
+                timings.append((time.perf_counter() - start) * 1000.0)
+                sizes.append(len(data))
+        timings = np.array(timings)
+        results[name] = {
+            "avg_ms": float(timings.mean()),
+            "p95_ms": float(np.percentile(timings, 95)),
+            "avg_kb": float(np.mean(sizes)) / 1024.0,
+            "fps": 1000.0 / float(timings.mean()) if timings.mean() else 0.0,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较显示帧编码后端")
+    parser.add_argument("source", help="录制的视频文件或图片目录")
+    parser.add_argument("--limit", type=int, default=200, help="最多读取的帧数")
+    parser.add_argument("--max-width", type=int, default=0, help="编码前缩小到该宽度，0表示原尺寸")
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--subsampling", choices=[SUBSAMPLING_444, SUBSAMPLING_422, SUBSAMPLING_420],
+                        default=SUBSAMPLING_420)
+    parser.add_argument("--repeat", type=int, default=1, help="重复次数")
+    parser.add_argument("--encoders", default=",".join(ENCODERS), help="逗号分隔的后端名称")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.limit, args.max_width)
+    if not frames:
+        print(f"没有从 {args.source} 读取到帧")
+        sys.exit(1)
+    height, width = frames[0].shape[:2]
+    print(f"帧数: {len(frames)}, 分辨率: {width}x{height}, 质量: {args.quality}, 色度抽样: {args.subsampling}")
+
+    names = [name for name in args.encoders.split(",") if name]
+    unavailable = [name for name in names if name in ENCODERS and not ENCODERS[name].available()]
+    if unavailable:
+        print(f"不可用的后端: {', '.join(unavailable)}")
+    results = benchmark(frames, [n for n in names if n not in unavailable], args.quality,
+                        args.subsampling, args.repeat)
+
+    print(f"\n{'后端':<12}{'平均(ms)':>10}{'P95(ms)':>10}{'平均(KB)':>10}{'FPS':>8}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['avg_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['avg_kb']:>10.1f}{result['fps']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
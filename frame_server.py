@@ -0,0 +1,339 @@
+"""设备画面旁路流媒体服务
+
+视频数据不再经过 Flet 控件协议（base64 + JSON diff），而是由独立的 HTTP 服务
+以二进制形式提供，ft.Image 只需指向该服务的 URL：
+
+    GET /frame/<channel>?seq=N   最新一帧 JPEG（ft.Image.src 使用，seq 用于刷新）
+    GET /stream/<channel>        MJPEG multipart 流（浏览器 <img> 可直接播放）
+    GET /ws/<channel>            二进制 WebSocket，每条消息为一帧
+    GET /view/<channel>          基于 WebSocket 的简易查看页面
+
+默认只监听本机。远程浏览器（Flet WEB_BROWSER 模式）访问时设置 FRAME_SERVER_HOST=0.0.0.0，
+对外地址未配置（FRAME_SERVER_PUBLIC_URL）时按页面自身的主机名推导。
+"""
+import base64
+import hashlib
+import json
+import os
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import quote, unquote, urlparse
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MJPEG_BOUNDARY = "frame"
+
+VIEW_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{channel}</title>
+<style>html,body{{margin:0;height:100%;background:#222}}canvas{{width:100%;height:100%;object-fit:contain}}</style>
+</head><body><canvas id="c"></canvas><script>
+const canvas = document.getElementById("c");
+const ctx = canvas.getContext("2d");
+const ws = new WebSocket(`ws://${{location.host}}/ws/{channel}`);
+ws.binaryType = "arraybuffer";
+ws.onmessage = async (e) => {{
+  const bitmap = await createImageBitmap(new Blob([e.data], {{type: {content_type}}}));
+  if (canvas.width !== bitmap.width || canvas.height !== bitmap.height) {{
+    canvas.width = bitmap.width; canvas.height = bitmap.height;
+  }}
+  ctx.drawImage(bitmap, 0, 0);
+  bitmap.close();
+}};
+</script></body></html>
+"""
+
+
+def websocket_handshake(handler: BaseHTTPRequestHandler) -> bool:
+    """完成WebSocket握手，失败时返回False"""
+    key = handler.headers.get("Sec-WebSocket-Key")
+    if not key or handler.headers.get("Upgrade", "").lower() != "websocket":
+        handler.send_error(400, "WebSocket upgrade required")
+        return False
+    accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+    handler.send_response(101, "Switching Protocols")
+    handler.send_header("Upgrade", "websocket")
+    handler.send_header("Connection", "Upgrade")
+    handler.send_header("Sec-WebSocket-Accept", accept)
+    handler.end_headers()
+    return True
+
+
+def websocket_send(wfile, data: bytes, opcode: int = 0x2) -> None:
+    """发送一条未分片、无掩码的WebSocket消息（默认二进制）"""
+    length = len(data)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 0x10000:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    wfile.write(header + data)
+    wfile.flush()
+
+
+class FrameChannel:
+    """单个设备的最新帧槽位，发布者覆盖写入，订阅者只取最新一帧"""
+
+    def __init__(self, content_type: str = "image/jpeg"):
+        self.condition = threading.Condition()
+        self.content_type = content_type
+        self.data: Optional[bytes] = None
+        self.seq = 0
+        # 已被 /frame 请求取走的最新序号，用于判断上一帧是否仍在传输
+        self.served_seq = 0
+        # 通道被删除后流式订阅结束
+        self.closed = False
+
+    def publish(self, data: bytes) -> int:
+        with self.condition:
+            self.data = data
+            self.seq += 1
+            self.condition.notify_all()
+            return self.seq
+
+    def latest(self):
+        with self.condition:
+            return self.seq, self.data
+
+    def mark_served(self, seq: int):
+        with self.condition:
+            self.served_seq = max(self.served_seq, seq)
+
+    def wait_newer(self, seq: int, timeout: float = 5.0):
+        """等待比seq更新的帧，超时返回当前帧"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq > seq or self.closed, timeout)
+            return self.seq, self.data
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class FrameRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "NanoAndroidFrameServer"
+
+    def log_message(self, format, *args):
+        # 帧请求频率很高，不输出访问日志
+        pass
+
+    def _send_headers(self, code: int, content_type: str, length: Optional[int] = None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if length is not None:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def do_GET(self):
+        frame_server: "FrameServer" = self.server.frame_server
+        path = urlparse(self.path).path
+        parts = path.strip("/").split("/", 1)
+        if len(parts) != 2:
+            self.send_error(404)
+            return
+        route, channel_name = parts[0], unquote(parts[1])
+
+        custom = frame_server.routes.get(route)
+        if custom is not None:
+            custom(self, channel_name)
+            return
+
+        if route == "view":
+            # 页面按通道当前的编码格式解码，通道尚未创建时按默认的JPEG
+            channel = frame_server.channels.get(channel_name)
+            content_type = channel.content_type if channel is not None else "image/jpeg"
+            body = VIEW_PAGE.format(channel=quote(channel_name),
+                                    content_type=json.dumps(content_type)).encode("utf-8")
+            self._send_headers(200, "text/html; charset=utf-8", len(body))
+            self.wfile.write(body)
+            return
+
+        # 流式订阅允许先于设备连接建立，帧请求则要求通道已有数据
+        if route in ("stream", "ws"):
+            channel = frame_server.channel(channel_name)
+        else:
+            channel = frame_server.channels.get(channel_name)
+        if channel is None:
+            self.send_error(404, "Unknown channel")
+            return
+
+        try:
+            if route == "frame":
+                self._serve_frame(channel)
+            elif route == "stream":
+                self._serve_mjpeg(frame_server, channel)
+            elif route == "ws":
+                self._serve_websocket(frame_server, channel)
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            # 浏览器关闭或切换页面
+            pass
+
+    def _serve_frame(self, channel: FrameChannel):
+        seq, data = channel.latest()
+        if data is None:
+            self.send_error(404, "No frame yet")
+            return
+        self._send_headers(200, channel.content_type, len(data))
+        self.wfile.write(data)
+        channel.mark_served(seq)
+
+    def _serve_mjpeg(self, frame_server: "FrameServer", channel: FrameChannel):
+        self.close_connection = True
+        self._send_headers(200, f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}")
+        seq = 0
+        while frame_server.running and not channel.closed:
+            new_seq, data = channel.wait_newer(seq)
+            if data is None or new_seq == seq:
+                continue
+            seq = new_seq
+            self.wfile.write(
+                f"--{MJPEG_BOUNDARY}\r\nContent-Type: {channel.content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n".encode() + data + b"\r\n"
+            )
+            self.wfile.flush()
+
+    def _serve_websocket(self, frame_server: "FrameServer", channel: FrameChannel):
+        self.close_connection = True
+        if not websocket_handshake(self):
+            return
+        seq = 0
+        while frame_server.running and not channel.closed:
+            new_seq, data = channel.wait_newer(seq)
+            if data is None or new_seq == seq:
+                continue
+            seq = new_seq
+            websocket_send(self.wfile, data)
+
+
+class FrameServer:
+    """旁路帧服务，多个设备视图共享一个实例"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8551, public_url: Optional[str] = None):
+        """
+        Args:
+            host: 监听地址，远程浏览器访问时设为 0.0.0.0
+            port: 监听端口，0表示随机端口
+            public_url: 浏览器访问本服务使用的地址，默认 http://host:port（监听所有地址时为本机地址），
+                未指定时网页端按页面的主机名推导
+        """
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self.derive_from_page = public_url is None
+        self.channels: Dict[str, FrameChannel] = {}
+        self.routes: Dict[str, Callable[[BaseHTTPRequestHandler, str], None]] = {}
+        self.lock = threading.Lock()
+        self.httpd: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+
+    def start(self):
+        """启动HTTP服务线程"""
+        with self.lock:
+            if self.running:
+                return
+            self.httpd = ThreadingHTTPServer((self.host, self.port), FrameRequestHandler)
+            self.httpd.daemon_threads = True
+            self.httpd.frame_server = self
+            self.port = self.httpd.server_address[1]
+            if self.public_url is None:
+                host = "127.0.0.1" if self.host in ("", "0.0.0.0", "::") else self.host
+                self.public_url = f"http://{_url_host(host)}:{self.port}"
+            self.running = True
+            self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            self.thread.start()
+            print(f"帧服务已启动: {self.public_url}")
+
+    def stop(self):
+        """停止HTTP服务"""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            for channel in self.channels.values():
+                with channel.condition:
+                    channel.condition.notify_all()
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def channel(self, name: str, content_type: str = "image/jpeg") -> FrameChannel:
+        """获取或创建帧通道"""
+        with self.lock:
+            channel = self.channels.get(name)
+            if channel is None:
+                channel = FrameChannel(content_type)
+                self.channels[name] = channel
+            return channel
+
+    def remove_channel(self, name: str):
+        """删除通道，正在订阅的流随之结束"""
+        with self.lock:
+            channel = self.channels.pop(name, None)
+        if channel is not None:
+            channel.close()
+
+    def publish(self, name: str, data: bytes, content_type: Optional[str] = None) -> int:
+        """发布一帧二进制数据，返回帧序号"""
+        channel = self.channel(name)
+        if content_type:
+            channel.content_type = content_type
+        return channel.publish(data)
+
+    def add_route(self, route: str, handler: Callable[[BaseHTTPRequestHandler, str], None]):
+        """注册自定义路由 /<route>/<channel>"""
+        self.routes[route] = handler
+
+    def base_url(self, page=None) -> str:
+        """页面访问本服务使用的地址
+
+        Args:
+            page: Flet页面，网页端且未配置对外地址时使用页面的主机名（远程浏览器访问本机的地址）
+        """
+        if page is not None and self.derive_from_page and getattr(page, "web", False):
+            hostname = urlparse(getattr(page, "url", None) or "").hostname
+            if hostname:
+                return f"http://{_url_host(hostname)}:{self.port}"
+        return self.public_url
+
+    def frame_url(self, name: str, seq: int, base: Optional[str] = None) -> str:
+        """ft.Image 使用的最新帧地址，seq 变化使客户端重新拉取；base 为 base_url(page) 的结果"""
+        return f"{base or self.public_url}/frame/{quote(name)}?seq={seq}"
+
+    def stream_url(self, name: str, base: Optional[str] = None) -> str:
+        return f"{base or self.public_url}/stream/{quote(name)}"
+
+    def websocket_url(self, name: str, base: Optional[str] = None) -> str:
+        return f"{(base or self.public_url).replace('http', 'ws', 1)}/ws/{quote(name)}"
+
+
+def _url_host(host: str) -> str:
+    """IPv6地址在URL中需要加方括号"""
+    return f"[{host}]" if ":" in host else host
+
+
+_server: Optional[FrameServer] = None
+_server_lock = threading.Lock()
+
+
+def get_frame_server() -> FrameServer:
+    """获取全局帧服务（首次调用时启动），监听地址、端口和对外地址可由环境变量
+    FRAME_SERVER_HOST / FRAME_SERVER_PORT / FRAME_SERVER_PUBLIC_URL 配置"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = FrameServer(
+                host=os.environ.get("FRAME_SERVER_HOST", "127.0.0.1"),
+                port=int(os.environ.get("FRAME_SERVER_PORT", "8551")),
+                public_url=os.environ.get("FRAME_SERVER_PUBLIC_URL") or None,
+            )
+        _server.start()
+        return _server
@@ -0,0 +1,149 @@
+"""多设备同步截图
+
+在同一个主机时刻读取所有设备的最新帧（每台设备只读一次 Client.last_snapshot 引用，
+20台设备的读取窗口在微秒级），记录每帧的设备PTS、解码时刻和相对截图时刻的帧龄，
+再在截图服务线程池中并行编码保存，可选拼接为一张对比总览图（contact sheet）。
+
+屏幕静止时 scrcpy 不发送新帧，帧龄较大只说明画面在此期间没有变化。
+"""
+import math
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from screenshot_service import ScreenshotResult, ScreenshotService, get_screenshot_service
+
+# 总览图中每台设备下方的标签高度（像素）
+LABEL_HEIGHT = 24
+
+
+class GroupFrame:
+    """一台设备在截图时刻的最新帧"""
+
+    def __init__(self, serial: str, frame: np.ndarray, pts: Optional[int], frame_time: float, instant: float):
+        self.serial = serial
+        self.frame = frame
+        self.pts = pts
+        self.frame_time = frame_time
+        # 帧龄：截图时刻与该帧解码时刻之差
+        self.age_ms = (instant - frame_time) * 1000
+
+
+class GroupCapture:
+    """一次同步截图的结果"""
+
+    def __init__(self, instant: float, frames: List[GroupFrame], missing: List[str], read_us: float):
+        self.instant = instant
+        self.timestamp = datetime.fromtimestamp(instant)
+        self.frames = frames
+        # 没有可用帧的设备（未连接或尚未解码出第一帧）
+        self.missing = missing
+        # 读取所有设备最新帧所用的时间（微秒）
+        self.read_us = read_us
+        self.futures: Dict[str, Future] = {}
+        self.contact_sheet: Optional[Future] = None
+
+    @property
+    def age_spread_ms(self) -> float:
+        """各设备帧龄的最大差值"""
+        if not self.frames:
+            return 0.0
+        ages = [f.age_ms for f in self.frames]
+        return max(ages) - min(ages)
+
+    def results(self, timeout: Optional[float] = None) -> Dict[str, ScreenshotResult]:
+        """等待所有设备编码完成"""
+        return {serial: future.result(timeout) for serial, future in self.futures.items()}
+
+    def summary(self) -> str:
+        lines = [f"同步截图 {self.timestamp:%H:%M:%S.%f}: {len(self.frames)} 台设备, "
+                 f"读取耗时 {self.read_us:.0f}us, 帧龄差 {self.age_spread_ms:.1f}ms"]
+        for f in self.frames:
+            lines.append(f"  {f.serial}: pts={f.pts}, 帧龄 {f.age_ms:.1f}ms")
+        if self.missing:
+            lines.append(f"  无可用帧: {', '.join(self.missing)}")
+        return "\n".join(lines)
+
+
+def snapshot_clients(clients: Dict[str, object]) -> GroupCapture:
+    """在同一时刻读取所有 Client 的最新帧
+
+    Args:
+        clients: {设备序列号: Client}
+    """
+    instant = time.time()
+    start = time.perf_counter()
+    snapshots = {serial: getattr(client, "last_snapshot", None) for serial, client in clients.items()}
+    read_us = (time.perf_counter() - start) * 1e6
+
+    frames = []
+    missing = []
+    for serial, snapshot in snapshots.items():
+        if snapshot is None:
+            missing.append(serial)
+        else:
+            frames.append(GroupFrame(serial, snapshot.frame, snapshot.pts, snapshot.time, instant))
+    return GroupCapture(instant, frames, missing, read_us)
+
+
+def build_contact_sheet(frames: List[GroupFrame], columns: Optional[int] = None,
+                        thumb_width: int = 240) -> np.ndarray:
+    """把各设备的帧缩小后拼成网格总览图，每格下方标注序列号和帧龄
+
+    Args:
+        frames: 同步截图的帧
+        columns: 列数，默认接近正方形排列
+        thumb_width: 每格宽度（像素）
+    """
+    columns = columns or math.ceil(math.sqrt(len(frames)))
+    rows = math.ceil(len(frames) / columns)
+    thumbs = []
+    for f in frames:
+        height, width = f.frame.shape[:2]
+        thumb_height = max(1, round(height * thumb_width / width))
+        thumbs.append(cv2.resize(f.frame, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA))
+    cell_height = max(t.shape[0] for t in thumbs) + LABEL_HEIGHT
+
+    sheet = np.full((rows * cell_height, columns * thumb_width, 3), 32, dtype=np.uint8)
+    for index, (f, thumb) in enumerate(zip(frames, thumbs)):
+        x = (index % columns) * thumb_width
+        y = (index // columns) * cell_height
+        sheet[y:y + thumb.shape[0], x:x + thumb_width] = thumb
+        label = f"{f.serial} {f.age_ms:.0f}ms"
+        cv2.putText(sheet, label, (x + 4, y + cell_height - 7), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4, (255, 255, 255), 1, cv2.LINE_AA)
+    return sheet
+
+
+def capture_group(clients: Dict[str, object], service: Optional[ScreenshotService] = None,
+                  fmt: Optional[str] = None, save: bool = True, contact_sheet: bool = False,
+                  columns: Optional[int] = None, thumb_width: int = 240) -> GroupCapture:
+    """同步截取多台设备，编码和保存在截图服务线程池中并行进行
+
+    Args:
+        clients: {设备序列号: Client}
+        service: 截图服务，默认使用共享服务
+        fmt: 截图格式，默认使用服务的格式
+        save: 是否写入磁盘
+        contact_sheet: 是否生成总览图（保存为 screenshot_contact_sheet_[时间戳]）
+        columns: 总览图列数
+        thumb_width: 总览图每格宽度
+
+    Returns:
+        GroupCapture，futures 为各设备编码任务，contact_sheet 为总览图任务
+    """
+    group = snapshot_clients(clients)
+    service = service or get_screenshot_service()
+    for f in group.frames:
+        group.futures[f.serial] = service.capture(f.serial, f.frame, fmt, save, timestamp=group.timestamp)
+    if contact_sheet and group.frames:
+        # 总览图在工作线程中拼接，按键处理线程不做缩放
+        group.contact_sheet = service.capture(
+            "contact_sheet", lambda: build_contact_sheet(group.frames, columns, thumb_width),
+            fmt, save, timestamp=group.timestamp,
+        )
+    return group
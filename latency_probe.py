@@ -0,0 +1,224 @@
+"""输入到画面（input-to-photon）延迟测量工具
+
+通过 ControlSender 注入触摸，监听 Client 解码出的帧，记录触摸点周围区域
+第一次出现像素变化的时间。默认开启 show_touches，由系统绘制触摸圆点作为
+稳定的可见变化。
+
+用法示例:
+    python latency_probe.py acde74a2 --iterations 200 --max-fps 60
+    python latency_probe.py acde74a2 --bitrate 8000000 --output latency.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+# 添加scrcpy模块路径
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scrcpy'))
+from scrcpy.core import Client
+import scrcpy.const as const
+
+
+class LatencyProbe:
+    """单设备延迟探针"""
+
+    def __init__(self, client: Client, x: Optional[int] = None, y: Optional[int] = None,
+                 region: int = 40, threshold: float = 12.0, timeout: float = 1.0):
+        """
+        Args:
+            client: 已启动的 Client
+            x, y: 触摸坐标（设备坐标），默认屏幕中心
+            region: 检测区域边长（像素）
+            threshold: 区域平均绝对差阈值，超过即认为画面已变化
+            timeout: 单次采样等待画面变化的超时（秒）
+        """
+        self.client = client
+        self.x = x
+        self.y = y
+        self.region = region
+        self.threshold = threshold
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.baseline: Optional[np.ndarray] = None
+        self.roi = None
+        self.change_time = 0.0
+
+        self.client.add_listener(const.EVENT_FRAME, self.on_frame)
+
+    def _crop(self, frame: np.ndarray) -> np.ndarray:
+        x0, y0, x1, y1 = self.roi
+        return frame[y0:y1, x0:x1].astype(np.int16)
+
+    def on_frame(self, frame):
+        """解码线程回调：与基准区域比较，首次变化时记录时间"""
+        if frame is None:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            if self.baseline is None or self.changed.is_set():
+                return
+            crop = self._crop(frame)
+            if crop.shape != self.baseline.shape:
+                return
+            if np.abs(crop - self.baseline).mean() > self.threshold:
+                self.change_time = now
+                self.changed.set()
+
+    def wait_first_frame(self, timeout: float = 10.0) -> np.ndarray:
+        """等待第一帧以确定分辨率和默认触摸点"""
+        deadline = time.time() + timeout
+        while self.client.last_frame is None:
+            if time.time() > deadline:
+                raise TimeoutError("未收到视频帧")
+            time.sleep(0.05)
+        frame = self.client.last_frame
+        height, width = frame.shape[:2]
+        if self.x is None:
+            self.x = width // 2
+        if self.y is None:
+            self.y = height // 2
+        half = self.region // 2
+        self.roi = (max(self.x - half, 0), max(self.y - half, 0),
+                    min(self.x + half, width), min(self.y + half, height))
+        return frame
+
+    def sample(self) -> Optional[float]:
+        """测量一次触摸到画面变化的延迟，超时返回None（单位：毫秒）"""
+        with self.lock:
+            self.baseline = self._crop(self.client.last_frame)
+            self.changed.clear()
+        start = time.perf_counter()
+        self.client.control.touch(self.x, self.y, const.ACTION_DOWN)
+        changed = self.changed.wait(self.timeout)
+        self.client.control.touch(self.x, self.y, const.ACTION_UP)
+        with self.lock:
+            self.baseline = None
+        if not changed:
+            return None
+        return (self.change_time - start) * 1000.0
+
+    def run(self, iterations: int, interval: float = 0.5) -> List[Optional[float]]:
+        """连续采样，两次采样之间等待画面恢复"""
+        samples = []
+        for i in range(iterations):
+            latency = self.sample()
+            samples.append(latency)
+            if latency is None:
+                print(f"[{i + 1}/{iterations}] 超时")
+            else:
+                print(f"[{i + 1}/{iterations}] {latency:.1f} ms")
+            time.sleep(interval)
+        return samples
+
+    def close(self):
+        self.client.remove_listener(const.EVENT_FRAME, self.on_frame)
+
+
+def summarize(samples: List[Optional[float]]) -> dict:
+    """计算延迟统计（毫秒）"""
+    valid = np.array([s for s in samples if s is not None], dtype=np.float64)
+    result = {
+        "samples": len(samples),
+        "timeouts": len(samples) - len(valid),
+    }
+    if len(valid):
+        p50, p95, p99 = np.percentile(valid, [50, 95, 99])
+        result.update({
+            "min": float(valid.min()),
+            "mean": float(valid.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(valid.max()),
+        })
+    return result
+
+
+def format_histogram(samples: List[Optional[float]], bins: int = 20, width: int = 50) -> str:
+    """生成文本直方图"""
+    valid = np.array([s for s in samples if s is not None], dtype=np.float64)
+    if not len(valid):
+        return "(无有效样本)"
+    counts, edges = np.histogram(valid, bins=bins)
+    peak = counts.max()
+    lines = []
+    for count, lo, hi in zip(counts, edges[:-1], edges[1:]):
+        bar = "#" * int(round(count / peak * width)) if peak else ""
+        lines.append(f"{lo:8.1f} - {hi:8.1f} ms | {bar} {count}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量触摸输入到画面变化的端到端延迟")
+    parser.add_argument("device", nargs="?", default=None, help="设备序列号，默认第一个设备")
+    parser.add_argument("--iterations", type=int, default=50, help="采样次数")
+    parser.add_argument("--interval", type=float, default=0.5, help="两次采样间隔（秒）")
+    parser.add_argument("--x", type=int, default=None, help="触摸X坐标（帧坐标）")
+    parser.add_argument("--y", type=int, default=None, help="触摸Y坐标（帧坐标）")
+    parser.add_argument("--region", type=int, default=40, help="检测区域边长")
+    parser.add_argument("--threshold", type=float, default=12.0, help="像素变化阈值")
+    parser.add_argument("--timeout", type=float, default=1.0, help="单次采样超时（秒）")
+    parser.add_argument("--max-width", type=int, default=800)
+    parser.add_argument("--bitrate", type=int, default=4000000)
+    parser.add_argument("--max-fps", type=int, default=20)
+    parser.add_argument("--encoder", default=None, help="设备端视频编码器名称")
+    parser.add_argument("--no-show-touches", action="store_true", help="不开启系统触摸圆点")
+    parser.add_argument("--bins", type=int, default=20, help="直方图分桶数")
+    parser.add_argument("--output", default=None, help="追加结果到JSONL文件，便于长期跟踪")
+    args = parser.parse_args()
+
+    settings = {
+        "device": args.device,
+        "max_width": args.max_width,
+        "bitrate": args.bitrate,
+        "max_fps": args.max_fps,
+        "encoder": args.encoder,
+    }
+    print(f"测试配置: {settings}")
+
+    client = Client(device=args.device, max_width=args.max_width, bitrate=args.bitrate,
+                    max_fps=args.max_fps, encoder_name=args.encoder,
+                    show_touches=not args.no_show_touches, connection_timeout=10000)
+    probe = LatencyProbe(client, x=args.x, y=args.y, region=args.region,
+                         threshold=args.threshold, timeout=args.timeout)
+    client.start(daemon_threaded=True)
+    try:
+        probe.wait_first_frame()
+        # 等待画面稳定
+        time.sleep(1.0)
+        samples = probe.run(args.iterations, args.interval)
+    finally:
+        probe.close()
+        client.stop()
+
+    stats = summarize(samples)
+    print("\n延迟分布:")
+    print(format_histogram(samples, bins=args.bins))
+    print("\n统计结果:")
+    for key in ("samples", "timeouts", "min", "mean", "p50", "p95", "p99", "max"):
+        if key in stats:
+            value = stats[key]
+            print(f"  {key:>8}: {value:.1f} ms" if isinstance(value, float) else f"  {key:>8}: {value}")
+
+    if args.output:
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "settings": settings,
+            "stats": stats,
+            "samples": samples,
+        }
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"结果已追加到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
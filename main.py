@@ -7,6 +7,9 @@ import time
 # from scrcpy.image_provider import ImageProvider
 from device_view import DeviceView
 from device_screenshot import DeviceScreenshot
+from group_capture import capture_group
+from screenshot_service import get_screenshot_service
+from ui_dispatcher import schedule_update
 
 
 # 配置常量
@@ -33,6 +36,13 @@ class Config:
     LEFT_BG_COLOR = ft.Colors.RED_100
     RIGHT_BG_COLOR = ft.Colors.BLUE_100
 
+def _report_screenshot(future):
+    """截图完成回调（截图服务线程）"""
+    if future.exception() is None:
+        result = future.result()
+        print(f"✅ 截图已保存: {result.path} ({result.width}x{result.height}, 编码 {result.encode_ms:.1f}ms)")
+
+
 def main(page: ft.Page):
     print("程序开始启动...")
     # 设置页面属性
@@ -61,6 +71,22 @@ def main(page: ft.Page):
     
     page.on_window_event = on_window_event
     
+    # 页面隐藏（最小化、切换标签页）时暂停所有设备视图的显示循环
+    def on_app_lifecycle_state_change(e):
+        if e.state in (ft.AppLifecycleState.HIDE, ft.AppLifecycleState.PAUSE):
+            visible = False
+        elif e.state in (ft.AppLifecycleState.SHOW, ft.AppLifecycleState.RESUME):
+            visible = True
+        else:
+            return
+        for device_view in device_views:
+            device_view.set_visible(visible, reason="app")
+    
+    page.on_app_lifecycle_state_change = on_app_lifecycle_state_change
+    
+    # 提前创建截图服务（启动编码线程），按键截图时只提交任务
+    get_screenshot_service()
+    
     
     # 添加头部
     header = ft.Container(
@@ -76,6 +102,10 @@ def main(page: ft.Page):
         "F3": 780,
         "F4": 1170
     }
+    # 每个项目占用的横向宽度（项目宽度 + 边距 + 间距）
+    ITEM_STRIDE = 390
+    # 设备视图所在的项目序号，用于判断是否滚出可视区域
+    device_view_indexes = {}
     
     def scroll_to_position(key: str):
         """滚动到指定位置"""
@@ -94,37 +124,40 @@ def main(page: ft.Page):
         print(f"键盘事件: {e.key}, shift: {e.shift}, ctrl: {e.ctrl}, alt: {e.alt}")  # 调试日志
         
         # 优先检查`键截图功能
-        if e.key == "`":
-            print("检测到`键，开始截图...")  # 调试日志
-            print(f"device_views列表长度: {len(device_views)}")
-            print(f"device_screenshots列表长度: {len(device_screenshots)}")
-            
-            # `键触发截图功能
-            screenshot_count = 0
-            for i, device_view in enumerate(device_views):
-                print(f"检查device_view[{i}]: {type(device_view)}")
-                print(f"  - 有client属性: {hasattr(device_view, 'client')}")
-                if hasattr(device_view, 'client'):
-                    print(f"  - client存在: {device_view.client is not None}")
-                    if device_view.client:
-                        print(f"  - client.alive: {device_view.client.alive}")
-                
-                if hasattr(device_view, 'client') and device_view.client and device_view.client.alive:
-                    print(f"找到活跃设备视图，current_frame存在: {hasattr(device_view, 'current_frame') and device_view.current_frame is not None}")
-                    # 获取当前帧数据
-                    if hasattr(device_view, 'current_frame') and device_view.current_frame is not None:
-                        print(f"当前帧形状: {device_view.current_frame.shape}")
-                        # 查找DeviceScreenshot实例并更新截图
-                        for j, screenshot_view in enumerate(device_screenshots):
-                            print(f"更新screenshot_view[{j}]")
-                            screenshot_view.update_screenshot(device_view.current_frame)
-                            screenshot_count += 1
-                        print(f"截图已更新到 {screenshot_count} 个DeviceScreenshot组件")
-                    else:
-                        print("没有可用的帧数据进行截图")
-                    break
-            if screenshot_count == 0:
-                print("没有找到DeviceScreenshot组件或活跃设备")
+        if e.key == "`" and e.ctrl:
+            # Ctrl+`：通过独立的adb连接截取原始分辨率截图（像素精确，不经过视频压缩），镜像不中断
+            service = get_screenshot_service()
+            clients = {}
+            for device_view in device_views:
+                if device_view.client and device_view.client.alive:
+                    clients.setdefault(device_view.device_name, device_view.client)
+            for serial, client in clients.items():
+                future = service.capture(serial, client.screencap, fmt="png")
+                future.add_done_callback(_report_screenshot)
+            print(f"已提交 {len(clients)} 台设备的原始分辨率截图" if clients else "没有可用的设备进行截图")
+        elif e.key == "`":
+            # `键同步截取所有活跃设备：同一时刻读取各设备最新帧，编码和保存在截图服务线程池中并行进行
+            start = time.perf_counter()
+            clients = {}
+            for device_view in device_views:
+                if device_view.client and device_view.client.alive:
+                    # 同一设备的多个视图共享一个 Client，只截一次
+                    clients.setdefault(device_view.device_name, device_view.client)
+            group = capture_group(clients, contact_sheet=len(clients) > 1)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if group.futures:
+                # 第一台设备的截图显示在DeviceScreenshot组件中
+                first = next(iter(group.futures.values()))
+                for screenshot_view in device_screenshots:
+                    first.add_done_callback(screenshot_view.show_screenshot)
+                for future in group.futures.values():
+                    future.add_done_callback(_report_screenshot)
+                if group.contact_sheet:
+                    group.contact_sheet.add_done_callback(_report_screenshot)
+                print(f"已提交 {len(group.futures)} 台设备的截图，耗时 {elapsed_ms:.2f}ms")
+                print(group.summary())
+            else:
+                print("没有可用的设备帧进行截图")
         elif e.key in SCROLL_POSITIONS:
             scroll_to_position(e.key)
         else:
@@ -207,7 +240,7 @@ def main(page: ft.Page):
             )
             
             current_control.shadow = enhanced_shadow
-            current_control.update()
+            schedule_update(current_control)
             
             # 短暂延迟后恢复原阴影
             import threading
@@ -219,7 +252,7 @@ def main(page: ft.Page):
                     offset=ft.Offset(1, 2)  # 右下方向
                 )
                 current_control.shadow = normal_shadow
-                current_control.update()
+                schedule_update(current_control)
             threading.Timer(0.3, restore_shadow).start()
         
         # 创建hover效果
@@ -246,7 +279,7 @@ def main(page: ft.Page):
                 )
                 current_control.shadow = normal_shadow
             
-            current_control.update()
+            schedule_update(current_control)
         
         # 创建独立的标题栏
         title_bar = ft.Container(
@@ -282,6 +315,7 @@ def main(page: ft.Page):
             content_area = DeviceView("acde74a2", bgcolor=ft.Colors.with_opacity(0.9, random_color))
             # 将DeviceView实例添加到列表中以便清理
             device_views.append(content_area)
+            device_view_indexes[index] = content_area
         elif index == 1:  # 第二个item使用DeviceScreenshot
             content_area = DeviceScreenshot(bgcolor=ft.Colors.with_opacity(0.9, random_color))
             # 将DeviceScreenshot实例添加到列表中
@@ -325,6 +359,15 @@ def main(page: ft.Page):
             margin=ft.margin.all(5)  # 5像素边距
         )
     
+    def on_listview_scroll(e: ft.OnScrollEvent):
+        """设备视图滚出可视区域时暂停显示循环"""
+        if e.pixels is None or e.viewport_dimension is None:
+            return
+        for index, device_view in device_view_indexes.items():
+            left = index * ITEM_STRIDE
+            visible = left + ITEM_STRIDE > e.pixels and left < e.pixels + e.viewport_dimension
+            device_view.set_visible(visible, reason="scroll")
+    
     # 创建横向ListView
     def create_horizontal_listview():
         # 创建所有项目
@@ -339,7 +382,9 @@ def main(page: ft.Page):
                 spacing=5,  # 项目间距改为5px
                 alignment=ft.MainAxisAlignment.START,
                 expand=True,  # 确保 Row 也填满高度
-                scroll=ft.ScrollMode.AUTO  # 启用自动滚动
+                scroll=ft.ScrollMode.AUTO,  # 启用自动滚动
+                on_scroll=on_listview_scroll,
+                on_scroll_interval=100
             ),
             expand=True,
             padding=ft.padding.symmetric(horizontal=10, vertical=5),
@@ -461,7 +506,7 @@ def main(page: ft.Page):
                         alignment=ft.alignment.center,
                         border=ft.border.all(2, ft.Colors.BLACK26),
                         animate=ft.Animation(300, ft.AnimationCurve.EASE_OUT),
-                        on_hover=lambda e: setattr(e.control, 'scale', 1.1 if e.data == 'true' else 1.0) or e.control.update()
+                        on_hover=lambda e: setattr(e.control, 'scale', 1.1 if e.data == 'true' else 1.0) or schedule_update(e.control)
                     )
                     row_nodes.append(node_container)
                 else:
@@ -519,12 +564,12 @@ def main(page: ft.Page):
             # Deselect previous node
             if selected_node:
                 selected_node.border = ft.border.all(1, ft.Colors.GREY_400)
-                selected_node.update()
+                schedule_update(selected_node)
             
             # Select this node
             e.control.border = ft.border.all(2, ft.Colors.BLUE_600)
             selected_node = e.control
-            e.control.update()
+            schedule_update(e.control)
         
         def on_delete_click(e):
             # Remove node from flow_nodes list if it exists
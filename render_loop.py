@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class RenderLoop:
+    """与解码线程解耦的显示循环
+
+    解码线程只把最新帧放入单个槽位后立即返回；后台线程按显示帧率取出最新帧
+    调用 render。渲染期间或上一帧仍在传输（ready 返回False）时到达的帧只会
+    覆盖槽位，不会排队。暂停时不渲染，恢复后立即显示最新帧。
+    """
+
+    def __init__(self, render: Callable[[Any], None], fps: float = 20.0,
+                 ready: Optional[Callable[[], bool]] = None, in_flight_timeout: float = 0.5,
+                 name: str = "render-loop"):
+        """
+        Args:
+            render: 渲染回调，在后台线程中以最新帧调用
+            fps: 最大显示帧率，0表示不限制
+            ready: 返回上一帧是否已被显示端取走，None表示render返回即完成
+            in_flight_timeout: 等待上一帧完成的最长时间（秒），超时后不再等待
+            name: 线程名
+        """
+        self.render = render
+        self.ready = ready
+        self.in_flight_timeout = in_flight_timeout
+        self.name = name
+        self.interval = 0.0
+        self.set_fps(fps)
+
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_pending = False
+        self.paused = False
+        self.running = True
+        self.last_render_time = 0.0
+        self.thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.submitted = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.in_flight_waits = 0
+
+    def set_fps(self, fps: float):
+        """设置最大显示帧率"""
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+    def submit(self, frame):
+        """放入最新帧（解码线程调用，不阻塞）"""
+        with self.condition:
+            if self.frame_pending:
+                self.dropped += 1
+            self.frame = frame
+            self.frame_pending = True
+            self.submitted += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def pause(self):
+        """暂停渲染（视图不可见时调用）"""
+        with self.condition:
+            self.paused = True
+
+    def resume(self):
+        """恢复渲染，槽位中的最新帧会立即显示"""
+        with self.condition:
+            self.paused = False
+            self.condition.notify()
+
+    def set_visible(self, visible: bool):
+        if visible:
+            self.resume()
+        else:
+            self.pause()
+
+    def _wait_ready(self):
+        """上一帧仍在传输时等待，超时后放弃等待"""
+        if self.ready is None or self.ready():
+            return
+        self.in_flight_waits += 1
+        deadline = time.time() + self.in_flight_timeout
+        while self.running and not self.ready() and time.time() < deadline:
+            time.sleep(0.005)
+
+    def _run(self):
+        """后台渲染循环"""
+        while True:
+            with self.condition:
+                while self.running and (self.paused or not self.frame_pending):
+                    self.condition.wait()
+                if not self.running:
+                    return
+
+            # 帧率限制：等待期间到达的新帧直接覆盖槽位
+            delay = self.last_render_time + self.interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._wait_ready()
+
+            with self.condition:
+                if self.paused or not self.running:
+                    continue
+                frame = self.frame
+                self.frame_pending = False
+
+            self.last_render_time = time.time()
+            try:
+                self.render(frame)
+                self.rendered += 1
+            except Exception as e:
+                print(f"❌ 渲染失败: {e}")
+
+    def get_stats(self) -> dict:
+        """获取渲染统计信息"""
+        return {
+            "submitted": self.submitted,
+            "rendered": self.rendered,
+            "dropped": self.dropped,
+            "in_flight_waits": self.in_flight_waits,
+            "paused": self.paused,
+        }
+
+    def close(self):
+        """停止后台线程"""
+        with self.condition:
+            self.running = False
+            self.frame = None
+            self.condition.notify()
@@ -18,6 +18,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from scrcpy.core import Client
+from scrcpy.overlay import ImageItem, Overlay
 import scrcpy.const as const
 import time
 import numpy as np
@@ -40,8 +41,17 @@ class Ui_Form(object):
         _translate = QtCore.QCoreApplication.translate
         Dialog.setWindowTitle(_translate("Form", "Form"))
 
+# Qt 5.14+ 可以直接显示解码器输出的BGR数据，旧版本需要转换为RGB
+HAS_BGR888 = hasattr(QImage, "Format_BGR888")
+
+
 class MyWin(QtWidgets.QWidget,Ui_Form):
 
+    # 解码线程通过该信号通知GUI线程有新帧（跨线程自动排队到GUI线程执行）
+    frame_ready = pyqtSignal()
+    # 其他模块（任意线程）修改叠加层后请求重绘
+    overlay_changed = pyqtSignal()
+
     def __init__(self, ch_name) -> None:
         
         super(MyWin,self).__init__()
@@ -56,7 +66,18 @@ class MyWin(QtWidgets.QWidget,Ui_Form):
         self.setFocusPolicy(Qt.StrongFocus)  # 设置焦点策略
         self.setAttribute(Qt.WA_AcceptTouchEvents, True)  # 接受触摸事件
         
-        self.rlock = threading.RLock()
+        # 最新帧槽：解码线程只写入最新一帧，GUI线程取走后绘制，未被取走的旧帧直接覆盖
+        self.frame_lock = threading.Lock()
+        self.pending_frame = None
+        self.frame_signal_pending = False
+        self.display_frame = None  # 正在显示的帧，QImage直接引用其内存，必须保持引用
+        self.display_image = None
+        self.frame_count = 0
+        self.last_frame_info_time = 0
+        self.frames_painted = 0
+        self.frames_dropped = 0
+        self.frame_ready.connect(self._on_frame_ready)
+        self.overlay_changed.connect(self.update)
 
         self.mouse_left_down = False
         self.mouse_right_down = False
@@ -77,9 +98,12 @@ class MyWin(QtWidgets.QWidget,Ui_Form):
         self.scroll_min_threshold = 10  # 最小滚动阈值
         self.scroll_max_distance = 100  # 最大滚动距离
         
-        # 公共画布支持 - 供其他模块绘制UI元素边框
-        self.public_canvas = None  # 公共画布，其他模块可以在此绘制
-        self.canvas_lock = threading.RLock()  # 画布线程锁
+        # 叠加层 - 供其他模块绘制UI元素边框、标签和掩码，只合成被覆盖的像素
+        self.overlay = Overlay()
+        self.overlay.add_listener(self.overlay_changed.emit)
+        self.public_canvas_item = None  # set_public_canvas 兼容接口对应的叠加项
+        self.overlay_layer = None  # 已转换为QImage的叠加层缓存
+        self.overlay_image = None
         
         # 检查是否为模拟设备模式
         if ch_name == "simulator":
@@ -143,75 +167,110 @@ class MyWin(QtWidgets.QWidget,Ui_Form):
     #     print("mouse_leave")
 
     def on_frame(self, frame):
-        if frame is not None and frame.size > 0:
-            try:
-                self.rlock.acquire()
-                # 存储当前帧以便坐标转换和UI分析
-                self.current_frame = frame
-                                
-                if not hasattr(self, 'frame_count'):
-                    self.frame_count = 0
-                    self.last_frame_info_time = 0
-                
-                self.frame_count += 1
-                image_height, image_width, image_depth = frame.shape
-                
-                # 减少日志输出频率，每30帧（约1秒）打印一次
-                current_time = time.time()
-                if current_time - self.last_frame_info_time > 1.0:
-                    print(f"收到帧: {image_width}x{image_height}, FPS: {self.frame_count}/{current_time - self.last_frame_info_time:.1f}")
-                    self.frame_count = 0
-                    self.last_frame_info_time = current_time
-                                
-                # 动态调整窗口大小以匹配图像大小
-                if not hasattr(self, 'window_resized') or not self.window_resized:
-                    self.resize(image_width, image_height)
-                    self.img_label.setGeometry(QtCore.QRect(0, 1, image_width, image_height))
-                    self.window_resized = True
-                    print(f"窗口大小已调整为: {image_width}x{image_height}")
-                
-                # 处理公共画布渲染 - 将UI元素边框叠加到frame上
-                display_frame = frame.copy()
-                with self.canvas_lock:
-                    if self.public_canvas is not None:
-                        try:
-                            # 确保画布尺寸与frame匹配
-                            if self.public_canvas.shape[:2] == (image_height, image_width):
-                                # 将画布内容叠加到frame上
-                                # 使用加权混合，让原图可见，画布内容作为覆盖层
-                                alpha = 0.6  # 原图透明度
-                                beta = 0.4   # 画布透明度 - 提高边框可见性
-                                display_frame = cv2.addWeighted(display_frame, alpha, self.public_canvas, beta, 0)
-                            else:
-                                # 如果尺寸不匹配，重置画布
-                                print(f"画布尺寸不匹配，重置: 期望{(image_height, image_width)}, 实际{self.public_canvas.shape[:2]}")
-                                self.public_canvas = None
-                        except Exception as e:
-                            print(f"画布渲染错误: {e}")
-                            self.public_canvas = None
-                                
-                q_im = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-                q_im = QImage(q_im.data, image_width, image_height,  # 创建QImage格式的图像，并读入图像信息
-                             image_width * image_depth,
-                             QImage.Format_RGB888)
-                self.img_label.setPixmap(QPixmap.fromImage(q_im))
-                # print("帧已显示")
-            except Exception as e:
-                print("线程出错%s"%(e))
-            finally:
-                self.rlock.release()
-        else:
-            pass
-            # print("收到空帧或无效帧")
+        """解码线程回调：只把帧放入最新帧槽并通知GUI线程，不复制、不转换、不操作控件"""
+        if frame is None or frame.size == 0:
+            return
+        with self.frame_lock:
+            if self.pending_frame is not None:
+                # GUI线程还没来得及绘制上一帧，直接被新帧覆盖
+                self.frames_dropped += 1
+            self.pending_frame = frame
+            # 存储当前帧以便坐标转换和UI分析
+            self.current_frame = frame
+            if self.frame_signal_pending:
+                return
+            self.frame_signal_pending = True
+        self.frame_ready.emit()
+
+    def _on_frame_ready(self):
+        """GUI线程：取走最新帧，包装为QImage并请求重绘"""
+        with self.frame_lock:
+            frame = self.pending_frame
+            self.pending_frame = None
+            self.frame_signal_pending = False
+        if frame is None:
+            return
+        try:
+            image_height, image_width = frame.shape[:2]
+            self.frame_count += 1
+
+            # 减少日志输出频率，每秒打印一次
+            current_time = time.time()
+            if current_time - self.last_frame_info_time > 1.0:
+                print(f"收到帧: {image_width}x{image_height}, FPS: {self.frame_count}/{current_time - self.last_frame_info_time:.1f}, "
+                      f"已绘制: {self.frames_painted}, 丢弃: {self.frames_dropped}")
+                self.frame_count = 0
+                self.last_frame_info_time = current_time
+
+            # 动态调整窗口大小以匹配图像大小（在GUI线程中执行）
+            if not hasattr(self, 'window_resized') or not self.window_resized:
+                self.resize(image_width, image_height)
+                self.img_label.setGeometry(QtCore.QRect(0, 1, image_width, image_height))
+                self.window_resized = True
+                print(f"窗口大小已调整为: {image_width}x{image_height}")
+
+            self.display_frame = frame
+            self.display_image = self._to_qimage(frame)
+            self.update(self.img_label.geometry())
+        except Exception as e:
+            print("线程出错%s"%(e))
+
+    @staticmethod
+    def _to_qimage(frame: np.ndarray) -> QImage:
+        """把BGR帧包装为QImage，Qt 5.14+ 不复制数据"""
+        image_height, image_width = frame.shape[:2]
+        if not HAS_BGR888:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            return QImage(frame.data, image_width, image_height, frame.strides[0], QImage.Format_RGB888).copy()
+        return QImage(frame.data, image_width, image_height, frame.strides[0], QImage.Format_BGR888)
+
+    def paintEvent(self, a0: QtGui.QPaintEvent) -> None:
+        """绘制最新帧，尺寸不一致时由QPainter在CPU上缩放"""
+        if self.display_image is None:
+            return super().paintEvent(a0)
+        target = self.img_label.geometry()
+        painter = QPainter(self)
+        try:
+            painter.drawImage(target, self.display_image)
+            self._paint_overlay(painter, target)
+            self.frames_painted += 1
+        finally:
+            painter.end()
+
+    def _paint_overlay(self, painter: QPainter, target: QtCore.QRect):
+        """只在叠加层的包围区域内绘制，由QPainter按alpha合成被覆盖的像素"""
+        frame_width, frame_height = self.display_image.width(), self.display_image.height()
+        layer = self.overlay.render(frame_width, frame_height)
+        if layer is None:
+            return
+        if layer is not self.overlay_layer:
+            # 叠加层变化时才重新包装，QImage直接引用叠加层的BGRA内存
+            bgra = layer.bgra
+            self.overlay_image = QImage(bgra.data, layer.width, layer.height, bgra.strides[0], QImage.Format_ARGB32)
+            self.overlay_layer = layer
+        scale_x = target.width() / frame_width
+        scale_y = target.height() / frame_height
+        painter.drawImage(QRectF(target.x() + layer.x * scale_x, target.y() + layer.y * scale_y,
+                                 layer.width * scale_x, layer.height * scale_y), self.overlay_image)
 
     def set_public_canvas(self, canvas):
-        """设置公共画布，供其他模块绘制UI元素边框
+        """设置公共画布（兼容接口），新代码请直接使用 self.overlay 添加矩形、标签和掩码
+        
+        画布中的非黑色像素以0.4不透明度叠加，黑色像素保持透明，不再使整个画面变暗。
         
         Args:
             canvas: OpenCV格式的画布(numpy array)，或None清空画布
         """
-        with self.canvas_lock:
-            self.public_canvas = canvas
+        if canvas is None:
+            if self.public_canvas_item is not None:
+                self.overlay.remove(self.public_canvas_item)
+                self.public_canvas_item = None
+            return
+        item = ImageItem(0, 0, canvas, alpha=0.4)
+        if self.public_canvas_item is None:
+            self.public_canvas_item = self.overlay.add(item)
+        else:
+            self.overlay.replace(self.public_canvas_item, item)
     
     def get_frame_size(self):
         """获取当前帧的尺寸，供其他模块创建匹配的画布
@@ -245,7 +304,7 @@ class MyWin(QtWidgets.QWidget,Ui_Form):
         print("="*50)
         print("💡 基础功能:")
         print("  • 基础scrcpy屏幕镜像功能")
-        print("  • 支持公共画布用于外部UI绘制")
+        print("  • 支持叠加层用于外部UI绘制")
         print("  • 改进的滚轮滚动控制")
         print("")
         print("🖱️ 滚轮控制:")
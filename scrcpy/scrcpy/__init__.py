@@ -3,4 +3,8 @@ Python Scrcpy Client's core module
 """
 
 from .const import *
-from .core import Client
+from .core import Client, FrameSnapshot, VideoPacket
+from .fingerprint import StateIndex, StateMatch, StateTracker
+from .matcher import Match, Matcher, Template
+from .overlay import Overlay, OverlayLayer
+from .subscription import FrameSpec
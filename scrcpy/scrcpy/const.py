@@ -298,6 +298,10 @@ KEYCODE_KEYCODE_THUMBS_DOWN = 287
 EVENT_INIT = "init"
 EVENT_FRAME = "frame"
 EVENT_DISCONNECT = "disconnect"
+EVENT_CLIPBOARD = "clipboard"
+EVENT_ACK_CLIPBOARD = "ack_clipboard"
+EVENT_UHID_OUTPUT = "uhid_output"
+EVENT_PACKET = "packet"
 
 # Type
 TYPE_INJECT_KEYCODE = 0
@@ -336,6 +340,12 @@ TYPE_DEVICE_CLIPBOARD = 0
 TYPE_DEVICE_ACK_CLIPBOARD = 1
 TYPE_DEVICE_UHID_OUTPUT = 2
 
+# Video stream
+CODEC_ID_H264 = 0x68323634  # "h264"
+PACKET_FLAG_CONFIG = 1 << 63
+PACKET_FLAG_KEY_FRAME = 1 << 62
+PACKET_PTS_MASK = PACKET_FLAG_KEY_FRAME - 1
+
 # Copy key types
 COPY_KEY_NONE = 0
 COPY_KEY_COPY = 1
@@ -1,6 +1,7 @@
 import functools
-import socket
 import struct
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from time import sleep
 
 import scrcpy
@@ -150,47 +151,118 @@ class ControlSender:
         """
         return b""
 
-    def get_clipboard(self, copy_key: int = const.COPY_KEY_NONE) -> str:
+    def get_clipboard(self, copy_key: int = const.COPY_KEY_NONE, timeout: float = 3.0) -> str:
         """
         Get clipboard with copy key support
 
         Args:
             copy_key: COPY_KEY_NONE, COPY_KEY_COPY, or COPY_KEY_CUT
+            timeout: maximum seconds to wait for the device reply
+
+        Raises:
+            concurrent.futures.TimeoutError: no reply before timeout, the request
+                is withdrawn so a late reply is not taken for the next one
+        """
+        future = self.get_clipboard_async(copy_key)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self.parent.receiver.cancel(future)
+            raise
+
+    def get_clipboard_async(self, copy_key: int = const.COPY_KEY_NONE) -> Future:
+        """
+        Request clipboard without blocking, the reply is read by the device receiver
+
+        Args:
+            copy_key: COPY_KEY_NONE, COPY_KEY_COPY, or COPY_KEY_CUT
+
+        Returns:
+            Future resolved with the clipboard text
         """
         # Since this function need socket response, we can't auto inject it any more
-        s: socket.socket = self.parent.control_socket
-
-        with self.parent.control_socket_lock:
-            # Flush socket
-            s.setblocking(False)
-            while True:
-                try:
-                    s.recv(1024)
-                except BlockingIOError:
-                    break
-            s.setblocking(True)
-
-            # Read package with copy_key
-            package = struct.pack(">BB", const.TYPE_GET_CLIPBOARD, copy_key)
-            s.send(package)
-            (code,) = struct.unpack(">B", s.recv(1))
-            assert code == 0
-            (length,) = struct.unpack(">i", s.recv(4))
-
-            return s.recv(length).decode("utf-8")
+        future = self.parent.receiver.request_clipboard(copy_key)
+        if future.done():
+            # Answered from the synchronized clipboard, the server would not reply
+            return future
+        package = struct.pack(">BB", const.TYPE_GET_CLIPBOARD, copy_key)
+        try:
+            with self.parent.control_socket_lock:
+                self.parent.control_socket.send(package)
+        except Exception:
+            self.parent.receiver.cancel(future)
+            raise
+        return future
 
     @inject(const.TYPE_SET_CLIPBOARD)
+    def _set_clipboard(self, text: str, paste: bool, sequence: int) -> bytes:
+        buffer = text.encode("utf-8")
+        return struct.pack(">Q?i", sequence, paste, len(buffer)) + buffer
+
     def set_clipboard(self, text: str, paste: bool = False, sequence: int = 0) -> bytes:
         """
         Set clipboard with sequence support
 
+        A sequence other than SEQUENCE_INVALID registers the expected ACK before
+        the request is sent, so wait_clipboard_ack cannot miss a fast reply
+
         Args:
             text: the string you want to set
             paste: paste now
             sequence: sequence number for sync
         """
-        buffer = text.encode("utf-8")
-        return struct.pack(">Q?i", sequence, paste, len(buffer)) + buffer
+        future = None
+        if sequence != const.SEQUENCE_INVALID:
+            future = self.parent.receiver.expect_ack(sequence)
+        try:
+            return self._set_clipboard(text, paste, sequence)
+        except Exception:
+            if future is not None:
+                self.parent.receiver.cancel(future)
+            raise
+
+    def set_clipboard_async(self, text: str, paste: bool = False, sequence: int = 1) -> Future:
+        """
+        Set clipboard and get a future resolved when the device acknowledges it
+
+        Args:
+            text: the string you want to set
+            paste: paste now
+            sequence: sequence number for sync, must not be SEQUENCE_INVALID
+
+        Returns:
+            Future resolved with the sequence number
+        """
+        assert sequence != const.SEQUENCE_INVALID, "sequence must not be SEQUENCE_INVALID"
+        future = self.parent.receiver.expect_ack(sequence)
+        try:
+            self.set_clipboard(text, paste, sequence)
+        except Exception:
+            self.parent.receiver.cancel(future)
+            raise
+        return future
+
+    def wait_clipboard_ack(self, sequence: int, timeout: float = 1.0) -> bool:
+        """
+        Wait for the device to acknowledge a set_clipboard request, the ACK is
+        expected from the moment set_clipboard sent the request
+
+        Args:
+            sequence: sequence number passed to set_clipboard
+            timeout: maximum seconds to wait
+
+        Returns:
+            True if the matching ACK was received before timeout
+        """
+        if sequence == const.SEQUENCE_INVALID:
+            return False
+        future = self.parent.receiver.expect_ack(sequence)
+        try:
+            future.result(timeout)
+            return True
+        except (FutureTimeoutError, CancelledError, ConnectionError):
+            self.parent.receiver.cancel(future)
+            return False
 
     @inject(const.TYPE_SET_DISPLAY_POWER)
     def set_display_power(self, on: bool = True) -> bytes:
@@ -228,11 +300,16 @@ class ControlSender:
             id: device id
             vendor_id: vendor id
             product_id: product id
-            name: device name
+            name: device name (at most 127 bytes)
             report_desc: report descriptor
         """
-        name_bytes = name.encode("utf-8")
-        return struct.pack(">IIII", id, vendor_id, product_id, len(name_bytes)) + name_bytes + report_desc
+        name_bytes = name.encode("utf-8")[:127]
+        return (
+            struct.pack(">HHHB", id, vendor_id, product_id, len(name_bytes))
+            + name_bytes
+            + struct.pack(">H", len(report_desc))
+            + report_desc
+        )
 
     @inject(const.TYPE_UHID_INPUT)
     def uhid_input(self, id: int, data: bytes) -> bytes:
@@ -241,9 +318,9 @@ class ControlSender:
 
         Args:
             id: device id
-            data: input data
+            data: input report
         """
-        return struct.pack(">I", id) + data
+        return struct.pack(">HH", id, len(data)) + data
 
     @inject(const.TYPE_UHID_DESTROY)
     def uhid_destroy(self, id: int) -> bytes:
@@ -253,7 +330,7 @@ class ControlSender:
         Args:
             id: device id
         """
-        return struct.pack(">I", id)
+        return struct.pack(">H", id)
 
     @inject(const.TYPE_OPEN_HARD_KEYBOARD_SETTINGS)
     def open_hard_keyboard_settings(self) -> bytes:
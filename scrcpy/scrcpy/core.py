@@ -4,8 +4,9 @@ import struct
 import threading
 import time
 from time import sleep
-from typing import Any, Callable, Optional, Tuple, Union
+from typing import Any, Callable, NamedTuple, Optional, Tuple, Union
 
+import av
 import cv2
 import numpy as np
 from adbutils import AdbConnection, AdbDevice, AdbError, Network, adb
@@ -13,12 +14,113 @@ from av.codec import CodecContext
 from av.error import InvalidDataError
 
 from .const import (
+    CODEC_ID_H264,
     EVENT_DISCONNECT,
     EVENT_FRAME,
     EVENT_INIT,
+    EVENT_PACKET,
     LOCK_SCREEN_ORIENTATION_UNLOCKED,
+    PACKET_FLAG_CONFIG,
+    PACKET_FLAG_KEY_FRAME,
+    PACKET_PTS_MASK,
 )
 from .control import ControlSender
+from .receiver import DeviceReceiver
+from .screencap import screencap, screencap_png
+from .subscription import FramePreprocessor, FrameSpec
+
+
+class VideoPacket(NamedTuple):
+    """
+    Encoded video packet as sent by the server (H.264 Annex-B)
+
+    Config packets carry SPS/PPS only and have no pts.
+    """
+
+    data: bytes
+    pts: Optional[int]
+    config: bool
+    key_frame: bool
+
+
+class FrameSnapshot(NamedTuple):
+    """
+    Latest decoded frame with its timing, published as one object so readers on
+    other threads never pair a frame with another frame's pts
+
+    Attributes:
+        frame: BGR frame
+        pts: device presentation timestamp in microseconds
+        time: host time.time() when the frame was decoded
+        luma: Y plane of the decoded picture (grayscale), only when the client
+            was created with luma=True
+        seq: decoded frame counter, starts at 1
+    """
+
+    frame: np.ndarray
+    pts: Optional[int]
+    time: float
+    luma: Optional[np.ndarray] = None
+    seq: int = 0
+
+
+# Width of the grayscale sample compared by wait_for_change / wait_for_stable
+WAIT_SAMPLE_WIDTH = 64
+
+
+def _clamp_roi(
+    roi: Tuple[int, int, int, int], snapshot: FrameSnapshot
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Returns:
+        roi clipped to the frame, None when it does not overlap the frame
+    """
+    frame_height, frame_width = snapshot.frame.shape[:2]
+    x, y, width, height = (int(v) for v in roi)
+    x0, y0 = min(max(0, x), frame_width), min(max(0, y), frame_height)
+    x1, y1 = min(max(0, x + width), frame_width), min(max(0, y + height), frame_height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _check_roi(roi: Optional[Tuple[int, int, int, int]], snapshot: FrameSnapshot) -> None:
+    if roi is not None and _clamp_roi(roi, snapshot) is None:
+        height, width = snapshot.frame.shape[:2]
+        raise ValueError(f"roi {tuple(roi)} is outside the {width}x{height} frame")
+
+
+def _wait_sample(snapshot: FrameSnapshot, roi: Optional[Tuple[int, int, int, int]]) -> np.ndarray:
+    """
+    Small grayscale copy of a frame region, point sampled so the cost does not
+    depend on the frame size
+
+    Args:
+        snapshot: frame to sample
+        roi: (x, y, width, height) in frame pixels, None for the whole frame,
+            clipped to the frame (an empty sample when it no longer overlaps,
+            e.g. after a rotation)
+    """
+    image = snapshot.luma if snapshot.luma is not None else snapshot.frame
+    if roi is not None:
+        box = _clamp_roi(roi, snapshot)
+        if box is None:
+            return np.zeros((0, 0), dtype=np.int16)
+        x, y, width, height = box
+        image = image[y : y + height, x : x + width]
+    height, width = image.shape[:2]
+    if width > WAIT_SAMPLE_WIDTH:
+        size = (WAIT_SAMPLE_WIDTH, max(1, round(height * WAIT_SAMPLE_WIDTH / width)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_NEAREST)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image.astype(np.int16)
+
+
+def _changed_ratio(a: np.ndarray, b: np.ndarray, tolerance: int) -> float:
+    if a.shape != b.shape or not a.size:
+        return 1.0
+    return float(np.count_nonzero(np.abs(a - b) > tolerance)) / a.size
 
 
 class Client:
@@ -34,6 +136,10 @@ class Client:
         lock_screen_orientation: int = LOCK_SCREEN_ORIENTATION_UNLOCKED,
         connection_timeout: int = 3000,
         encoder_name: Optional[str] = None,
+        show_touches: bool = False,
+        decode: bool = True,
+        luma: bool = False,
+        clipboard_autosync: bool = True,
     ):
         """
         Create a scrcpy client, this client won't be started until you call the start function
@@ -49,6 +155,13 @@ class Client:
             lock_screen_orientation: lock screen orientation, LOCK_SCREEN_ORIENTATION_*
             connection_timeout: timeout for connection, unit is ms
             encoder_name: encoder name, enum: [OMX.google.h264.encoder, OMX.qcom.video.encoder.avc, c2.qti.avc.encoder, c2.android.avc.encoder], default is None (Auto)
+            show_touches: let Android draw a marker at every touch point
+            decode: decode packets into frames, disable when only packet listeners are used,
+                may be changed while running
+            luma: also publish the decoder's Y plane in last_snapshot, a grayscale
+                copy that costs far less than converting the BGR frame
+            clipboard_autosync: let the device send its clipboard whenever it changes,
+                the server then does not reply to get_clipboard requests
         """
         # Check Params
         assert max_width >= 0, "max_width must be greater than or equal to 0"
@@ -78,6 +191,10 @@ class Client:
         self.lock_screen_orientation = lock_screen_orientation
         self.connection_timeout = connection_timeout
         self.encoder_name = encoder_name
+        self.show_touches = show_touches
+        self.decode = decode
+        self.luma = luma
+        self.clipboard_autosync = clipboard_autosync
 
         # Connect to device
         if device is None:
@@ -86,13 +203,30 @@ class Client:
             device = adb.device(serial=device)
 
         self.device = device
-        self.listeners = dict(frame=[], init=[], disconnect=[])
+        self.listeners = dict(
+            frame=[],
+            init=[],
+            disconnect=[],
+            clipboard=[],
+            ack_clipboard=[],
+            uhid_output=[],
+            packet=[],
+        )
+        # Frame listeners registered with a FrameSpec
+        self.frame_views = FramePreprocessor()
 
         # User accessible
         self.last_frame: Optional[np.ndarray] = None
+        self.last_frame_pts: Optional[int] = None
+        self.last_frame_time: Optional[float] = None
+        self.last_snapshot: Optional[FrameSnapshot] = None
+        # Notified after every decoded frame, waiters block here instead of polling
+        self.frame_seq = 0
+        self.frame_condition = threading.Condition()
         self.resolution: Optional[Tuple[int, int]] = None
         self.device_name: Optional[str] = None
         self.control = ControlSender(self)
+        self.receiver = DeviceReceiver(self)
 
         # Need to destroy
         self.alive = False
@@ -132,9 +266,12 @@ class Client:
         if not len(self.device_name):
             raise ConnectionError("Did not receive Device Name!")
 
-        res = self.__video_socket.recv(4)
-        self.resolution = struct.unpack(">HH", res)
-        self.__video_socket.setblocking(False)
+        codec_id, width, height = struct.unpack(">III", self.__recv_exact(12))
+        if codec_id != CODEC_ID_H264:
+            raise ConnectionError(f"Unsupported video codec: {codec_id:#x}")
+        self.resolution = (width, height)
+        # Short timeout so the stream loop can emit empty frames while idle
+        self.__video_socket.settimeout(0.01)
 
     def __deploy_server(self) -> None:
         """
@@ -161,11 +298,13 @@ class Client:
             "send_frame_meta=true",  # 更新参数
             "control=true",
             "audio=false",
-            "show_touches=false",
+            f"show_touches={'true' if self.show_touches else 'false'}",
             "stay_awake=false",
             "power_off_on_close=false",
-            "clipboard_autosync=true"  # 更新参数
+            f"clipboard_autosync={'true' if self.clipboard_autosync else 'false'}",
         ]
+        if self.encoder_name:
+            commands.append(f"video_encoder={self.encoder_name}")
 
         self.__server_stream: AdbConnection = self.device.shell(
             commands,
@@ -188,6 +327,7 @@ class Client:
         self.__deploy_server()
         self.__init_server_connection()
         self.alive = True
+        self.receiver.start()
         self.__send_to_listeners(EVENT_INIT)
 
         if threaded or daemon_threaded:
@@ -203,6 +343,9 @@ class Client:
         Stop listening (both threaded and blocked)
         """
         self.alive = False
+        with self.frame_condition:
+            # Release waiters, they return None once the client is stopped
+            self.frame_condition.notify_all()
         if self.__server_stream is not None:
             try:
                 self.__server_stream.close()
@@ -210,6 +353,11 @@ class Client:
                 pass
 
         if self.control_socket is not None:
+            try:
+                # Shutdown first to wake up the device receiver blocked in recv
+                self.control_socket.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
             try:
                 self.control_socket.close()
             except Exception:
@@ -221,44 +369,272 @@ class Client:
             except Exception:
                 pass
 
+    def screencap(self, png: bool = False, display_id: Optional[int] = None) -> Union[np.ndarray, bytes]:
+        """
+        Native resolution, pixel exact screenshot over a separate adb connection
+
+        The mirror keeps streaming at max_width, the capture does not touch the
+        scrcpy session and works whether or not the client is started.
+
+        Args:
+            png: return lossless PNG bytes instead of a BGR frame
+            display_id: physical display id, None for the default display
+        """
+        if png:
+            return screencap_png(self.device, display_id)
+        return screencap(self.device, display_id)
+
+    def wait_for_frame(
+        self, after_seq: Optional[int] = None, timeout: Optional[float] = None
+    ) -> Optional[FrameSnapshot]:
+        """
+        Block until a frame newer than after_seq has been decoded
+
+        Args:
+            after_seq: seq of the last frame seen, None waits for the next frame
+            timeout: seconds to wait, None waits forever
+
+        Returns:
+            The latest FrameSnapshot, or None on timeout or when the client stops
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.frame_condition:
+            if after_seq is None:
+                after_seq = self.frame_seq
+            while self.frame_seq <= after_seq:
+                if not self.alive:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.frame_condition.wait(remaining)
+                if not self.alive:
+                    return None
+            return self.last_snapshot
+
+    def wait_for_change(
+        self,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = 0.01,
+        timeout: Optional[float] = None,
+        tolerance: int = 12,
+    ) -> Optional[FrameSnapshot]:
+        """
+        Block until a region differs from how it looks now
+
+        Each new frame is compared once on a 64 pixel wide grayscale sample.
+
+        Args:
+            roi: (x, y, width, height) in frame pixels, None for the whole frame
+            threshold: fraction of sampled pixels that must change
+            timeout: seconds to wait, None waits forever
+            tolerance: luma difference a sampled pixel needs to count as changed,
+                absorbs video compression noise
+
+        Returns:
+            First FrameSnapshot that differs, or None on timeout or when the client stops
+
+        Raises:
+            ValueError: roi does not overlap the frame
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        snapshot = self.last_snapshot
+        if snapshot is None:
+            snapshot = self.wait_for_frame(0, timeout)
+            if snapshot is None:
+                return None
+        _check_roi(roi, snapshot)
+        reference = _wait_sample(snapshot, roi)
+        seq = snapshot.seq
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            snapshot = self.wait_for_frame(seq, remaining)
+            if snapshot is None:
+                return None
+            seq = snapshot.seq
+            if _changed_ratio(_wait_sample(snapshot, roi), reference, tolerance) > threshold:
+                return snapshot
+
+    def wait_for_stable(
+        self,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        duration: float = 0.5,
+        timeout: Optional[float] = None,
+        threshold: float = 0.01,
+        tolerance: int = 12,
+    ) -> Optional[FrameSnapshot]:
+        """
+        Block until a region has not changed for duration seconds, e.g. after an
+        animation or page transition
+
+        The server sends no frames while the screen is static, so a quiet stream
+        counts as stable without waking up per frame.
+
+        Args:
+            roi: (x, y, width, height) in frame pixels, None for the whole frame
+            duration: seconds the region must stay unchanged
+            timeout: seconds to wait, None waits forever
+            threshold: fraction of sampled pixels allowed to change
+            tolerance: luma difference a sampled pixel needs to count as changed
+
+        Returns:
+            The latest FrameSnapshot once stable, or None on timeout or when the client stops
+
+        Raises:
+            ValueError: roi does not overlap the frame
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        snapshot = self.last_snapshot
+        if snapshot is None:
+            snapshot = self.wait_for_frame(0, timeout)
+            if snapshot is None:
+                return None
+        _check_roi(roi, snapshot)
+        # Compare against the start of the quiet period so slow drift is noticed
+        reference = _wait_sample(snapshot, roi)
+        stable_since = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - stable_since >= duration:
+                return snapshot
+            wait = stable_since + duration - now
+            if deadline is not None:
+                if now >= deadline:
+                    return None
+                wait = min(wait, deadline - now)
+            latest = self.wait_for_frame(snapshot.seq, wait)
+            if latest is None:
+                if not self.alive:
+                    return None
+                continue
+            snapshot = latest
+            sample = _wait_sample(snapshot, roi)
+            if _changed_ratio(sample, reference, tolerance) > threshold:
+                reference = sample
+                stable_since = time.monotonic()
+
+    def __recv_exact(self, size: int) -> bytes:
+        """
+        Read exactly size bytes from the video socket
+
+        Args:
+            size: number of bytes
+        """
+        buffer = bytearray()
+        while len(buffer) < size:
+            try:
+                chunk = self.__video_socket.recv(size - len(buffer))
+            except socket.timeout:
+                if self.alive and not self.block_frame:
+                    self.__send_to_listeners(EVENT_FRAME, None)
+                continue
+            if chunk == b"":
+                raise ConnectionError("Video stream is disconnected")
+            buffer += chunk
+        return bytes(buffer)
+
     def __stream_loop(self) -> None:
         """
         Core loop for video parsing
         """
-        codec = CodecContext.create("h264", "r")
+        codec = None
+        config = b""
+        last_config = b""
         while self.alive:
             try:
-                raw_h264 = self.__video_socket.recv(0x10000)
-                if raw_h264 == b"":
-                    raise ConnectionError("Video stream is disconnected")
-                packets = codec.parse(raw_h264)
-                for packet in packets:
+                # Frame meta: u64 pts and flags, u32 packet size
+                pts_flags, size = struct.unpack(">QI", self.__recv_exact(12))
+                data = self.__recv_exact(size)
+                if pts_flags & PACKET_FLAG_CONFIG:
+                    # SPS/PPS, prepended to the next packet for the decoder
+                    config = last_config = data
+                    self.__send_to_listeners(
+                        EVENT_PACKET, VideoPacket(data, None, True, False)
+                    )
+                    continue
+
+                pts = pts_flags & PACKET_PTS_MASK
+                key_frame = bool(pts_flags & PACKET_FLAG_KEY_FRAME)
+                self.__send_to_listeners(
+                    EVENT_PACKET, VideoPacket(data, pts, False, key_frame)
+                )
+                # decode can be toggled while streaming, call control.reset_video()
+                # after enabling it so the new decoder starts on a key frame
+                if not self.decode:
+                    codec = None
+                    continue
+                if codec is None:
+                    codec = CodecContext.create("h264", "r")
+                    config = last_config
+
+                packet = av.Packet(config + data if config else data)
+                config = b""
+                packet.pts = pts
+                try:
                     frames = codec.decode(packet)
-                    for frame in frames:
-                        frame = frame.to_ndarray(format="bgr24")
-                        if self.flip:
-                            frame = cv2.flip(frame, 1)
-                        self.last_frame = frame
-                        self.resolution = (frame.shape[1], frame.shape[0])
-                        self.__send_to_listeners(EVENT_FRAME, frame)
-            except (BlockingIOError, InvalidDataError):
-                time.sleep(0.01)
-                if not self.block_frame:
-                    self.__send_to_listeners(EVENT_FRAME, None)
+                except InvalidDataError:
+                    continue
+                for av_frame in frames:
+                    frame = av_frame.to_ndarray(format="bgr24")
+                    luma = self.__luma_plane(av_frame) if self.luma else None
+                    if self.flip:
+                        frame = cv2.flip(frame, 1)
+                        if luma is not None:
+                            luma = cv2.flip(luma, 1)
+                    frame_time = time.time()
+                    self.last_frame = frame
+                    self.last_frame_pts = pts
+                    self.last_frame_time = frame_time
+                    with self.frame_condition:
+                        self.frame_seq += 1
+                        # Single reference assignment, readers see a consistent snapshot
+                        self.last_snapshot = FrameSnapshot(
+                            frame, pts, frame_time, luma, self.frame_seq
+                        )
+                        self.frame_condition.notify_all()
+                    self.resolution = (frame.shape[1], frame.shape[0])
+                    self.__send_to_listeners(EVENT_FRAME, frame)
+                    if self.frame_views:
+                        self.frame_views.deliver(frame, luma)
             except (ConnectionError, OSError) as e:  # Socket Closed
                 if self.alive:
                     self.__send_to_listeners(EVENT_DISCONNECT)
                     self.stop()
                     raise e
 
-    def add_listener(self, cls: str, listener: Callable[..., Any]) -> None:
+    @staticmethod
+    def __luma_plane(av_frame: av.VideoFrame) -> Optional[np.ndarray]:
+        """
+        Copy the Y plane out of a planar YUV frame, None for other pixel formats
+        """
+        if av_frame.format.name not in ("yuv420p", "yuvj420p", "nv12"):
+            return None
+        plane = av_frame.planes[0]
+        rows = np.frombuffer(plane, np.uint8).reshape(plane.height, plane.line_size)
+        return rows[:, : plane.width].copy()
+
+    def add_listener(
+        self,
+        cls: str,
+        listener: Callable[..., Any],
+        spec: Optional[Union[FrameSpec, dict]] = None,
+    ) -> None:
         """
         Add a video listener
 
         Args:
-            cls: Listener category, support: init, frame
-            listener: A function to receive frame np.ndarray
+            cls: Listener category, support: init, frame, packet, disconnect, clipboard, ack_clipboard, uhid_output
+            listener: A function to receive frame np.ndarray, VideoPacket, or the device message payload
+            spec: frame listeners only, FrameSpec (or its fields as a dict) describing the
+                crop, size, colour format and fps cap of the image the listener receives.
+                Views shared by several listeners are computed once per frame and
+                delivered read-only, copy the image before modifying it
         """
+        if spec is not None:
+            if cls != EVENT_FRAME:
+                raise ValueError("spec is only supported for frame listeners")
+            self.frame_views.add(listener, spec)
+            return
         self.listeners[cls].append(listener)
 
     def remove_listener(self, cls: str, listener: Callable[..., Any]) -> None:
@@ -269,6 +645,8 @@ class Client:
             cls: Listener category, support: init, frame
             listener: A function to receive frame np.ndarray
         """
+        if cls == EVENT_FRAME and self.frame_views.remove(listener):
+            return
         self.listeners[cls].remove(listener)
 
     def __send_to_listeners(self, cls: str, *args, **kwargs) -> None:
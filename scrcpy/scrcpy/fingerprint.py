@@ -0,0 +1,315 @@
+"""
+Perceptual fingerprints of screen states
+
+A frame (or a region of it) is reduced to a 64 or 256 bit difference hash at
+very low resolution, cheap enough to compute on every decoded frame. Labelled
+reference states are kept in a multi-index hash table: the hash is split into
+16 bit chunks and every chunk value maps to the states that contain it. Two
+hashes within distance r < chunks share at least one chunk exactly, so a query
+that finds a candidate that close through a handful of dict lookups has found
+the true nearest state; only farther queries fall back to a vectorised scan.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .const import EVENT_FRAME
+from .core import FrameSnapshot
+
+# Hash bits -> side of the difference grid (side + 1 columns, side rows)
+GRID_SIDE = {64: 8, 256: 16}
+CHUNK_BITS = 16
+# Nearest-neighbour samples per grid cell taken before the area average
+OVERSAMPLE = 4
+
+Roi = Tuple[float, float, float, float]
+ImageInput = Union[np.ndarray, FrameSnapshot]
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def fingerprint(image: ImageInput, bits: int = 64, roi: Optional[Roi] = None) -> int:
+    """
+    Difference hash of a frame
+
+    The frame is point sampled on a small grid before the area average, so the
+    cost does not grow with the frame size (about 20us for 720x1600).
+
+    Args:
+        image: BGR or grayscale frame, or a FrameSnapshot (its luma plane is used
+            when available)
+        bits: 64 or 256
+        roi: (x, y, width, height) as fractions of the frame, None for the whole frame
+
+    Returns:
+        Hash as an int, bit i set when cell i is brighter than its left neighbour
+    """
+    if isinstance(image, FrameSnapshot):
+        image = image.luma if image.luma is not None else image.frame
+    side = GRID_SIDE[bits]
+    if roi is not None:
+        height, width = image.shape[:2]
+        x0, y0 = int(roi[0] * width), int(roi[1] * height)
+        x1 = max(x0 + 1, int((roi[0] + roi[2]) * width))
+        y1 = max(y0 + 1, int((roi[1] + roi[3]) * height))
+        image = image[y0:y1, x0:x1]
+    sampled = cv2.resize(image, ((side + 1) * OVERSAMPLE, side * OVERSAMPLE), interpolation=cv2.INTER_NEAREST)
+    if sampled.ndim == 3:
+        sampled = cv2.cvtColor(sampled, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(sampled, (side + 1, side), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(diff).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _words(value: int, bits: int) -> np.ndarray:
+    return np.frombuffer(value.to_bytes(bits // 8, "big"), dtype=">u8").astype(np.uint64)
+
+
+class StateMatch(NamedTuple):
+    """
+    Attributes:
+        label: name of the nearest known state
+        distance: Hamming distance to its closest reference hash
+        bits: hash size, distance / bits is the fraction of differing bits
+    """
+
+    label: str
+    distance: int
+    bits: int
+
+
+class StateIndex:
+    def __init__(self, bits: int = 64, roi: Optional[Roi] = None, max_distance: Optional[int] = None):
+        """
+        Labelled reference screen states searchable by perceptual hash
+
+        Args:
+            bits: hash size, 64 or 256 (finer, tells similar layouts apart)
+            roi: region hashed for every frame, as fractions of the frame
+            max_distance: queries farther than this from every state return None,
+                default is an eighth of the bits
+        """
+        if bits not in GRID_SIDE:
+            raise ValueError(f"bits must be one of {sorted(GRID_SIDE)}")
+        self.bits = bits
+        self.roi = tuple(roi) if roi is not None else None
+        self.max_distance = bits // 8 if max_distance is None else max_distance
+        self.chunks = bits // CHUNK_BITS
+        self.lock = threading.Lock()
+        self.labels: List[str] = []
+        self.hashes: List[int] = []
+        # (chunk position, chunk value) -> positions in labels/hashes
+        self.table: Dict[Tuple[int, int], List[int]] = {}
+        # Same hashes as uint64 words for the fallback scan
+        self.words = np.zeros((0, bits // 64), dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _chunks(self, value: int):
+        mask = (1 << CHUNK_BITS) - 1
+        for i in range(self.chunks):
+            yield i, (value >> (i * CHUNK_BITS)) & mask
+
+    def hash(self, image: ImageInput) -> int:
+        return fingerprint(image, self.bits, self.roi)
+
+    def add(self, label: str, image: Union[ImageInput, int]) -> int:
+        """
+        Add a reference for a state, a label may have several references
+
+        Args:
+            label: state name
+            image: frame or a hash computed with the same bits and roi
+
+        Returns:
+            The reference hash
+        """
+        value = image if isinstance(image, int) else self.hash(image)
+        with self.lock:
+            position = len(self.labels)
+            self.labels.append(label)
+            self.hashes.append(value)
+            for key in self._chunks(value):
+                self.table.setdefault(key, []).append(position)
+            self.words = np.vstack([self.words, _words(value, self.bits)])
+        return value
+
+    def remove(self, label: str) -> int:
+        """
+        Remove every reference of a state
+
+        Returns:
+            Number of references removed
+        """
+        with self.lock:
+            kept = [(l, h) for l, h in zip(self.labels, self.hashes) if l != label]
+            removed = len(self.labels) - len(kept)
+            self.labels, self.hashes, self.table = [], [], {}
+            self.words = np.zeros((0, self.bits // 64), dtype=np.uint64)
+        for l, h in kept:
+            self.add(l, h)
+        return removed
+
+    def states(self) -> List[str]:
+        with self.lock:
+            return sorted(set(self.labels))
+
+    def query(self, image: Union[ImageInput, int], max_distance: Optional[int] = None) -> Optional[StateMatch]:
+        """
+        Nearest known state
+
+        Args:
+            image: frame or hash
+            max_distance: override of the index's max_distance
+
+        Returns:
+            StateMatch, or None when no state is within max_distance
+        """
+        value = image if isinstance(image, int) else self.hash(image)
+        max_distance = self.max_distance if max_distance is None else max_distance
+        with self.lock:
+            if not self.labels:
+                return None
+            best, best_distance = -1, self.bits + 1
+            for key in self._chunks(value):
+                for position in self.table.get(key, ()):
+                    distance = hamming(value, self.hashes[position])
+                    if distance < best_distance:
+                        best, best_distance = position, distance
+            if best_distance >= self.chunks and max_distance >= self.chunks:
+                # The probe only guarantees states closer than self.chunks, scan everything
+                distances = _popcount(self.words ^ _words(value, self.bits)).sum(axis=1)
+                best = int(np.argmin(distances))
+                best_distance = int(distances[best])
+            if best_distance > max_distance:
+                return None
+            return StateMatch(self.labels[best], best_distance, self.bits)
+
+    def save(self, path: str) -> None:
+        """
+        Write the index as JSON, replaced atomically
+        """
+        with self.lock:
+            data = {
+                "version": 1,
+                "bits": self.bits,
+                "roi": self.roi,
+                "max_distance": self.max_distance,
+                "states": [
+                    {"label": label, "hash": f"{value:0{self.bits // 4}x}"}
+                    for label, value in zip(self.labels, self.hashes)
+                ],
+            }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "StateIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["bits"], data.get("roi"), data.get("max_distance"))
+        for state in data["states"]:
+            index.add(state["label"], int(state["hash"], 16))
+        return index
+
+
+class StateTracker:
+    def __init__(self, index: StateIndex, min_interval: float = 0.0):
+        """
+        Classify frames as they arrive and remember the current screen state
+
+        Args:
+            index: reference states
+            min_interval: minimum seconds between two classifications
+        """
+        self.index = index
+        self.min_interval = min_interval
+        self.current: Optional[StateMatch] = None
+        self.changed_at = 0.0
+        self.last_check = 0.0
+        self.listeners: List[Callable[[Optional[StateMatch], Optional[StateMatch]], None]] = []
+        self.client = None
+
+        # Statistics
+        self.checks = 0
+        self.check_us_total = 0.0
+
+    def update(self, frame: ImageInput) -> Optional[StateMatch]:
+        """
+        Classify a frame, listeners are called with (previous, current) when the
+        state label changes
+
+        Args:
+            frame: frame to classify, None (a client frame event without a new
+                frame) keeps the current state
+
+        Returns:
+            Current state
+        """
+        if frame is None:
+            return self.current
+        now = time.monotonic()
+        if self.min_interval and now - self.last_check < self.min_interval:
+            return self.current
+        self.last_check = now
+        start = time.perf_counter()
+        match = self.index.query(frame)
+        self.checks += 1
+        self.check_us_total += (time.perf_counter() - start) * 1e6
+        previous = self.current
+        self.current = match
+        if (previous and previous.label) != (match and match.label):
+            self.changed_at = now
+            for listener in list(self.listeners):
+                listener(previous, match)
+        return match
+
+    def add_listener(self, listener: Callable[[Optional[StateMatch], Optional[StateMatch]], None]) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Optional[StateMatch], Optional[StateMatch]], None]) -> None:
+        self.listeners.remove(listener)
+
+    def attach(self, client) -> None:
+        """
+        Classify every decoded frame of a client (headless workers)
+        """
+        self.detach()
+        self.client = client
+        client.add_listener(EVENT_FRAME, self.update)
+
+    def detach(self) -> None:
+        if self.client is not None:
+            self.client.remove_listener(EVENT_FRAME, self.update)
+            self.client = None
+
+    @property
+    def label(self) -> Optional[str]:
+        return self.current.label if self.current else None
+
+    def get_stats(self) -> dict:
+        return {
+            "checks": self.checks,
+            "avg_check_us": self.check_us_total / self.checks if self.checks else 0.0,
+            "state": self.label,
+        }
@@ -0,0 +1,464 @@
+"""
+Find templates on live frames with cv2.matchTemplate
+
+Every frame is converted to grayscale once (or taken from the decoder's Y plane)
+and reduced into a pyrDown pyramid that all templates share. Each template is
+matched at the coarsest level its size allows and the candidates are refined
+with a small full-resolution search, so the cost is dominated by a quarter or
+sixteenth sized image. The last hit of every template is remembered and the next
+search first looks in a window around it, which on a mostly static UI resolves
+most lookups without touching the rest of the frame.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .core import FrameSnapshot
+
+FrameInput = Union[np.ndarray, FrameSnapshot, None]
+
+
+class Match(NamedTuple):
+    """
+    A template hit in frame pixels
+
+    Attributes:
+        x: left edge
+        y: top edge
+        width: matched width (template width times scale)
+        height: matched height
+        score: normalized correlation coefficient, 1.0 is a perfect match
+        scale: template scale that produced the hit
+        name: template name
+    """
+
+    x: int
+    y: int
+    width: int
+    height: int
+    score: float
+    scale: float
+    name: str
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return self.x + self.width // 2, self.y + self.height // 2
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """
+    Grayscale view of a BGR, BGRA or already single channel image
+    """
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+class Template:
+    def __init__(
+        self,
+        image: Union[np.ndarray, str],
+        name: Optional[str] = None,
+        threshold: float = 0.85,
+        scales: Sequence[float] = (1.0,),
+    ):
+        """
+        Template to look for, scaled copies and their pyramids are prepared once
+
+        Args:
+            image: BGR/grayscale image or path of an image file
+            name: reported in matches, defaults to the file name or "template"
+            threshold: minimum score of a hit
+            scales: template sizes to try, relative to the image, for UIs that
+                are rendered at another density than the template was cut from
+
+        Raises:
+            ValueError: the image cannot be read, or it is a single flat colour
+                (normalized correlation would score 1.0 at every position)
+        """
+        if isinstance(image, str):
+            name = name or image
+            loaded = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+            if loaded is None:
+                raise ValueError(f"Cannot read template {image}")
+            image = loaded
+        self.name = name or "template"
+        self.threshold = threshold
+        self.gray = np.ascontiguousarray(to_gray(image))
+        if self.gray.min() == self.gray.max():
+            # Normalized correlation is undefined for a flat template and scores 1.0 everywhere
+            raise ValueError(f"Template {self.name} has no contrast")
+        self.scales = tuple(scales)
+        # scale -> [level 0, level 1, ...] grayscale template pyramid
+        self.levels: Dict[float, List[np.ndarray]] = {}
+        for scale in self.scales:
+            scaled = self.gray
+            if scale != 1.0:
+                size = (
+                    max(1, round(self.gray.shape[1] * scale)),
+                    max(1, round(self.gray.shape[0] * scale)),
+                )
+                interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+                scaled = cv2.resize(self.gray, size, interpolation=interpolation)
+            self.levels[scale] = [scaled]
+
+    def level(self, scale: float, level: int) -> np.ndarray:
+        levels = self.levels[scale]
+        while len(levels) <= level:
+            levels.append(cv2.pyrDown(levels[-1]))
+        return levels[level]
+
+    def size(self, scale: float) -> Tuple[int, int]:
+        """
+        Returns:
+            (width, height) of the scaled template in frame pixels
+        """
+        image = self.levels[scale][0]
+        return image.shape[1], image.shape[0]
+
+
+class FramePyramid:
+    def __init__(self, gray: np.ndarray):
+        """
+        Grayscale pyrDown pyramid of one frame, levels are built on first use
+
+        Args:
+            gray: single channel frame
+        """
+        self.levels = [gray]
+        self.lock = threading.Lock()
+
+    def level(self, level: int) -> np.ndarray:
+        with self.lock:
+            while len(self.levels) <= level:
+                self.levels.append(cv2.pyrDown(self.levels[-1]))
+            return self.levels[level]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.levels[0].shape[:2]
+
+
+def _best(result: np.ndarray) -> Tuple[float, Tuple[int, int]]:
+    _, score, _, location = cv2.minMaxLoc(result)
+    return float(score), location
+
+
+def _peaks(result: np.ndarray, threshold: float, limit: int) -> List[Tuple[float, int, int]]:
+    """
+    Local maxima of a matchTemplate result above threshold, best first
+    """
+    dilated = cv2.dilate(result, np.ones((3, 3), np.uint8))
+    ys, xs = np.nonzero((result >= threshold) & (result >= dilated))
+    if not len(xs):
+        return []
+    scores = result[ys, xs]
+    order = np.argsort(-scores)[:limit]
+    return [(float(scores[i]), int(xs[i]), int(ys[i])) for i in order]
+
+
+def _suppress(matches: Iterable[Match], overlap: float) -> List[Match]:
+    """
+    Greedy non-maximum suppression by intersection over the smaller box
+    """
+    kept: List[Match] = []
+    for match in sorted(matches, key=lambda m: -m.score):
+        for other in kept:
+            dx = min(match.x + match.width, other.x + other.width) - max(match.x, other.x)
+            dy = min(match.y + match.height, other.y + other.height) - max(match.y, other.y)
+            if dx > 0 and dy > 0:
+                smaller = min(match.width * match.height, other.width * other.height)
+                if dx * dy > overlap * smaller:
+                    break
+        else:
+            kept.append(match)
+    return kept
+
+
+class Matcher:
+    def __init__(
+        self,
+        client=None,
+        max_level: int = 3,
+        min_template_size: int = 12,
+        roi_margin: float = 0.5,
+        coarse_slack: float = 0.15,
+    ):
+        """
+        Template matcher over a client's latest frame
+
+        Args:
+            client: scrcpy Client providing last_snapshot, optional when frames are
+                always passed explicitly
+            max_level: deepest pyramid level used for the coarse search
+            min_template_size: the coarse level is chosen so the template keeps at
+                least this many pixels on its shorter side
+            roi_margin: margin around the last hit searched first, relative to the
+                template size
+            coarse_slack: coarse candidates may score this much below the threshold,
+                downsampling blurs fine detail so coarse scores run lower
+        """
+        self.client = client
+        self.max_level = max_level
+        self.min_template_size = min_template_size
+        self.roi_margin = roi_margin
+        self.coarse_slack = coarse_slack
+        self.lock = threading.Lock()
+        # Pyramid of the last frame searched, shared by all templates
+        self.frame_ref: Optional[np.ndarray] = None
+        self.pyramid: Optional[FramePyramid] = None
+        # id(template) -> last hit, searched first on the next frame
+        self.last_hits: Dict[int, Match] = {}
+
+        # Statistics
+        self.searches = 0
+        self.roi_hits = 0
+        self.pyramids_built = 0
+
+    def _pyramid(self, frame: FrameInput) -> FramePyramid:
+        if frame is None:
+            if self.client is None or self.client.last_snapshot is None:
+                raise RuntimeError("No frame available")
+            frame = self.client.last_snapshot
+        if isinstance(frame, FrameSnapshot):
+            frame = frame.luma if frame.luma is not None else frame.frame
+        with self.lock:
+            # Decoders publish a new array per frame, so identity means same frame
+            if frame is self.frame_ref:
+                return self.pyramid
+        pyramid = FramePyramid(np.ascontiguousarray(to_gray(frame)))
+        with self.lock:
+            self.frame_ref = frame
+            self.pyramid = pyramid
+            self.pyramids_built += 1
+        return pyramid
+
+    def _coarse_level(self, template: Template, scale: float, frame_shape: Tuple[int, int]) -> int:
+        width, height = template.size(scale)
+        level = 0
+        while level < self.max_level:
+            factor = 2 ** (level + 1)
+            if min(width, height) // factor < self.min_template_size:
+                break
+            if frame_shape[0] // factor < height // factor or frame_shape[1] // factor < width // factor:
+                break
+            level += 1
+        return level
+
+    def _match_window(
+        self, pyramid: FramePyramid, template: Template, scale: float, x0: int, y0: int, x1: int, y1: int
+    ) -> Optional[Match]:
+        """
+        Full resolution search restricted to [x0, x1) x [y0, y1)
+        """
+        image = pyramid.level(0)
+        width, height = template.size(scale)
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(image.shape[1], x1), min(image.shape[0], y1)
+        if x1 - x0 < width or y1 - y0 < height:
+            return None
+        result = cv2.matchTemplate(image[y0:y1, x0:x1], template.level(scale, 0), cv2.TM_CCOEFF_NORMED)
+        score, (x, y) = _best(result)
+        return Match(x0 + x, y0 + y, width, height, score, scale, template.name)
+
+    def _refine(
+        self, pyramid: FramePyramid, template: Template, scale: float, level: int, x: int, y: int
+    ) -> Optional[Match]:
+        factor = 2 ** level
+        width, height = template.size(scale)
+        pad = factor + 2
+        x0, y0 = x * factor - pad, y * factor - pad
+        return self._match_window(pyramid, template, scale, x0, y0, x0 + width + 2 * pad, y0 + height + 2 * pad)
+
+    def _search_roi(self, pyramid: FramePyramid, template: Template) -> Optional[Match]:
+        last = self.last_hits.get(id(template))
+        if last is None:
+            return None
+        mx = max(8, int(last.width * self.roi_margin))
+        my = max(8, int(last.height * self.roi_margin))
+        match = self._match_window(
+            pyramid, template, last.scale, last.x - mx, last.y - my, last.x + last.width + mx, last.y + last.height + my
+        )
+        if match is not None and match.score >= template.threshold:
+            return match
+        return None
+
+    def _search_scale(self, pyramid: FramePyramid, template: Template, scale: float, limit: int) -> List[Match]:
+        width, height = template.size(scale)
+        frame_height, frame_width = pyramid.shape
+        if width > frame_width or height > frame_height:
+            return []
+        level = self._coarse_level(template, scale, pyramid.shape)
+        result = cv2.matchTemplate(pyramid.level(level), template.level(scale, level), cv2.TM_CCOEFF_NORMED)
+        if level == 0:
+            return [
+                Match(x, y, width, height, score, scale, template.name)
+                for score, x, y in _peaks(result, template.threshold, limit)
+            ]
+        matches = []
+        for _, x, y in _peaks(result, template.threshold - self.coarse_slack, limit):
+            match = self._refine(pyramid, template, scale, level, x, y)
+            if match is not None and match.score >= template.threshold:
+                matches.append(match)
+        return matches
+
+    def find(self, template: Template, frame: FrameInput = None) -> Optional[Match]:
+        """
+        Best hit of a template
+
+        Args:
+            template: template to look for
+            frame: BGR/grayscale frame or FrameSnapshot, the client's latest frame if None
+
+        Returns:
+            Match or None when nothing scores above the template threshold
+        """
+        return self._find(self._pyramid(frame), template)
+
+    def _find(self, pyramid: FramePyramid, template: Template) -> Optional[Match]:
+        self.searches += 1
+        match = self._search_roi(pyramid, template)
+        if match is not None:
+            self.roi_hits += 1
+        else:
+            candidates = []
+            for scale in template.scales:
+                candidates.extend(self._search_scale(pyramid, template, scale, 4))
+            match = max(candidates, key=lambda m: m.score, default=None)
+        if match is None:
+            self.last_hits.pop(id(template), None)
+        else:
+            self.last_hits[id(template)] = match
+        return match
+
+    def find_all(
+        self, template: Template, frame: FrameInput = None, max_results: int = 32, overlap: float = 0.3
+    ) -> List[Match]:
+        """
+        Every hit of a template, e.g. all identical icons in a list
+
+        Args:
+            template: template to look for
+            frame: BGR/grayscale frame or FrameSnapshot, the client's latest frame if None
+            max_results: maximum number of hits
+            overlap: hits covering more than this fraction of a better hit are dropped
+
+        Returns:
+            Matches sorted by score, best first
+        """
+        pyramid = self._pyramid(frame)
+        self.searches += 1
+        candidates = []
+        for scale in template.scales:
+            candidates.extend(self._search_scale(pyramid, template, scale, max_results * 4))
+        matches = _suppress(candidates, overlap)[:max_results]
+        if matches:
+            self.last_hits[id(template)] = matches[0]
+        return matches
+
+    def find_any(self, templates: Iterable[Template], frame: FrameInput = None) -> Dict[str, Match]:
+        """
+        Look for several templates in the same frame, the pyramid is built once
+
+        Returns:
+            {template name: Match} of the templates that were found
+        """
+        pyramid = self._pyramid(frame)
+        hits = {}
+        for template in templates:
+            match = self._find(pyramid, template)
+            if match is not None:
+                hits[template.name] = match
+        return hits
+
+    def wait_for(self, template: Template, timeout: float = 10.0) -> Optional[Match]:
+        """
+        Block until a template shows up on the client's screen
+
+        The current frame is searched first, then each newly decoded frame once;
+        between frames the caller sleeps on the client's frame condition.
+
+        Args:
+            template: template to look for
+            timeout: seconds to wait
+
+        Returns:
+            Match or None on timeout or when the client stops
+        """
+        if self.client is None:
+            raise RuntimeError("wait_for needs a client")
+        deadline = time.monotonic() + timeout
+        snapshot = self.client.last_snapshot
+        while True:
+            if snapshot is not None:
+                match = self.find(template, snapshot)
+                if match is not None:
+                    return match
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            snapshot = self.client.wait_for_frame(snapshot.seq if snapshot else 0, remaining)
+            if snapshot is None:
+                return None
+
+    def get_stats(self) -> dict:
+        return {
+            "searches": self.searches,
+            "roi_hits": self.roi_hits,
+            "pyramids_built": self.pyramids_built,
+        }
+
+
+def benchmark(
+    sizes: Sequence[Tuple[int, int]] = ((360, 800), (720, 1600), (1080, 2400)),
+    template_size: int = 64,
+    seconds: float = 1.0,
+) -> List[dict]:
+    """
+    Measure matches per second on synthetic frames
+
+    Args:
+        sizes: frame (width, height) to test
+        template_size: template side length in pixels
+        seconds: time spent per size and mode
+
+    Returns:
+        One dict per frame size with matches/s for a cold search (new frame every
+        call, pyramid rebuilt), a warm search (same frame) and an ROI cache hit
+    """
+    rng = np.random.default_rng(0)
+    rows = []
+    for width, height in sizes:
+        noise = rng.integers(0, 256, (height // 8 + 1, width // 8 + 1), dtype=np.uint8)
+        gray = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+        x, y = width // 3, height // 2
+        template = Template(gray[y : y + template_size, x : x + template_size].copy())
+        row = {"width": width, "height": height}
+        for mode in ("cold", "warm", "roi"):
+            matcher = Matcher()
+            frames = [gray, gray.copy()]
+            count = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds:
+                frame = frames[count % 2] if mode == "cold" else gray
+                if mode != "roi":
+                    matcher.last_hits.clear()
+                assert matcher.find(template, frame) is not None
+                count += 1
+            row[mode] = count / (time.perf_counter() - start)
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(
+            f"{row['width']}x{row['height']}: cold {row['cold']:.0f}/s, "
+            f"warm {row['warm']:.0f}/s, roi {row['roi']:.0f}/s"
+        )
@@ -0,0 +1,427 @@
+"""
+Retained overlay drawn on top of the device screen
+"""
+
+import abc
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Color = Tuple[int, int, int]
+Bounds = Tuple[int, int, int, int]
+
+
+class OverlayItem(abc.ABC):
+    """
+    Base class of overlay items, coordinates are device frame pixels
+    """
+
+    def __init__(self, color: Color, alpha: float):
+        self.color = tuple(int(c) for c in color)
+        self.alpha = int(round(max(0.0, min(1.0, alpha)) * 255))
+
+    @abc.abstractmethod
+    def bounds(self) -> Bounds:
+        """
+        Returns:
+            (x0, y0, x1, y1) of every pixel the item may touch, x1/y1 exclusive
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def draw(self, color: np.ndarray, alpha: np.ndarray, ox: int, oy: int) -> None:
+        """
+        Draw into the layer buffers
+
+        Args:
+            color: BGR buffer of the layer
+            alpha: alpha buffer of the layer
+            ox: frame x of the buffer's left edge
+            oy: frame y of the buffer's top edge
+        """
+        raise NotImplementedError
+
+
+class RectItem(OverlayItem):
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        color: Color = (0, 255, 0),
+        thickness: int = 2,
+        alpha: float = 1.0,
+    ):
+        """
+        Args:
+            thickness: border width, negative fills the rectangle
+        """
+        super().__init__(color, alpha)
+        self.x, self.y, self.width, self.height = int(x), int(y), int(width), int(height)
+        self.thickness = int(thickness)
+
+    def bounds(self) -> Bounds:
+        pad = max(self.thickness, 0) // 2 + 1
+        return (
+            self.x - pad,
+            self.y - pad,
+            self.x + self.width + pad,
+            self.y + self.height + pad,
+        )
+
+    def draw(self, color: np.ndarray, alpha: np.ndarray, ox: int, oy: int) -> None:
+        p0 = (self.x - ox, self.y - oy)
+        p1 = (self.x + self.width - 1 - ox, self.y + self.height - 1 - oy)
+        cv2.rectangle(color, p0, p1, self.color, self.thickness)
+        cv2.rectangle(alpha, p0, p1, self.alpha, self.thickness)
+
+
+class LabelItem(OverlayItem):
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        text: str,
+        color: Color = (0, 255, 0),
+        scale: float = 0.5,
+        thickness: int = 1,
+        alpha: float = 1.0,
+        background: Optional[Color] = None,
+    ):
+        """
+        Args:
+            x: left of the text
+            y: baseline of the text
+            background: fill the text box with this color, None keeps it transparent
+        """
+        super().__init__(color, alpha)
+        self.x, self.y = int(x), int(y)
+        self.text = text
+        self.scale = scale
+        self.thickness = int(thickness)
+        self.background = background
+        (self.text_width, self.text_height), self.baseline = cv2.getTextSize(
+            text, cv2.FONT_HERSHEY_SIMPLEX, scale, self.thickness
+        )
+
+    def bounds(self) -> Bounds:
+        pad = self.thickness + 1
+        return (
+            self.x - pad,
+            self.y - self.text_height - pad,
+            self.x + self.text_width + pad,
+            self.y + self.baseline + pad,
+        )
+
+    def draw(self, color: np.ndarray, alpha: np.ndarray, ox: int, oy: int) -> None:
+        origin = (self.x - ox, self.y - oy)
+        if self.background is not None:
+            x0, y0, x1, y1 = self.bounds()
+            p0, p1 = (x0 - ox, y0 - oy), (x1 - 1 - ox, y1 - 1 - oy)
+            cv2.rectangle(color, p0, p1, self.background, -1)
+            cv2.rectangle(alpha, p0, p1, self.alpha, -1)
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        cv2.putText(color, self.text, origin, font, self.scale, self.color, self.thickness, cv2.LINE_AA)
+        cv2.putText(alpha, self.text, origin, font, self.scale, self.alpha, self.thickness, cv2.LINE_AA)
+
+
+class MaskItem(OverlayItem):
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        mask: np.ndarray,
+        color: Color = (0, 255, 0),
+        alpha: float = 0.4,
+    ):
+        """
+        Args:
+            mask: 2D array, nonzero pixels are filled with color
+        """
+        super().__init__(color, alpha)
+        mask = np.asarray(mask) != 0
+        rows, cols = _nonzero_box(mask)
+        self.x, self.y = int(x) + cols.start, int(y) + rows.start
+        self.mask = mask[rows, cols]
+
+    def bounds(self) -> Bounds:
+        height, width = self.mask.shape
+        return self.x, self.y, self.x + width, self.y + height
+
+    def draw(self, color: np.ndarray, alpha: np.ndarray, ox: int, oy: int) -> None:
+        target, mask = _clip(self.x - ox, self.y - oy, self.mask, alpha.shape)
+        if target is None:
+            return
+        color[target][mask] = self.color
+        alpha[target][mask] = self.alpha
+
+
+class ImageItem(OverlayItem):
+    def __init__(self, x: int, y: int, image: np.ndarray, alpha: float = 1.0):
+        """
+        Args:
+            image: BGR image, black pixels are transparent
+        """
+        super().__init__((0, 0, 0), alpha)
+        mask = np.any(image != 0, axis=2)
+        rows, cols = _nonzero_box(mask)
+        self.x, self.y = int(x) + cols.start, int(y) + rows.start
+        self.image = image[rows, cols]
+        self.mask = mask[rows, cols]
+
+    def bounds(self) -> Bounds:
+        height, width = self.mask.shape
+        return self.x, self.y, self.x + width, self.y + height
+
+    def draw(self, color: np.ndarray, alpha: np.ndarray, ox: int, oy: int) -> None:
+        target, mask = _clip(self.x - ox, self.y - oy, self.mask, alpha.shape)
+        if target is None:
+            return
+        rows, cols = target
+        image = self.image[
+            rows.start - (self.y - oy) : rows.stop - (self.y - oy),
+            cols.start - (self.x - ox) : cols.stop - (self.x - ox),
+        ]
+        color[target][mask] = image[mask]
+        alpha[target][mask] = self.alpha
+
+
+def _nonzero_box(mask: np.ndarray) -> Tuple[slice, slice]:
+    """
+    Returns:
+        (row slice, column slice) of the smallest box holding every set pixel,
+        empty slices when none is set
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return slice(0, 0), slice(0, 0)
+    cols = np.flatnonzero(mask.any(axis=0))
+    return slice(int(rows[0]), int(rows[-1]) + 1), slice(int(cols[0]), int(cols[-1]) + 1)
+
+
+def _clip(x: int, y: int, mask: np.ndarray, shape: Tuple[int, ...]):
+    """
+    Clip a mask placed at (x, y) to a buffer
+
+    Returns:
+        (buffer slices, clipped mask), (None, None) when nothing overlaps
+    """
+    height, width = mask.shape
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, shape[1]), min(y + height, shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return None, None
+    return (slice(y0, y1), slice(x0, x1)), mask[y0 - y : y1 - y, x0 - x : x1 - x]
+
+
+class OverlayLayer:
+    """
+    Rendered overlay covering only the union of the items' bounds
+    """
+
+    def __init__(self, x: int, y: int, color: np.ndarray, alpha: np.ndarray):
+        self.x = x
+        self.y = y
+        self.color = color
+        self.alpha = alpha
+        self.width = alpha.shape[1]
+        self.height = alpha.shape[0]
+        self._bgra: Optional[np.ndarray] = None
+        self._touched: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def bgra(self) -> np.ndarray:
+        """
+        Straight (non premultiplied) BGRA buffer, matches QImage.Format_ARGB32 and PNG
+        """
+        if self._bgra is None:
+            self._bgra = np.dstack((self.color, self.alpha))
+        return self._bgra
+
+    @property
+    def touched(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row and column indices (relative to the layer) of pixels with nonzero alpha
+        """
+        if self._touched is None:
+            self._touched = np.nonzero(self.alpha)
+        return self._touched
+
+    def composite(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Blend the layer into a BGR frame in place, only touched pixels are read and written
+
+        Args:
+            frame: frame of the size the layer was rendered for
+
+        Returns:
+            the same frame
+        """
+        rows, cols = self.touched
+        if not len(rows):
+            return frame
+        a = self.alpha[rows, cols].astype(np.uint16)[:, None]
+        src = self.color[rows, cols].astype(np.uint16)
+        dst_rows, dst_cols = rows + self.y, cols + self.x
+        dst = frame[dst_rows, dst_cols].astype(np.uint16)
+        frame[dst_rows, dst_cols] = ((src * a + dst * (255 - a) + 127) // 255).astype(np.uint8)
+        return frame
+
+
+class Overlay:
+    def __init__(self):
+        """
+        Retained list of rectangles, labels, masks and images drawn over the screen
+
+        Items are kept until removed. The rendered layer (color + alpha) is cached per
+        version and frame size and only covers the items' bounding region, so drawing
+        it costs overlay area instead of screen size. Listeners are called after every
+        change, possibly from the thread that changed the overlay.
+        """
+        self.lock = threading.Lock()
+        self.items: Dict[int, OverlayItem] = {}
+        self.next_id = 1
+        self.version = 0
+        self.listeners: List[Callable[[], None]] = []
+        self._cache_key: Optional[tuple] = None
+        self._cache: Optional[OverlayLayer] = None
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def __changed(self) -> None:
+        for callback in list(self.listeners):
+            callback()
+
+    def add(self, item: OverlayItem) -> int:
+        """
+        Add an item, later items are drawn on top
+
+        Returns:
+            item id for remove / replace
+        """
+        with self.lock:
+            item_id = self.next_id
+            self.next_id += 1
+            self.items[item_id] = item
+            self.version += 1
+        self.__changed()
+        return item_id
+
+    def add_rect(self, x: int, y: int, width: int, height: int, **kwargs) -> int:
+        return self.add(RectItem(x, y, width, height, **kwargs))
+
+    def add_label(self, x: int, y: int, text: str, **kwargs) -> int:
+        return self.add(LabelItem(x, y, text, **kwargs))
+
+    def add_mask(self, x: int, y: int, mask: np.ndarray, **kwargs) -> int:
+        return self.add(MaskItem(x, y, mask, **kwargs))
+
+    def add_image(self, x: int, y: int, image: np.ndarray, **kwargs) -> int:
+        return self.add(ImageItem(x, y, image, **kwargs))
+
+    def replace(self, item_id: int, item: OverlayItem) -> None:
+        """
+        Replace an item in place, keeping its drawing order
+        """
+        with self.lock:
+            if item_id not in self.items:
+                raise KeyError(item_id)
+            self.items[item_id] = item
+            self.version += 1
+        self.__changed()
+
+    def remove(self, item_id: int) -> bool:
+        with self.lock:
+            if self.items.pop(item_id, None) is None:
+                return False
+            self.version += 1
+        self.__changed()
+        return True
+
+    def clear(self) -> None:
+        with self.lock:
+            if not self.items:
+                return
+            self.items.clear()
+            self.version += 1
+        self.__changed()
+
+    def bounds(self, width: int, height: int) -> Optional[Bounds]:
+        """
+        Union of the items' bounds clipped to the frame
+
+        Returns:
+            (x0, y0, x1, y1), None if the overlay is empty or off screen
+        """
+        with self.lock:
+            items = list(self.items.values())
+        return self.__bounds(items, width, height)
+
+    @staticmethod
+    def __bounds(items: List[OverlayItem], width: int, height: int) -> Optional[Bounds]:
+        boxes = [box for box in (item.bounds() for item in items) if box[0] < box[2] and box[1] < box[3]]
+        if not boxes:
+            return None
+        x0, y0, x1, y1 = np.array(boxes).T
+        x0, y0 = max(int(x0.min()), 0), max(int(y0.min()), 0)
+        x1, y1 = min(int(x1.max()), width), min(int(y1.max()), height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def render(self, width: int, height: int) -> Optional[OverlayLayer]:
+        """
+        Render the overlay for a frame size, cached until the overlay changes
+
+        Args:
+            width: frame width
+            height: frame height
+
+        Returns:
+            the layer, None if there is nothing to draw
+        """
+        with self.lock:
+            key = (self.version, width, height)
+            if key == self._cache_key:
+                return self._cache
+            items = list(self.items.values())
+        region = self.__bounds(items, width, height)
+        layer = None
+        if region is not None:
+            x0, y0, x1, y1 = region
+            color = np.zeros((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+            alpha = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+            for item in items:
+                item.draw(color, alpha, x0, y0)
+            layer = OverlayLayer(x0, y0, color, alpha)
+        with self.lock:
+            if self.version == key[0]:
+                self._cache_key = key
+                self._cache = layer
+        return layer
+
+    def composite(self, frame: np.ndarray, copy: bool = True) -> np.ndarray:
+        """
+        Blend the overlay into a BGR frame
+
+        Args:
+            frame: decoded frame
+            copy: blend into a copy and leave the input (possibly shared) untouched
+
+        Returns:
+            frame with the overlay, the input itself when the overlay is empty
+        """
+        layer = self.render(frame.shape[1], frame.shape[0])
+        if layer is None:
+            return frame
+        if copy:
+            frame = frame.copy()
+        return layer.composite(frame)
@@ -0,0 +1,199 @@
+"""
+Device message receiver, demultiplexes the control socket read side
+"""
+
+import socket
+import struct
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, NamedTuple, Optional
+
+from . import const
+
+# Sequence numbers remembered after their ACK arrived, so a late waiter still succeeds
+ACK_HISTORY_SIZE = 64
+
+
+class ClipboardMessage(NamedTuple):
+    text: str
+
+
+class AckClipboardMessage(NamedTuple):
+    sequence: int
+
+
+class UhidOutputMessage(NamedTuple):
+    id: int
+    data: bytes
+
+
+class DeviceReceiver:
+    def __init__(self, parent):
+        """
+        Read device messages from the control socket in a background thread
+
+        Clipboard replies and clipboard ACKs resolve the pending futures created by
+        request_clipboard / expect_ack, every message is also forwarded to the
+        client's clipboard / ack_clipboard / uhid_output listeners.
+
+        With clipboard autosync the server never replies to GET_CLIPBOARD, it only
+        sends the clipboard when it changes. The last synchronized text is kept, a
+        plain request is answered from it and a COPY / CUT request waits for the
+        change the key press causes.
+
+        Args:
+            parent: Client instance
+        """
+        self.parent = parent
+        self.lock = threading.Lock()
+        self.pending_clipboard: Deque[Future] = deque()
+        self.clipboard_text: Optional[str] = None
+        self.pending_acks: Dict[int, Future] = {}
+        self.acked: Deque[int] = deque(maxlen=ACK_HISTORY_SIZE)
+        self.thread: Optional[threading.Thread] = None
+        self.error: Optional[Exception] = None
+
+    def start(self) -> None:
+        """
+        Start the reader thread, the control socket must be connected
+        """
+        self.error = None
+        self.thread = threading.Thread(
+            target=self.__receive_loop, name="scrcpy-device-receiver", daemon=True
+        )
+        self.thread.start()
+
+    def request_clipboard(self, copy_key: int = const.COPY_KEY_NONE) -> Future:
+        """
+        Register a pending clipboard request, call before sending TYPE_GET_CLIPBOARD
+
+        Args:
+            copy_key: COPY_KEY_NONE, COPY_KEY_COPY, or COPY_KEY_CUT
+
+        Returns:
+            Future resolved with the clipboard text, already done when the request
+            needs no reply (autosync without copy key)
+        """
+        future = Future()
+        with self.lock:
+            if self.error is not None:
+                future.set_exception(self.error)
+            elif self.parent.clipboard_autosync and copy_key == const.COPY_KEY_NONE:
+                if self.clipboard_text is not None:
+                    future.set_result(self.clipboard_text)
+                else:
+                    future.set_exception(
+                        LookupError("Clipboard has not been synchronized since the client started")
+                    )
+            else:
+                self.pending_clipboard.append(future)
+        return future
+
+    def expect_ack(self, sequence: int) -> Future:
+        """
+        Register a pending clipboard ACK, call before sending TYPE_SET_CLIPBOARD
+
+        Args:
+            sequence: sequence number of the set_clipboard request
+
+        Returns:
+            Future resolved with the sequence number once acknowledged, the same
+            future when the sequence is already expected
+        """
+        future = Future()
+        with self.lock:
+            pending = self.pending_acks.get(sequence)
+            if pending is not None and not pending.done():
+                return pending
+            if sequence in self.acked:
+                future.set_result(sequence)
+            elif self.error is not None:
+                future.set_exception(self.error)
+            else:
+                self.pending_acks[sequence] = future
+        return future
+
+    def cancel(self, future: Future) -> None:
+        """
+        Forget a pending future, e.g. when the request could not be sent
+        """
+        with self.lock:
+            if future in self.pending_clipboard:
+                self.pending_clipboard.remove(future)
+            for sequence, pending in list(self.pending_acks.items()):
+                if pending is future:
+                    del self.pending_acks[sequence]
+        future.cancel()
+
+    def __recv_exact(self, s: socket.socket, size: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = s.recv(size - len(buffer))
+            if chunk == b"":
+                raise ConnectionError("Control socket is disconnected")
+            buffer += chunk
+        return bytes(buffer)
+
+    def __read_message(self, s: socket.socket):
+        (msg_type,) = struct.unpack(">B", self.__recv_exact(s, 1))
+        if msg_type == const.TYPE_DEVICE_CLIPBOARD:
+            (length,) = struct.unpack(">i", self.__recv_exact(s, 4))
+            return ClipboardMessage(self.__recv_exact(s, length).decode("utf-8"))
+        if msg_type == const.TYPE_DEVICE_ACK_CLIPBOARD:
+            (sequence,) = struct.unpack(">Q", self.__recv_exact(s, 8))
+            return AckClipboardMessage(sequence)
+        if msg_type == const.TYPE_DEVICE_UHID_OUTPUT:
+            id, size = struct.unpack(">HH", self.__recv_exact(s, 4))
+            return UhidOutputMessage(id, self.__recv_exact(s, size))
+        raise ConnectionError(f"Unknown device message type: {msg_type}")
+
+    def __dispatch(self, message) -> None:
+        if isinstance(message, ClipboardMessage):
+            # Without autosync every clipboard message is a reply, with it only the
+            # change caused by a COPY / CUT request is waited for, other messages
+            # find no pending request
+            with self.lock:
+                self.clipboard_text = message.text
+                future = self.pending_clipboard.popleft() if self.pending_clipboard else None
+            if future is not None and not future.done():
+                future.set_result(message.text)
+            self.__emit(const.EVENT_CLIPBOARD, message.text)
+        elif isinstance(message, AckClipboardMessage):
+            with self.lock:
+                self.acked.append(message.sequence)
+                future = self.pending_acks.pop(message.sequence, None)
+            if future is not None and not future.done():
+                future.set_result(message.sequence)
+            self.__emit(const.EVENT_ACK_CLIPBOARD, message.sequence)
+        elif isinstance(message, UhidOutputMessage):
+            self.__emit(const.EVENT_UHID_OUTPUT, message.id, message.data)
+
+    def __emit(self, cls: str, *args) -> None:
+        for fun in list(self.parent.listeners[cls]):
+            try:
+                fun(*args)
+            except Exception as e:
+                # A failing listener must not stop the reader thread
+                print(f"Device message listener {fun!r} failed: {e!r}")
+
+    def __fail_pending(self, error: Exception) -> None:
+        with self.lock:
+            self.error = error
+            futures = list(self.pending_clipboard) + list(self.pending_acks.values())
+            self.pending_clipboard.clear()
+            self.pending_acks.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def __receive_loop(self) -> None:
+        """
+        Core loop for device message parsing
+        """
+        s: socket.socket = self.parent.control_socket
+        try:
+            while self.parent.alive:
+                self.__dispatch(self.__read_message(s))
+        except (ConnectionError, OSError) as e:
+            self.__fail_pending(ConnectionError(f"Device receiver stopped: {e}"))
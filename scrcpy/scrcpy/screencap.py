@@ -0,0 +1,120 @@
+"""
+Native resolution screenshots through adb screencap, independent of the mirror stream
+"""
+
+import struct
+from typing import Optional
+
+import cv2
+import numpy as np
+from adbutils import AdbDevice
+
+# android.graphics.PixelFormat values reported in the screencap header
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_RGB_888 = 3
+
+BYTES_PER_PIXEL = {
+    PIXEL_FORMAT_RGBA_8888: 4,
+    PIXEL_FORMAT_RGBX_8888: 4,
+    PIXEL_FORMAT_RGB_888: 3,
+}
+
+
+def _exec_out(device: AdbDevice, command: str, timeout: float) -> bytes:
+    """
+    Run a command through the exec: service and read its raw stdout into memory
+
+    Unlike shell:, exec: never allocates a pty, so binary output is not mangled.
+    """
+    conn = device.open_transport(timeout=timeout)
+    try:
+        conn.send_command("exec:" + command)
+        conn.check_okay()
+        chunks = []
+        while True:
+            chunk = conn.conn.recv(1 << 20)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+    finally:
+        conn.close()
+
+
+def _command(png: bool, display_id: Optional[int]) -> str:
+    command = "screencap"
+    if display_id is not None:
+        command += f" -d {display_id}"
+    if png:
+        command += " -p"
+    return command
+
+
+def screencap(device: AdbDevice, display_id: Optional[int] = None, timeout: float = 10.0) -> np.ndarray:
+    """
+    Capture the screen at native resolution, pixel exact (no video compression)
+
+    The raw framebuffer is transferred, so the device skips its slow PNG encoder.
+    Pixel formats other than RGBA/RGBX/RGB fall back to device side PNG.
+
+    Args:
+        device: adb device
+        display_id: physical display id, None for the default display
+        timeout: socket timeout in seconds
+
+    Returns:
+        BGR frame
+    """
+    data = _exec_out(device, _command(False, display_id), timeout)
+    if len(data) < 12:
+        raise ConnectionError(f"screencap returned {len(data)} bytes")
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    bpp = BYTES_PER_PIXEL.get(pixel_format)
+    if bpp is None:
+        return cv2.imdecode(
+            np.frombuffer(screencap_png(device, display_id, timeout, native=True), np.uint8),
+            cv2.IMREAD_COLOR,
+        )
+    # Header is 12 bytes, or 16 with the color space added in Android 9
+    header = len(data) - width * height * bpp
+    if header not in (12, 16):
+        raise ConnectionError(
+            f"Unexpected screencap size {len(data)} for {width}x{height} format {pixel_format}"
+        )
+    pixels = np.frombuffer(data, np.uint8, offset=header).reshape(height, width, bpp)
+    code = cv2.COLOR_RGB2BGR if bpp == 3 else cv2.COLOR_RGBA2BGR
+    return cv2.cvtColor(pixels, code)
+
+
+def screencap_png(
+    device: AdbDevice,
+    display_id: Optional[int] = None,
+    timeout: float = 10.0,
+    native: bool = False,
+    compression: int = 3,
+) -> bytes:
+    """
+    Capture the screen at native resolution as a lossless PNG
+
+    Args:
+        device: adb device
+        display_id: physical display id, None for the default display
+        timeout: socket timeout in seconds
+        native: let the device encode the PNG (screencap -p), otherwise the raw
+            framebuffer is transferred and encoded on the host, which is usually faster
+        compression: host PNG compression level 0-9
+
+    Returns:
+        PNG bytes
+    """
+    if native:
+        data = _exec_out(device, _command(True, display_id), timeout)
+        if not data.startswith(b"\x89PNG"):
+            raise ConnectionError("screencap -p did not return a PNG")
+        return data
+    frame = screencap(device, display_id, timeout)
+    ok, buffer = cv2.imencode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, compression])
+    if not ok:
+        raise RuntimeError("PNG encode failed")
+    return buffer.tobytes()
@@ -0,0 +1,231 @@
+"""
+Frame listeners that receive a derived view of each frame
+
+A FrameSpec describes what a consumer wants (crop, size, colour format, fps cap).
+Per frame, every unique derived image is computed once and handed to all
+subscribers that asked for it. Work is shared across overlapping specs as well:
+a downscale starts from the smallest already computed image of the same crop
+that is still large enough, and colour conversion runs last on the smallest
+image. Grayscale views are taken from the decoder's Y plane when the client
+publishes it.
+
+Delivered images are read-only: one array is handed to every subscriber of the
+same view, and views that need no resize are slices of the decoder frame
+itself. Copy an image before modifying it.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+FORMATS = ("bgr", "rgb", "gray")
+
+Crop = Tuple[int, int, int, int]
+
+
+class FrameSpec(NamedTuple):
+    """
+    Attributes:
+        crop: (x, y, width, height) in frame pixels, None for the whole frame
+        width: output width, None keeps the crop width (or follows height)
+        height: output height, None keeps the aspect ratio
+        format: "bgr", "rgb" or "gray"
+        fps: maximum deliveries per second, 0 for every frame
+    """
+
+    crop: Optional[Crop] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: str = "bgr"
+    fps: float = 0.0
+
+    @classmethod
+    def of(cls, spec: Union["FrameSpec", dict]) -> "FrameSpec":
+        spec = spec if isinstance(spec, FrameSpec) else cls(**spec)
+        if spec.format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}")
+        if spec.crop is not None:
+            spec = spec._replace(crop=tuple(int(v) for v in spec.crop))
+            if len(spec.crop) != 4 or spec.crop[2] <= 0 or spec.crop[3] <= 0:
+                raise ValueError("crop must be (x, y, width, height) with a positive size")
+        if (spec.width is not None and spec.width <= 0) or (spec.height is not None and spec.height <= 0):
+            raise ValueError("width and height must be positive")
+        return spec
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """
+        Args:
+            width: crop width
+            height: crop height
+
+        Returns:
+            (width, height) of the delivered image
+        """
+        if self.width and self.height:
+            return self.width, self.height
+        if self.width:
+            return self.width, max(1, round(height * self.width / width))
+        if self.height:
+            return max(1, round(width * self.height / height)), self.height
+        return width, height
+
+
+class FrameSubscription:
+    def __init__(self, listener: Callable[[np.ndarray], Any], spec: FrameSpec):
+        self.listener = listener
+        self.spec = spec
+        self.interval = 1.0 / spec.fps if spec.fps > 0 else 0.0
+        self.next_time = 0.0
+        self.delivered = 0
+        self.errors = 0
+
+    def due(self, now: float) -> bool:
+        if now < self.next_time:
+            return False
+        # Keep the cadence from drifting, but never build up a burst
+        self.next_time = max(self.next_time + self.interval, now) if self.interval else 0.0
+        return True
+
+
+class FramePreprocessor:
+    def __init__(self):
+        """
+        Deliver derived frames to spec subscribers, sharing work between them
+        """
+        self.lock = threading.Lock()
+        self.subscriptions: List[FrameSubscription] = []
+
+        # Statistics
+        self.frames = 0
+        self.computed = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def add(self, listener: Callable[[np.ndarray], Any], spec: Union[FrameSpec, dict]) -> FrameSubscription:
+        subscription = FrameSubscription(listener, FrameSpec.of(spec))
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def remove(self, listener: Callable[[np.ndarray], Any]) -> bool:
+        with self.lock:
+            for subscription in self.subscriptions:
+                if subscription.listener == listener:
+                    self.subscriptions.remove(subscription)
+                    return True
+        return False
+
+    def deliver(self, frame: np.ndarray, luma: Optional[np.ndarray] = None) -> None:
+        """
+        Compute the views due for this frame and call their listeners
+
+        Args:
+            frame: BGR frame
+            luma: Y plane of the same frame, used for grayscale views
+        """
+        now = time.monotonic()
+        with self.lock:
+            due = [s for s in self.subscriptions if s.due(now)]
+        if not due:
+            return
+        self.frames += 1
+        views = _FrameViews(self, frame, luma)
+        for subscription in due:
+            # A bad spec or a failing listener must not stop delivery to the others
+            try:
+                image = views.get(subscription.spec)
+                subscription.delivered += 1
+                subscription.listener(image)
+            except Exception as e:
+                subscription.errors += 1
+                if subscription.errors == 1:
+                    # Reported once, a spec outside the frame would fail on every frame
+                    print(f"Frame subscription {subscription.listener!r} failed: {e!r}")
+
+    def get_stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscriptions),
+            "frames": self.frames,
+            "computed": self.computed,
+            "shared": self.shared,
+            "errors": sum(s.errors for s in self.subscriptions),
+        }
+
+
+class _FrameViews:
+    """
+    Memo of the images derived from one frame
+    """
+
+    def __init__(self, owner: FramePreprocessor, frame: np.ndarray, luma: Optional[np.ndarray]):
+        self.owner = owner
+        self.sources = {"bgr": frame, "luma": luma}
+        # (source, crop, size) -> resized image, (source, crop, size, format) -> output
+        self.scaled: Dict[tuple, np.ndarray] = {}
+        self.outputs: Dict[tuple, np.ndarray] = {}
+
+    def _crop(self, source: str, crop: Optional[Crop]) -> np.ndarray:
+        image = self.sources[source]
+        if crop is None:
+            return image
+        x, y, width, height = crop
+        # Clamp to the frame, the frame size may change (rotation) after subscribing
+        frame_height, frame_width = image.shape[:2]
+        x0, y0 = min(max(0, x), frame_width), min(max(0, y), frame_height)
+        x1, y1 = min(max(0, x + width), frame_width), min(max(0, y + height), frame_height)
+        if x0 >= x1 or y0 >= y1:
+            raise ValueError(f"crop {crop} is outside the {frame_width}x{frame_height} frame")
+        return image[y0:y1, x0:x1]
+
+    def _scaled(self, source: str, crop: Optional[Crop], size: Tuple[int, int]) -> np.ndarray:
+        key = (source, crop, size)
+        image = self.scaled.get(key)
+        if image is not None:
+            self.owner.shared += 1
+            return image
+        cropped = self._crop(source, crop)
+        if (cropped.shape[1], cropped.shape[0]) == size:
+            image = cropped
+        else:
+            # Start from the smallest computed image of this crop that is still large enough
+            base = cropped
+            for (other_source, other_crop, other_size), other in self.scaled.items():
+                if (
+                    other_source == source
+                    and other_crop == crop
+                    and other_size[0] >= size[0]
+                    and other_size[1] >= size[1]
+                    and other_size[0] < base.shape[1]
+                ):
+                    base = other
+            interpolation = cv2.INTER_AREA if size[0] < base.shape[1] else cv2.INTER_LINEAR
+            image = cv2.resize(base, size, interpolation=interpolation)
+            self.owner.computed += 1
+        self.scaled[key] = image
+        return image
+
+    def get(self, spec: FrameSpec) -> np.ndarray:
+        source = "luma" if spec.format == "gray" and self.sources["luma"] is not None else "bgr"
+        cropped = self._crop(source, spec.crop)
+        size = spec.output_size(cropped.shape[1], cropped.shape[0])
+        key = (source, spec.crop, size, spec.format)
+        image = self.outputs.get(key)
+        if image is not None:
+            self.owner.shared += 1
+            return image
+        image = self._scaled(source, spec.crop, size)
+        if source == "bgr" and spec.format != "bgr":
+            code = cv2.COLOR_BGR2RGB if spec.format == "rgb" else cv2.COLOR_BGR2GRAY
+            image = cv2.cvtColor(image, code)
+            self.owner.computed += 1
+        if image.flags.writeable:
+            # A read-only view, the decoder frame and cached images stay untouched
+            image = image.view()
+            image.flags.writeable = False
+        self.outputs[key] = image
+        return image
@@ -0,0 +1,392 @@
+"""
+UHID keyboard and mouse backends
+
+HID reports are injected through the scrcpy UHID control messages, so they
+bypass Android's keycode injection path and behave like a real USB device
+(key repeat while a key is held between press and release, modifiers,
+relative pointer).
+
+The mouse is relative and Android applies pointer acceleration to it, so it
+cannot be moved to an absolute screen position; inject touches when a click
+must land on given coordinates.
+"""
+
+import struct
+import threading
+from typing import Dict, Optional, Set
+
+from . import const
+
+# Identifiers reported to Android for the virtual devices
+UHID_VENDOR_ID = 0x18D1
+UHID_PRODUCT_ID_KEYBOARD = 0x0001
+UHID_PRODUCT_ID_MOUSE = 0x0002
+
+UHID_ID_KEYBOARD = 1
+UHID_ID_MOUSE = 2
+
+# Boot-protocol keyboard: 1 byte modifiers, 1 reserved byte, 6 key slots,
+# plus the LED output report Android uses for caps/num lock state
+KEYBOARD_REPORT_DESC = bytes(
+    [
+        0x05, 0x01,  # Usage Page (Generic Desktop)
+        0x09, 0x06,  # Usage (Keyboard)
+        0xA1, 0x01,  # Collection (Application)
+        0x05, 0x07,  #   Usage Page (Key Codes)
+        0x19, 0xE0,  #   Usage Minimum (224)
+        0x29, 0xE7,  #   Usage Maximum (231)
+        0x15, 0x00,  #   Logical Minimum (0)
+        0x25, 0x01,  #   Logical Maximum (1)
+        0x75, 0x01,  #   Report Size (1)
+        0x95, 0x08,  #   Report Count (8)
+        0x81, 0x02,  #   Input (Data, Variable, Absolute): modifiers
+        0x75, 0x08,  #   Report Size (8)
+        0x95, 0x01,  #   Report Count (1)
+        0x81, 0x01,  #   Input (Constant): reserved byte
+        0x05, 0x08,  #   Usage Page (LEDs)
+        0x19, 0x01,  #   Usage Minimum (1)
+        0x29, 0x05,  #   Usage Maximum (5)
+        0x75, 0x01,  #   Report Size (1)
+        0x95, 0x05,  #   Report Count (5)
+        0x91, 0x02,  #   Output (Data, Variable, Absolute): LEDs
+        0x75, 0x03,  #   Report Size (3)
+        0x95, 0x01,  #   Report Count (1)
+        0x91, 0x01,  #   Output (Constant): LED padding
+        0x05, 0x07,  #   Usage Page (Key Codes)
+        0x19, 0x00,  #   Usage Minimum (0)
+        0x29, 0x65,  #   Usage Maximum (101)
+        0x15, 0x00,  #   Logical Minimum (0)
+        0x25, 0x65,  #   Logical Maximum (101)
+        0x75, 0x08,  #   Report Size (8)
+        0x95, 0x06,  #   Report Count (6)
+        0x81, 0x00,  #   Input (Data, Array): key slots
+        0xC0,  # End Collection
+    ]
+)
+
+# Relative mouse: 5 buttons, X, Y and vertical wheel
+MOUSE_REPORT_DESC = bytes(
+    [
+        0x05, 0x01,  # Usage Page (Generic Desktop)
+        0x09, 0x02,  # Usage (Mouse)
+        0xA1, 0x01,  # Collection (Application)
+        0x09, 0x01,  #   Usage (Pointer)
+        0xA1, 0x00,  #   Collection (Physical)
+        0x05, 0x09,  #     Usage Page (Buttons)
+        0x19, 0x01,  #     Usage Minimum (1)
+        0x29, 0x05,  #     Usage Maximum (5)
+        0x15, 0x00,  #     Logical Minimum (0)
+        0x25, 0x01,  #     Logical Maximum (1)
+        0x95, 0x05,  #     Report Count (5)
+        0x75, 0x01,  #     Report Size (1)
+        0x81, 0x02,  #     Input (Data, Variable, Absolute): buttons
+        0x95, 0x01,  #     Report Count (1)
+        0x75, 0x03,  #     Report Size (3)
+        0x81, 0x01,  #     Input (Constant): padding
+        0x05, 0x01,  #     Usage Page (Generic Desktop)
+        0x09, 0x30,  #     Usage (X)
+        0x09, 0x31,  #     Usage (Y)
+        0x09, 0x38,  #     Usage (Wheel)
+        0x15, 0x81,  #     Logical Minimum (-127)
+        0x25, 0x7F,  #     Logical Maximum (127)
+        0x75, 0x08,  #     Report Size (8)
+        0x95, 0x03,  #     Report Count (3)
+        0x81, 0x06,  #     Input (Data, Variable, Relative): X, Y, wheel
+        0xC0,  #   End Collection
+        0xC0,  # End Collection
+    ]
+)
+
+KEYBOARD_MAX_KEYS = 6
+
+# HID modifier bits (byte 0 of the keyboard report)
+HID_MOD_LEFT_CTRL = 0x01
+HID_MOD_LEFT_SHIFT = 0x02
+HID_MOD_LEFT_ALT = 0x04
+HID_MOD_LEFT_GUI = 0x08
+HID_MOD_RIGHT_CTRL = 0x10
+HID_MOD_RIGHT_SHIFT = 0x20
+HID_MOD_RIGHT_ALT = 0x40
+HID_MOD_RIGHT_GUI = 0x80
+
+# HID mouse button bits
+HID_BUTTON_LEFT = 0x01
+HID_BUTTON_RIGHT = 0x02
+HID_BUTTON_MIDDLE = 0x04
+
+# Android keycode -> HID usage (Keyboard/Keypad page 0x07)
+ANDROID_KEYCODE_TO_HID: Dict[int, int] = {
+    **{const.KEYCODE_A + i: 0x04 + i for i in range(26)},
+    **{const.KEYCODE_1 + i: 0x1E + i for i in range(9)},
+    const.KEYCODE_0: 0x27,
+    const.KEYCODE_ENTER: 0x28,
+    const.KEYCODE_ESCAPE: 0x29,
+    const.KEYCODE_DEL: 0x2A,
+    const.KEYCODE_TAB: 0x2B,
+    const.KEYCODE_SPACE: 0x2C,
+    const.KEYCODE_MINUS: 0x2D,
+    const.KEYCODE_EQUALS: 0x2E,
+    const.KEYCODE_LEFT_BRACKET: 0x2F,
+    const.KEYCODE_RIGHT_BRACKET: 0x30,
+    const.KEYCODE_BACKSLASH: 0x31,
+    const.KEYCODE_SEMICOLON: 0x33,
+    const.KEYCODE_APOSTROPHE: 0x34,
+    const.KEYCODE_GRAVE: 0x35,
+    const.KEYCODE_COMMA: 0x36,
+    const.KEYCODE_PERIOD: 0x37,
+    const.KEYCODE_SLASH: 0x38,
+    const.KEYCODE_CAPS_LOCK: 0x39,
+    **{const.KEYCODE_F1 + i: 0x3A + i for i in range(12)},
+    const.KEYCODE_SYSRQ: 0x46,
+    const.KEYCODE_SCROLL_LOCK: 0x47,
+    const.KEYCODE_BREAK: 0x48,
+    const.KEYCODE_INSERT: 0x49,
+    const.KEYCODE_MOVE_HOME: 0x4A,
+    const.KEYCODE_PAGE_UP: 0x4B,
+    const.KEYCODE_FORWARD_DEL: 0x4C,
+    const.KEYCODE_MOVE_END: 0x4D,
+    const.KEYCODE_PAGE_DOWN: 0x4E,
+    const.KEYCODE_DPAD_RIGHT: 0x4F,
+    const.KEYCODE_DPAD_LEFT: 0x50,
+    const.KEYCODE_DPAD_DOWN: 0x51,
+    const.KEYCODE_DPAD_UP: 0x52,
+    const.KEYCODE_NUM_LOCK: 0x53,
+    const.KEYCODE_NUMPAD_DIVIDE: 0x54,
+    const.KEYCODE_NUMPAD_MULTIPLY: 0x55,
+    const.KEYCODE_NUMPAD_SUBTRACT: 0x56,
+    const.KEYCODE_NUMPAD_ADD: 0x57,
+    const.KEYCODE_NUMPAD_ENTER: 0x58,
+    **{const.KEYCODE_NUMPAD_1 + i: 0x59 + i for i in range(9)},
+    const.KEYCODE_NUMPAD_0: 0x62,
+    const.KEYCODE_NUMPAD_DOT: 0x63,
+    const.KEYCODE_MENU: 0x65,
+    const.KEYCODE_CTRL_LEFT: 0xE0,
+    const.KEYCODE_SHIFT_LEFT: 0xE1,
+    const.KEYCODE_ALT_LEFT: 0xE2,
+    const.KEYCODE_META_LEFT: 0xE3,
+    const.KEYCODE_CTRL_RIGHT: 0xE4,
+    const.KEYCODE_SHIFT_RIGHT: 0xE5,
+    const.KEYCODE_ALT_RIGHT: 0xE6,
+    const.KEYCODE_META_RIGHT: 0xE7,
+}
+
+
+def android_keycode_to_hid(keycode: int) -> Optional[int]:
+    """
+    Convert an Android keycode to a HID keyboard usage
+
+    Args:
+        keycode: const.KEYCODE_*
+
+    Returns:
+        HID usage id, or None if the key has no HID equivalent
+    """
+    return ANDROID_KEYCODE_TO_HID.get(keycode)
+
+
+def modifier_bits(
+    shift: bool = False, ctrl: bool = False, alt: bool = False, meta: bool = False
+) -> int:
+    """
+    Build the modifier byte from modifier flags (left-hand keys)
+    """
+    bits = 0
+    if ctrl:
+        bits |= HID_MOD_LEFT_CTRL
+    if shift:
+        bits |= HID_MOD_LEFT_SHIFT
+    if alt:
+        bits |= HID_MOD_LEFT_ALT
+    if meta:
+        bits |= HID_MOD_LEFT_GUI
+    return bits
+
+
+class UhidKeyboard:
+    def __init__(self, control, id: int = UHID_ID_KEYBOARD, name: str = "scrcpy-keyboard"):
+        """
+        Virtual HID keyboard backed by a UHID device on Android
+
+        Args:
+            control: ControlSender of a started client
+            id: UHID device id, unique per client
+            name: device name shown by Android
+        """
+        self.control = control
+        self.id = id
+        self.name = name
+        self.opened = False
+        self.lock = threading.Lock()
+        self.modifiers = 0
+        self.pressed: Set[int] = set()
+
+    def open(self) -> None:
+        """
+        Create the UHID device on the Android side
+        """
+        if not self.opened:
+            self.control.uhid_create(
+                self.id, UHID_VENDOR_ID, UHID_PRODUCT_ID_KEYBOARD, self.name, KEYBOARD_REPORT_DESC
+            )
+            self.opened = True
+
+    def close(self) -> None:
+        """
+        Release all keys and destroy the UHID device
+        """
+        if self.opened:
+            with self.lock:
+                self.modifiers = 0
+                self.pressed.clear()
+            self.control.uhid_destroy(self.id)
+            self.opened = False
+
+    def _report(self) -> bytes:
+        keys = sorted(self.pressed)[:KEYBOARD_MAX_KEYS]
+        keys += [0] * (KEYBOARD_MAX_KEYS - len(keys))
+        return struct.pack(">BB6B", self.modifiers, 0, *keys)
+
+    def _send(self) -> None:
+        self.control.uhid_input(self.id, self._report())
+
+    def press(self, usage: int, modifiers: Optional[int] = None) -> None:
+        """
+        Press and hold a key, Android handles key repeat while held
+
+        Args:
+            usage: HID usage id
+            modifiers: modifier byte to apply, keep current state if None
+        """
+        with self.lock:
+            if modifiers is not None:
+                self.modifiers = modifiers
+            if 0xE0 <= usage <= 0xE7:
+                self.modifiers |= 1 << (usage - 0xE0)
+            else:
+                self.pressed.add(usage)
+            self._send()
+
+    def release(self, usage: int, modifiers: Optional[int] = None) -> None:
+        """
+        Release a held key
+
+        Args:
+            usage: HID usage id
+            modifiers: modifier byte to apply, keep current state if None
+        """
+        with self.lock:
+            if modifiers is not None:
+                self.modifiers = modifiers
+            if 0xE0 <= usage <= 0xE7:
+                self.modifiers &= ~(1 << (usage - 0xE0))
+            else:
+                self.pressed.discard(usage)
+            self._send()
+
+    def tap(self, usage: int, modifiers: int = 0) -> None:
+        """
+        Press and release a key with the given modifiers, restoring the previous modifier state
+
+        Args:
+            usage: HID usage id
+            modifiers: modifier byte held during the tap
+        """
+        with self.lock:
+            previous = self.modifiers
+            self.modifiers = previous | modifiers
+            self.pressed.add(usage)
+            self._send()
+            self.pressed.discard(usage)
+            self._send()
+            if self.modifiers != previous:
+                self.modifiers = previous
+                self._send()
+
+
+class UhidMouse:
+    def __init__(self, control, id: int = UHID_ID_MOUSE, name: str = "scrcpy-mouse"):
+        """
+        Virtual relative HID mouse backed by a UHID device on Android
+
+        Args:
+            control: ControlSender of a started client
+            id: UHID device id, unique per client
+            name: device name shown by Android
+        """
+        self.control = control
+        self.id = id
+        self.name = name
+        self.opened = False
+        self.lock = threading.Lock()
+        self.buttons = 0
+
+    def open(self) -> None:
+        """
+        Create the UHID device on the Android side
+        """
+        if not self.opened:
+            self.control.uhid_create(
+                self.id, UHID_VENDOR_ID, UHID_PRODUCT_ID_MOUSE, self.name, MOUSE_REPORT_DESC
+            )
+            self.opened = True
+
+    def close(self) -> None:
+        """
+        Destroy the UHID device
+        """
+        if self.opened:
+            self.buttons = 0
+            self.control.uhid_destroy(self.id)
+            self.opened = False
+
+    def _send(self, dx: int = 0, dy: int = 0, wheel: int = 0) -> None:
+        self.control.uhid_input(self.id, struct.pack(">Bbbb", self.buttons, dx, dy, wheel))
+
+    def move(self, dx: int, dy: int) -> None:
+        """
+        Move the pointer, large deltas are split into several reports
+
+        Args:
+            dx: horizontal movement
+            dy: vertical movement
+        """
+        dx, dy = int(dx), int(dy)
+        with self.lock:
+            while dx or dy:
+                step_x = max(-127, min(127, dx))
+                step_y = max(-127, min(127, dy))
+                self._send(step_x, step_y)
+                dx -= step_x
+                dy -= step_y
+
+    def press(self, button: int = HID_BUTTON_LEFT) -> None:
+        """
+        Args:
+            button: HID_BUTTON_*
+        """
+        with self.lock:
+            self.buttons |= button
+            self._send()
+
+    def release(self, button: int = HID_BUTTON_LEFT) -> None:
+        """
+        Args:
+            button: HID_BUTTON_*
+        """
+        with self.lock:
+            self.buttons &= ~button
+            self._send()
+
+    def scroll(self, amount: int) -> None:
+        """
+        Scroll the wheel, positive values scroll up
+
+        Args:
+            amount: wheel notches
+        """
+        amount = int(amount)
+        with self.lock:
+            while amount:
+                step = max(-127, min(127, amount))
+                self._send(wheel=step)
+                amount -= step
@@ -0,0 +1,342 @@
+"""截图对比（视觉回归）
+
+对两张BGR截图做向量化比较:
+    - 逐像素容差：通道最大差值超过容差的像素计为差异
+    - 忽略区域：矩形列表或布尔掩码（True表示忽略），如状态栏时钟、电量
+    - SSIM：在逐级缩小的图像金字塔上计算，忽略区域不参与平均
+    - 分块汇总：按固定网格统计每块的差异像素比例
+    - 差异热力图：缩小后的JPEG，差异强度以伪彩色叠加在实际截图上
+
+批量对比（进程池并行，进程间只传递路径和统计结果）:
+    python screenshot_diff.py actual_dir/ golden_dir/ --out diffs/ --tolerance 8
+    python screenshot_diff.py actual.png golden.png --ignore 0,0,1080,80
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from screenshot_service import decode_screenshot
+
+Region = Tuple[int, int, int, int]
+IgnoreSpec = Union[None, np.ndarray, Sequence[Region]]
+
+# SSIM 常数（8位图像）
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".qoi")
+
+
+class DiffResult:
+    """一对截图的对比结果"""
+
+    def __init__(self, width: int, height: int, changed_pixels: int, compared_pixels: int, max_diff: int,
+                 mean_diff: float, ssim_levels: List[float], tiles: np.ndarray, tile_size: int,
+                 diff: Optional[np.ndarray] = None, size_mismatch: bool = False):
+        self.width = width
+        self.height = height
+        self.changed_pixels = changed_pixels
+        self.compared_pixels = compared_pixels
+        self.max_diff = max_diff
+        self.mean_diff = mean_diff
+        # 金字塔各级的SSIM，第0级为原尺寸
+        self.ssim_levels = ssim_levels
+        # 每块的差异像素比例 (行, 列)
+        self.tiles = tiles
+        self.tile_size = tile_size
+        # 逐像素差异强度（忽略区域为0），生成热力图用，批量对比时不跨进程传递
+        self.diff = diff
+        self.size_mismatch = size_mismatch
+
+    @property
+    def changed_ratio(self) -> float:
+        return self.changed_pixels / self.compared_pixels if self.compared_pixels else 0.0
+
+    @property
+    def ssim(self) -> float:
+        """各级SSIM的平均值"""
+        return float(np.mean(self.ssim_levels)) if self.ssim_levels else 0.0
+
+    def changed_tiles(self, min_ratio: float = 0.0) -> List[Tuple[int, int, float]]:
+        """差异比例超过 min_ratio 的分块 (行, 列, 比例)，按比例降序"""
+        rows, cols = np.nonzero(self.tiles > min_ratio)
+        tiles = [(int(r), int(c), float(self.tiles[r, c])) for r, c in zip(rows, cols)]
+        return sorted(tiles, key=lambda t: -t[2])
+
+    def passed(self, max_changed_ratio: float = 0.0, min_ssim: float = 0.0) -> bool:
+        return not self.size_mismatch and self.changed_ratio <= max_changed_ratio and self.ssim >= min_ssim
+
+    def summary(self) -> dict:
+        return {
+            "width": self.width,
+            "height": self.height,
+            "size_mismatch": self.size_mismatch,
+            "changed_pixels": self.changed_pixels,
+            "changed_ratio": self.changed_ratio,
+            "max_diff": self.max_diff,
+            "mean_diff": self.mean_diff,
+            "ssim": self.ssim,
+            "ssim_levels": self.ssim_levels,
+            "changed_tiles": len(self.changed_tiles()),
+            "worst_tiles": self.changed_tiles()[:5],
+        }
+
+
+def ignore_mask(ignore: IgnoreSpec, width: int, height: int) -> Optional[np.ndarray]:
+    """把忽略区域统一为 (高, 宽) 布尔掩码，True表示忽略"""
+    if ignore is None:
+        return None
+    if isinstance(ignore, np.ndarray):
+        if ignore.shape[:2] != (height, width):
+            raise ValueError(f"忽略掩码尺寸 {ignore.shape[:2]} 与截图 {(height, width)} 不一致")
+        return ignore.astype(bool) if ignore.ndim == 2 else ignore.any(axis=2)
+    mask = np.zeros((height, width), dtype=bool)
+    for x, y, w, h in ignore:
+        mask[max(y, 0):max(y + h, 0), max(x, 0):max(x + w, 0)] = True
+    return mask
+
+
+def ssim_pyramid(actual: np.ndarray, expected: np.ndarray, levels: int = 3,
+                 mask: Optional[np.ndarray] = None) -> List[float]:
+    """在逐级缩小（pyrDown）的灰度金字塔上计算SSIM（11x11高斯窗口）
+
+    Args:
+        mask: 忽略区域，True的像素不参与平均
+    """
+    a = cv2.cvtColor(actual, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    b = cv2.cvtColor(expected, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    valid = None if mask is None else (~mask).astype(np.float32)
+    results = []
+    for level in range(levels):
+        if level:
+            a, b = cv2.pyrDown(a), cv2.pyrDown(b)
+            if valid is not None:
+                valid = cv2.resize(valid, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_AREA)
+        if min(a.shape) < 11:
+            break
+        results.append(_ssim(a, b, valid))
+    return results
+
+
+def _ssim(a: np.ndarray, b: np.ndarray, valid: Optional[np.ndarray]) -> float:
+    # 全部使用OpenCV逐元素运算，避免NumPy为每一步分配临时数组
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    mu_aa, mu_bb, mu_ab = cv2.multiply(mu_a, mu_a), cv2.multiply(mu_b, mu_b), cv2.multiply(mu_a, mu_b)
+    sigma_a = cv2.subtract(blur(cv2.multiply(a, a)), mu_aa)
+    sigma_b = cv2.subtract(blur(cv2.multiply(b, b)), mu_bb)
+    sigma_ab = cv2.subtract(blur(cv2.multiply(a, b)), mu_ab)
+    numerator = cv2.multiply(cv2.add(cv2.multiply(mu_ab, 2.0), SSIM_C1),
+                             cv2.add(cv2.multiply(sigma_ab, 2.0), SSIM_C2))
+    denominator = cv2.multiply(cv2.add(cv2.add(mu_aa, mu_bb), SSIM_C1),
+                               cv2.add(cv2.add(sigma_a, sigma_b), SSIM_C2))
+    ssim_map = cv2.divide(numerator, denominator)
+    if valid is None:
+        return float(ssim_map.mean())
+    weight = valid > 0.5
+    return float(ssim_map[weight].mean()) if weight.any() else 1.0
+
+
+def tile_ratios(changed: np.ndarray, tile_size: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """每块差异像素占该块参与比较像素的比例"""
+    height, width = changed.shape
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+
+    def tile_sum(values: np.ndarray) -> np.ndarray:
+        padded = np.zeros((rows * tile_size, cols * tile_size), dtype=np.int32)
+        padded[:height, :width] = values
+        return padded.reshape(rows, tile_size, cols, tile_size).sum(axis=(1, 3))
+
+    counts = tile_sum(changed)
+    compared = tile_sum(np.ones_like(changed) if mask is None else ~mask)
+    return np.divide(counts, compared, out=np.zeros(counts.shape, dtype=np.float64), where=compared > 0)
+
+
+def diff_images(actual: np.ndarray, expected: np.ndarray, tolerance: int = 0, ignore: IgnoreSpec = None,
+                ssim_levels: int = 3, tile_size: int = 32, keep_diff: bool = True) -> DiffResult:
+    """比较两张BGR截图
+
+    Args:
+        actual: 实际截图
+        expected: 基准截图
+        tolerance: 逐像素容差，通道最大差值超过该值才计为差异
+        ignore: 忽略区域，(x, y, w, h) 列表或布尔掩码
+        ssim_levels: SSIM金字塔级数，0表示不计算
+        tile_size: 分块汇总的块边长
+        keep_diff: 保留逐像素差异强度用于生成热力图
+    """
+    height, width = expected.shape[:2]
+    if actual.shape != expected.shape:
+        # 尺寸不一致（如旋转或分辨率不同），缩放后仍给出比较结果，但标记为不通过
+        actual = cv2.resize(actual, (width, height), interpolation=cv2.INTER_AREA)
+        size_mismatch = True
+    else:
+        size_mismatch = False
+
+    # 按通道取最大差值（cv2.max 比 ndarray.max(axis=2) 快一个数量级）
+    channels = cv2.split(cv2.absdiff(actual, expected))
+    diff = channels[0]
+    for channel in channels[1:]:
+        diff = cv2.max(diff, channel)
+    mask = ignore_mask(ignore, width, height)
+    if mask is not None:
+        diff[mask] = 0
+    changed = diff > tolerance
+    compared = width * height - (int(mask.sum()) if mask is not None else 0)
+    changed_pixels = int(np.count_nonzero(changed))
+    mean_diff = float(diff.sum()) / compared if compared else 0.0
+
+    return DiffResult(
+        width, height, changed_pixels, compared, int(diff.max()), mean_diff,
+        ssim_pyramid(actual, expected, ssim_levels, mask) if ssim_levels else [],
+        tile_ratios(changed, tile_size, mask), tile_size,
+        diff if keep_diff else None, size_mismatch,
+    )
+
+
+def diff_heatmap(actual: np.ndarray, result: DiffResult, max_width: int = 360,
+                 tolerance: int = 0) -> np.ndarray:
+    """差异热力图：缩小后的实际截图（灰度）上叠加伪彩色差异强度，未超过容差的像素不着色"""
+    scale = min(1.0, max_width / result.width)
+    size = (max(1, round(result.width * scale)), max(1, round(result.height * scale)))
+    if actual.shape[:2] != (result.height, result.width):
+        actual = cv2.resize(actual, (result.width, result.height), interpolation=cv2.INTER_AREA)
+    base = cv2.cvtColor(cv2.cvtColor(cv2.resize(actual, size, interpolation=cv2.INTER_AREA),
+                                     cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+    diff = result.diff if result.diff is not None else np.zeros((result.height, result.width), np.uint8)
+    diff = np.where(diff > tolerance, diff, 0).astype(np.uint8)
+    # 区域最大值缩小，细小差异在热力图中不会消失
+    small = cv2.dilate(diff, np.ones((max(1, round(1 / scale)),) * 2, np.uint8))
+    small = cv2.resize(small, size, interpolation=cv2.INTER_NEAREST)
+    strength = cv2.normalize(small, None, 64, 255, cv2.NORM_MINMAX) if small.any() else small
+    color = cv2.applyColorMap(strength, cv2.COLORMAP_JET)
+    hit = small > 0
+    base = (base * 0.5).astype(np.uint8)
+    base[hit] = color[hit]
+    return base
+
+
+def write_heatmap(path: str, actual: np.ndarray, result: DiffResult, max_width: int = 360,
+                  tolerance: int = 0, quality: int = 80) -> str:
+    """把差异热力图写为紧凑的JPEG"""
+    heatmap = diff_heatmap(actual, result, max_width, tolerance)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    cv2.imwrite(path, heatmap, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return path
+
+
+def _diff_pair(task: tuple) -> dict:
+    """进程池任务：读取、比较、写热力图，只返回统计结果"""
+    actual_path, expected_path, heatmap_path, options = task
+    try:
+        actual = decode_screenshot(actual_path)
+        expected = decode_screenshot(expected_path)
+        result = diff_images(actual, expected, options.get("tolerance", 0), options.get("ignore"),
+                             options.get("ssim_levels", 3), options.get("tile_size", 32),
+                             keep_diff=heatmap_path is not None)
+        summary = result.summary()
+        summary["passed"] = result.passed(options.get("max_changed_ratio", 0.0), options.get("min_ssim", 0.0))
+        if heatmap_path and summary["changed_pixels"]:
+            summary["heatmap"] = write_heatmap(heatmap_path, actual, result,
+                                               tolerance=options.get("tolerance", 0))
+    except Exception as e:
+        summary = {"passed": False, "error": str(e)}
+    summary["actual"] = actual_path
+    summary["expected"] = expected_path
+    return summary
+
+
+def diff_batch(pairs: Iterable[Tuple[str, str]], heatmap_dir: Optional[str] = None,
+               workers: Optional[int] = None, chunksize: int = 8, **options) -> List[dict]:
+    """用进程池批量比较截图对
+
+    Args:
+        pairs: (实际截图路径, 基准截图路径)
+        heatmap_dir: 热力图输出目录，None表示不生成；只为有差异的截图对生成
+        workers: 进程数，默认CPU核数
+        chunksize: 每次分发给一个进程的任务数
+        **options: tolerance, ignore, ssim_levels, tile_size, max_changed_ratio, min_ssim
+
+    Returns:
+        与输入顺序一致的统计结果列表
+    """
+    tasks = []
+    for actual_path, expected_path in pairs:
+        heatmap_path = None
+        if heatmap_dir:
+            name = os.path.splitext(os.path.basename(actual_path))[0]
+            heatmap_path = os.path.join(heatmap_dir, f"{name}.diff.jpg")
+        tasks.append((actual_path, expected_path, heatmap_path, options))
+    if len(tasks) <= 1 or workers == 1:
+        return [_diff_pair(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_diff_pair, tasks, chunksize=chunksize))
+
+
+def match_pairs(actual: str, expected: str) -> List[Tuple[str, str]]:
+    """目录对按相同文件名（不含扩展名）配对，文件对直接返回"""
+    if not os.path.isdir(actual):
+        return [(actual, expected)]
+    golden = {os.path.splitext(name)[0]: os.path.join(expected, name)
+              for name in os.listdir(expected) if name.lower().endswith(IMAGE_EXTENSIONS)}
+    pairs = []
+    for name in sorted(os.listdir(actual)):
+        stem = os.path.splitext(name)[0]
+        if name.lower().endswith(IMAGE_EXTENSIONS) and stem in golden:
+            pairs.append((os.path.join(actual, name), golden[stem]))
+    return pairs
+
+
+def _parse_region(text: str) -> Region:
+    x, y, w, h = (int(v) for v in text.split(","))
+    return x, y, w, h
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量比较截图与基准截图")
+    parser.add_argument("actual", help="实际截图文件或目录")
+    parser.add_argument("expected", help="基准截图文件或目录（按文件名配对）")
+    parser.add_argument("--out", default=None, help="差异热力图输出目录")
+    parser.add_argument("--tolerance", type=int, default=0, help="逐像素容差（0-255）")
+    parser.add_argument("--ignore", type=_parse_region, action="append", default=None,
+                        help="忽略区域 x,y,w,h，可重复指定")
+    parser.add_argument("--ssim-levels", type=int, default=3, help="SSIM金字塔级数，0表示不计算")
+    parser.add_argument("--tile-size", type=int, default=32)
+    parser.add_argument("--max-changed-ratio", type=float, default=0.0, help="允许的差异像素比例")
+    parser.add_argument("--min-ssim", type=float, default=0.0, help="要求的最低SSIM")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认CPU核数")
+    parser.add_argument("--json", default=None, help="把全部结果写入JSON文件")
+    args = parser.parse_args()
+
+    pairs = match_pairs(args.actual, args.expected)
+    if not pairs:
+        print(f"没有找到可配对的截图: {args.actual} / {args.expected}")
+        sys.exit(1)
+    results = diff_batch(pairs, args.out, args.workers, tolerance=args.tolerance, ignore=args.ignore,
+                         ssim_levels=args.ssim_levels, tile_size=args.tile_size,
+                         max_changed_ratio=args.max_changed_ratio, min_ssim=args.min_ssim)
+
+    failed = [r for r in results if not r["passed"]]
+    for r in failed:
+        if "error" in r:
+            print(f"❌ {r['actual']}: {r['error']}")
+        else:
+            print(f"❌ {r['actual']}: 差异 {r['changed_ratio']:.3%}, SSIM {r['ssim']:.4f}, "
+                  f"差异分块 {r['changed_tiles']}" + (f", 热力图 {r['heatmap']}" if r.get("heatmap") else ""))
+    print(f"共 {len(results)} 对，通过 {len(results) - len(failed)}，失败 {len(failed)}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""异步截图服务
+
+按键处理线程只取得当前帧的引用（解码器每帧输出新的数组，引用即快照）并提交任务，
+编码和写盘在线程池中进行，立即返回 Future。即使整排设备同时截图，按键处理也只有
+提交任务的开销。
+
+文件命名: screenshot_[设备ID]_[时间戳].<扩展名>
+
+格式:
+    png     无损（默认）
+    jpeg    有损
+    webp    有损
+    qoi     无损，编码比PNG快得多（需要安装 qoi，未安装时不可用）
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional, Union
+
+import cv2
+import numpy as np
+
+try:
+    import qoi
+except ImportError:
+    qoi = None
+
+
+FORMATS = {
+    "png": ("png", "image/png"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+    "qoi": ("qoi", "image/qoi"),
+}
+
+DEFAULT_OUTPUT_DIR = os.environ.get("SCREENSHOT_DIR", "screenshots")
+
+
+def available_formats() -> list:
+    """当前环境可用的截图格式"""
+    return [name for name in FORMATS if name != "qoi" or qoi is not None]
+
+
+def encode_screenshot(frame: np.ndarray, fmt: str = "png", quality: int = 95, png_compression: int = 3) -> bytes:
+    """编码一帧BGR截图
+
+    Args:
+        frame: BGR帧
+        fmt: png/jpeg/webp/qoi
+        quality: jpeg/webp 质量
+        png_compression: PNG压缩级别（0-9），越低越快
+
+    Returns:
+        编码后的字节
+    """
+    if fmt == "png":
+        ok, buffer = cv2.imencode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, png_compression])
+    elif fmt == "jpeg":
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    elif fmt == "webp":
+        ok, buffer = cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    elif fmt == "qoi":
+        if qoi is None:
+            raise RuntimeError("QOI格式需要安装 qoi 模块")
+        return qoi.encode(np.ascontiguousarray(frame[:, :, ::-1]))
+    else:
+        raise ValueError(f"不支持的截图格式: {fmt}，可用: {', '.join(available_formats())}")
+    if not ok:
+        raise RuntimeError(f"截图编码失败: {fmt}")
+    return buffer.tobytes()
+
+
+def decode_screenshot(path: str) -> np.ndarray:
+    """读取截图文件为BGR帧"""
+    if path.endswith(".qoi"):
+        if qoi is None:
+            raise RuntimeError("QOI格式需要安装 qoi 模块")
+        return cv2.cvtColor(qoi.read(path), cv2.COLOR_RGB2BGR)
+    frame = cv2.imread(path, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise RuntimeError(f"无法解码截图: {path}")
+    return frame
+
+
+def screenshot_filename(device_id: str, timestamp: datetime, fmt: str = "png") -> str:
+    """screenshot_[设备ID]_[时间戳].<扩展名>，设备ID中的 ':' 等字符替换为 '_'"""
+    safe_id = re.sub(r"[^0-9A-Za-z._-]", "_", device_id)
+    extension = FORMATS[fmt][0]
+    return f"screenshot_{safe_id}_{timestamp.strftime('%Y%m%d_%H%M%S_%f')[:-3]}.{extension}"
+
+
+class ScreenshotResult:
+    """一次截图的结果"""
+
+    def __init__(self, device_id: str, timestamp: datetime, fmt: str, data: bytes,
+                 frame: np.ndarray, path: Optional[str], encode_ms: float):
+        self.device_id = device_id
+        self.timestamp = timestamp
+        self.format = fmt
+        self.mime = FORMATS[fmt][1]
+        self.data = data
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        self.path = path
+        self.encode_ms = encode_ms
+        # 截图历史中的条目（近似重复时为已有条目），未启用存储或未保存时为None
+        self.entry = None
+
+
+class ScreenshotService:
+    """截图编码与保存线程池"""
+
+    def __init__(self, output_dir: str = DEFAULT_OUTPUT_DIR, fmt: str = "png", quality: int = 95,
+                 max_workers: Optional[int] = None, store=None):
+        """
+        Args:
+            output_dir: 截图保存目录，不存在时自动创建
+            store: 截图历史存储（ScreenshotStore），保存的截图同时加入历史
+            fmt: 默认截图格式 png/jpeg/webp/qoi
+            quality: jpeg/webp 质量
+            max_workers: 编码线程数，默认按CPU核数（OpenCV编码时释放GIL，可以并行）
+        """
+        if fmt not in available_formats():
+            raise ValueError(f"不支持的截图格式: {fmt}，可用: {', '.join(available_formats())}")
+        self.output_dir = output_dir
+        self.format = fmt
+        self.quality = quality
+        self.store = store
+        max_workers = max_workers or min(8, os.cpu_count() or 2)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screenshot")
+        self.lock = threading.Lock()
+        # 预先启动工作线程，首次截图时按键处理不需要创建线程
+        for _ in range(max_workers):
+            self.executor.submit(time.sleep, 0.01)
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.encode_ms_total = 0.0
+
+    def capture(self, device_id: str, frame: Union[np.ndarray, Callable[[], np.ndarray]], fmt: Optional[str] = None,
+                save: bool = True, timestamp: Optional[datetime] = None) -> "Future[ScreenshotResult]":
+        """提交一帧截图（调用方线程只记录时间戳和帧引用）
+
+        Args:
+            device_id: 设备序列号，用于文件名
+            frame: 解码后的BGR帧，调用方之后不得原地修改；也可以是在工作线程中生成帧的函数
+            fmt: 截图格式，默认使用服务的格式
+            save: 是否写入磁盘
+            timestamp: 截图时刻（用于文件名），默认为当前时间
+
+        Returns:
+            完成时得到 ScreenshotResult 的 Future
+        """
+        timestamp = timestamp or datetime.now()
+        with self.lock:
+            self.submitted += 1
+        return self.executor.submit(self._process, device_id, frame, timestamp, fmt or self.format, save)
+
+    def capture_all(self, frames: Dict[str, np.ndarray], fmt: Optional[str] = None,
+                    save: bool = True) -> Dict[str, "Future[ScreenshotResult]"]:
+        """同时截取多台设备
+
+        Args:
+            frames: {设备序列号: 帧}
+
+        Returns:
+            {设备序列号: Future}
+        """
+        return {device_id: self.capture(device_id, frame, fmt, save) for device_id, frame in frames.items()}
+
+    def _process(self, device_id: str, frame, timestamp: datetime, fmt: str,
+                 save: bool) -> ScreenshotResult:
+        try:
+            if callable(frame):
+                frame = frame()
+            start = time.perf_counter()
+            data = encode_screenshot(frame, fmt, self.quality)
+            encode_ms = (time.perf_counter() - start) * 1000
+            path = self._write(device_id, timestamp, fmt, data) if save else None
+            entry = None
+            if path and self.store is not None:
+                entry = self.store.add(device_id, frame, data, FORMATS[fmt][0], timestamp, source_path=path)
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            print(f"❌ 截图失败 {device_id}: {e}")
+            raise
+        with self.lock:
+            self.completed += 1
+            self.encode_ms_total += encode_ms
+            if path:
+                self.bytes_written += len(data)
+        result = ScreenshotResult(device_id, timestamp, fmt, data, frame, path, encode_ms)
+        result.entry = entry
+        return result
+
+    def _write(self, device_id: str, timestamp: datetime, fmt: str, data: bytes) -> str:
+        """先写临时文件再重命名，其他程序不会读到写了一半的截图"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, screenshot_filename(device_id, timestamp, fmt))
+        temp_path = path + ".part"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return path
+
+    def get_stats(self) -> dict:
+        """获取截图统计信息"""
+        with self.lock:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "pending": self.submitted - self.completed - self.failed,
+                "bytes_written": self.bytes_written,
+                "avg_encode_ms": self.encode_ms_total / self.completed if self.completed else 0.0,
+            }
+
+    def close(self, wait: bool = True):
+        """等待已提交的截图完成后关闭线程池"""
+        self.executor.shutdown(wait=wait)
+
+
+_service: Optional[ScreenshotService] = None
+_service_lock = threading.Lock()
+
+
+def get_screenshot_service() -> ScreenshotService:
+    """获取进程内共享的截图服务（首次调用时创建）"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            from screenshot_store import ScreenshotStore
+            _service = ScreenshotService(store=ScreenshotStore(os.path.join(DEFAULT_OUTPUT_DIR, "store")))
+        return _service
@@ -0,0 +1,310 @@
+"""截图历史存储
+
+    objects/<哈希前两位>/<内容哈希>.<扩展名>   按内容哈希命名的截图文件，相同内容只存一份
+    thumbs/<内容哈希>.jpg                   缩略图，首次访问时生成
+    index.jsonl                             追加写入的索引，启动时加载
+
+内容完全相同的截图只保留一个条目，之后的出现只记录时间；截图服务已写入的同内容文件
+改为指向该对象的硬链接，重复截图不再额外占用磁盘。每张截图还计算64位感知哈希（dHash），
+与同一设备、同一分辨率已有截图的汉明距离不超过阈值时视为近似重复，但仍保存为独立条目
+（有自己的内容对象），只通过 similar_to 链接到最接近的已有条目。解码后的预览图放在按字节
+预算淘汰的LRU缓存中，长时间运行保存上千张截图也不会持续占用内存。
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from screenshot_service import decode_screenshot
+
+
+def perceptual_hash(frame: np.ndarray) -> int:
+    """64位差值哈希（dHash）：缩小为9x8灰度图，比较水平相邻像素的亮度"""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class StoreEntry:
+    """存储中的一张截图"""
+
+    def __init__(self, entry_id: str, device_id: str, timestamp: str, phash: int, path: str,
+                 fmt: str, width: int, height: int, size: int, seen: Optional[List[dict]] = None,
+                 similar_to: Optional[str] = None):
+        self.id = entry_id
+        self.device_id = device_id
+        self.timestamp = timestamp
+        self.phash = phash
+        self.path = path
+        self.format = fmt
+        self.width = width
+        self.height = height
+        self.size = size
+        # 重复截图的出现记录 {"device_id", "timestamp"}
+        self.seen = seen or []
+        # 保存时最接近的近似重复条目ID
+        self.similar_to = similar_to
+
+    def to_json(self) -> dict:
+        data = {
+            "id": self.id, "device_id": self.device_id, "timestamp": self.timestamp,
+            "phash": f"{self.phash:016x}", "path": self.path, "format": self.format,
+            "width": self.width, "height": self.height, "size": self.size,
+        }
+        if self.similar_to:
+            data["similar_to"] = self.similar_to
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict) -> "StoreEntry":
+        return cls(data["id"], data["device_id"], data["timestamp"], int(data["phash"], 16), data["path"],
+                   data["format"], data["width"], data["height"], data["size"],
+                   similar_to=data.get("similar_to"))
+
+
+class ScreenshotStore:
+    """按内容寻址去重、按感知哈希链接近似截图的历史"""
+
+    def __init__(self, root: str, similar_distance: int = 4, preview_budget: int = 64 * 1024 * 1024,
+                 thumb_width: int = 160):
+        """
+        Args:
+            root: 存储目录
+            similar_distance: 感知哈希汉明距离不超过该值时记录为近似重复（similar_to），负数表示不查找
+            preview_budget: 解码预览图LRU缓存的内存预算（字节）
+            thumb_width: 缩略图宽度
+        """
+        self.root = root
+        self.similar_distance = similar_distance
+        self.preview_budget = preview_budget
+        self.thumb_width = thumb_width
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, StoreEntry]" = OrderedDict()
+        # 按 (设备, 宽, 高) 分组的感知哈希数组与条目ID按相同顺序排列，去重时向量化计算汉明距离
+        self.hashes: Dict[tuple, np.ndarray] = {}
+        self.hash_ids: Dict[tuple, List[str]] = {}
+        self.previews: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.preview_bytes = 0
+
+        # 统计信息
+        self.added = 0
+        self.duplicates = 0
+        self.similar = 0
+        self.preview_hits = 0
+        self.preview_misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "thumbs"), exist_ok=True)
+        self.index_path = os.path.join(root, "index.jsonl")
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "seen" in record:
+                    # 重复截图记录
+                    entry = self.entries.get(record["id"])
+                    if entry is not None:
+                        entry.seen.append(record["seen"])
+                    continue
+                entry = StoreEntry.from_json(record)
+                if os.path.exists(os.path.join(self.root, entry.path)):
+                    self._index(entry)
+
+    def _index(self, entry: StoreEntry):
+        self.entries[entry.id] = entry
+        key = (entry.device_id, entry.width, entry.height)
+        hashes = self.hashes.get(key, np.zeros(0, dtype=np.uint64))
+        self.hashes[key] = np.append(hashes, np.uint64(entry.phash))
+        self.hash_ids.setdefault(key, []).append(entry.id)
+
+    def _append_index(self, record: dict):
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def find_similar(self, device_id: str, size: tuple, phash: int, max_distance: int) -> Optional[StoreEntry]:
+        """查找同一设备、同一分辨率 (宽, 高) 中汉明距离最近且不超过 max_distance 的条目"""
+        with self.lock:
+            return self._find_similar(device_id, size, phash, max_distance)
+
+    def _find_similar(self, device_id: str, size: tuple, phash: int, max_distance: int) -> Optional[StoreEntry]:
+        key = (device_id,) + tuple(size)
+        hashes = self.hashes.get(key)
+        if hashes is None or not len(hashes):
+            return None
+        distances = _popcount(hashes ^ np.uint64(phash))
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return self.entries[self.hash_ids[key][best]]
+
+    def add(self, device_id: str, frame: np.ndarray, data: bytes, fmt: str,
+            timestamp: Optional[datetime] = None, source_path: Optional[str] = None) -> StoreEntry:
+        """保存一张截图，内容完全相同时返回已有条目
+
+        Args:
+            device_id: 设备序列号
+            frame: 截图的BGR帧，用于计算感知哈希
+            data: 编码后的图像
+            fmt: 图像格式（扩展名）
+            timestamp: 截图时刻
+            source_path: 已写入磁盘的同内容文件，可用时以硬链接代替再写一份；
+                内容重复时该文件改为指向已有对象的硬链接
+        """
+        timestamp = (timestamp or datetime.now()).isoformat(timespec="milliseconds")
+        entry_id = hashlib.sha256(data).hexdigest()[:32]
+        path = os.path.join("objects", entry_id[:2], f"{entry_id}.{fmt}")
+        full_path = os.path.join(self.root, path)
+
+        with self.lock:
+            known = entry_id in self.entries
+        if not known:
+            # 对象按内容命名，写入可重复执行，放在锁外；是否新建条目在下面的锁内决定
+            phash = perceptual_hash(frame)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if not os.path.exists(full_path):
+                self._write_object(full_path, data, source_path)
+
+        with self.lock:
+            existing = self.entries.get(entry_id)
+            if existing is None:
+                height, width = frame.shape[:2]
+                similar = None
+                if self.similar_distance >= 0:
+                    similar = self._find_similar(device_id, (width, height), phash, self.similar_distance)
+                entry = StoreEntry(entry_id, device_id, timestamp, phash, path, fmt, width, height, len(data),
+                                   similar_to=similar.id if similar is not None else None)
+                self._index(entry)
+                self.added += 1
+                if similar is not None:
+                    self.similar += 1
+                self._append_index(entry.to_json())
+                return entry
+            seen = {"device_id": device_id, "timestamp": timestamp}
+            existing.seen.append(seen)
+            self.duplicates += 1
+            self._append_index({"id": existing.id, "seen": seen})
+        if source_path:
+            self._relink(source_path, os.path.join(self.root, existing.path))
+        return existing
+
+    @staticmethod
+    def _write_object(path: str, data: bytes, source_path: Optional[str]):
+        if source_path:
+            try:
+                os.link(source_path, path)
+                return
+            except OSError:
+                # 跨文件系统、不支持硬链接或并发写入同一对象时写入副本
+                pass
+        temp_path = f"{path}.{threading.get_ident()}.part"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _relink(source_path: str, object_path: str):
+        """把截图服务写入的重复文件替换为指向已有对象的硬链接，失败时保留原文件"""
+        try:
+            if os.path.samefile(source_path, object_path):
+                return
+            temp_path = f"{source_path}.{threading.get_ident()}.link"
+            os.link(object_path, temp_path)
+            os.replace(temp_path, source_path)
+        except OSError:
+            pass
+
+    def history(self, device_id: Optional[str] = None, limit: Optional[int] = None) -> List[StoreEntry]:
+        """按时间倒序列出条目"""
+        with self.lock:
+            entries = [e for e in reversed(self.entries.values()) if device_id is None or e.device_id == device_id]
+        return entries[:limit] if limit else entries
+
+    def get(self, entry_id: str) -> Optional[StoreEntry]:
+        with self.lock:
+            return self.entries.get(entry_id)
+
+    def file_path(self, entry_id: str) -> str:
+        return os.path.join(self.root, self.entries[entry_id].path)
+
+    def thumbnail(self, entry_id: str) -> bytes:
+        """缩略图JPEG，首次访问时生成并缓存到磁盘"""
+        thumb_path = os.path.join(self.root, "thumbs", f"{entry_id}.jpg")
+        if os.path.exists(thumb_path):
+            with open(thumb_path, "rb") as f:
+                return f.read()
+        frame = self.preview(entry_id)
+        height, width = frame.shape[:2]
+        thumb_height = max(1, round(height * self.thumb_width / width))
+        thumb = cv2.resize(frame, (self.thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        data = buffer.tobytes()
+        temp_path = thumb_path + ".part"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, thumb_path)
+        return data
+
+    def thumbnail_base64(self, entry_id: str) -> str:
+        return base64.b64encode(self.thumbnail(entry_id)).decode("utf-8")
+
+    def preview(self, entry_id: str) -> np.ndarray:
+        """解码后的截图，按LRU保存在内存预算内"""
+        with self.lock:
+            frame = self.previews.get(entry_id)
+            if frame is not None:
+                self.previews.move_to_end(entry_id)
+                self.preview_hits += 1
+                return frame
+            self.preview_misses += 1
+            path = os.path.join(self.root, self.entries[entry_id].path)
+        frame = decode_screenshot(path)
+        with self.lock:
+            if entry_id not in self.previews:
+                self.previews[entry_id] = frame
+                self.preview_bytes += frame.nbytes
+                # 淘汰最久未使用的预览图，至少保留刚解码的一张
+                while self.preview_bytes > self.preview_budget and len(self.previews) > 1:
+                    _, evicted = self.previews.popitem(last=False)
+                    self.preview_bytes -= evicted.nbytes
+                    self.evictions += 1
+        return frame
+
+    def get_stats(self) -> dict:
+        """获取存储统计信息"""
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "added": self.added,
+                "duplicates": self.duplicates,
+                "similar": self.similar,
+                "preview_cached": len(self.previews),
+                "preview_bytes": self.preview_bytes,
+                "preview_hits": self.preview_hits,
+                "preview_misses": self.preview_misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,177 @@
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+# 添加scrcpy模块路径
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scrcpy'))
+import scrcpy.const as const
+
+
+# 惯性滑动(fling)使用独立的触摸ID，避免与鼠标拖拽冲突
+FLING_TOUCH_ID = 0x5C5C5C5C
+
+
+class ScrollEngine:
+    """非阻塞滚动平滑引擎
+
+    UI线程只负责累加滚轮增量并立即返回；后台线程按固定节拍把累计量
+    平滑地拆分成多个滚动事件发送到鼠标所在位置，松开后按惯性逐渐减速。
+    短时间内累计量很大（快速拨动滚轮）时改为发送一次fling手势，
+    由Android自身的惯性物理完成滑动。
+    """
+
+    def __init__(self, control, tick: float = 1 / 60, smoothing: float = 0.35,
+                 inertia: float = 0.85, fling_threshold: float = 600.0,
+                 fling_window: float = 0.15, fling_distance: float = 0.6):
+        """
+        Args:
+            control: ControlSender 实例
+            tick: 发送节拍（秒）
+            smoothing: 每个节拍发送剩余累计量的比例 (0-1]
+            inertia: 惯性系数 [0-1)，0表示松开即停，越大滑行越远
+            fling_threshold: fling_window 内累计量超过该值时转换为fling手势
+            fling_window: 判断快速滚动的时间窗口（秒）
+            fling_distance: fling手势的滑动距离，占屏幕高度/宽度的比例
+        """
+        self.control = control
+        self.tick = tick
+        self.smoothing = smoothing
+        self.inertia = inertia
+        self.fling_threshold = fling_threshold
+        self.fling_window = fling_window
+        self.fling_distance = fling_distance
+
+        self.condition = threading.Condition()
+        self.pending_x = 0.0
+        self.pending_y = 0.0
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+        self.pointer_x = 0
+        self.pointer_y = 0
+        self.burst_start = 0.0
+        self.burst_x = 0.0
+        self.burst_y = 0.0
+        self.fling_requested = False
+        self.running = True
+        self.thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.scroll_events = 0
+        self.fling_gestures = 0
+
+    def set_inertia(self, inertia: float):
+        """设置惯性系数，范围 [0, 0.99]"""
+        self.inertia = max(0.0, min(0.99, inertia))
+
+    def add(self, x: int, y: int, dx: float, dy: float):
+        """累加一次滚轮增量（UI线程调用，不阻塞）
+
+        Args:
+            x, y: 指针位置（设备坐标）
+            dx, dy: 滚动量，与 ControlSender.scroll 的方向一致
+        """
+        if not dx and not dy:
+            return
+        now = time.time()
+        with self.condition:
+            self.pointer_x = int(x)
+            self.pointer_y = int(y)
+            self.pending_x += dx
+            self.pending_y += dy
+
+            # 统计短时间窗口内的累计量，用于识别快速拨动
+            if now - self.burst_start > self.fling_window:
+                self.burst_start = now
+                self.burst_x = 0.0
+                self.burst_y = 0.0
+            self.burst_x += dx
+            self.burst_y += dy
+            if self.fling_threshold and max(abs(self.burst_x), abs(self.burst_y)) > self.fling_threshold:
+                self.fling_requested = True
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _is_idle(self) -> bool:
+        return (abs(self.pending_x) < 0.5 and abs(self.pending_y) < 0.5
+                and abs(self.velocity_x) < 0.5 and abs(self.velocity_y) < 0.5
+                and not self.fling_requested)
+
+    def _run(self):
+        """后台节拍循环"""
+        while True:
+            with self.condition:
+                while self.running and self._is_idle():
+                    self.pending_x = self.pending_y = 0.0
+                    self.velocity_x = self.velocity_y = 0.0
+                    self.condition.wait()
+                if not self.running:
+                    return
+
+                x, y = self.pointer_x, self.pointer_y
+                if self.fling_requested:
+                    fling_x, fling_y = self.pending_x, self.pending_y
+                    self.pending_x = self.pending_y = 0.0
+                    self.velocity_x = self.velocity_y = 0.0
+                    self.burst_x = self.burst_y = 0.0
+                    self.fling_requested = False
+                    step_x = step_y = 0.0
+                else:
+                    fling_x = fling_y = 0.0
+                    # 取剩余累计量的一部分发送，叠加按惯性衰减的速度
+                    step_x = self.pending_x * self.smoothing
+                    step_y = self.pending_y * self.smoothing
+                    self.pending_x -= step_x
+                    self.pending_y -= step_y
+                    self.velocity_x = self.velocity_x * self.inertia + step_x * (1 - self.inertia)
+                    self.velocity_y = self.velocity_y * self.inertia + step_y * (1 - self.inertia)
+                    if abs(self.pending_x) < 0.5 and abs(self.pending_y) < 0.5:
+                        # 累计量已发送完毕，进入惯性滑行
+                        step_x += self.velocity_x * self.inertia
+                        step_y += self.velocity_y * self.inertia
+
+            try:
+                if fling_x or fling_y:
+                    self._fling(x, y, fling_x, fling_y)
+                elif abs(step_x) >= 0.5 or abs(step_y) >= 0.5:
+                    self.control.scroll(x, y, step_x, step_y)
+                    self.scroll_events += 1
+            except Exception as e:
+                print(f"❌ 滚动事件发送失败: {e}")
+            time.sleep(self.tick)
+
+    def _fling(self, x: int, y: int, dx: float, dy: float):
+        """发送一次快速滑动手势，方向与滚动方向一致"""
+        resolution = self.control.parent.resolution or (800, 600)
+        width, height = resolution
+        # 向上滚动（正值）相当于手指向下滑
+        distance_x = (1 if dx > 0 else -1 if dx < 0 else 0) * width * self.fling_distance
+        distance_y = (1 if dy > 0 else -1 if dy < 0 else 0) * height * self.fling_distance
+        start_x = min(max(x - distance_x / 2, 0), width - 1)
+        start_y = min(max(y - distance_y / 2, 0), height - 1)
+        end_x = min(max(start_x + distance_x, 0), width - 1)
+        end_y = min(max(start_y + distance_y, 0), height - 1)
+
+        steps = 6
+        self.control.touch(start_x, start_y, const.ACTION_DOWN, FLING_TOUCH_ID)
+        for i in range(1, steps + 1):
+            time.sleep(self.tick / 2)
+            px = start_x + (end_x - start_x) * i / steps
+            py = start_y + (end_y - start_y) * i / steps
+            self.control.touch(px, py, const.ACTION_MOVE, FLING_TOUCH_ID)
+        self.control.touch(end_x, end_y, const.ACTION_UP, FLING_TOUCH_ID)
+        self.fling_gestures += 1
+
+    def get_stats(self) -> dict:
+        """获取滚动统计信息"""
+        return {"scroll_events": self.scroll_events, "fling_gestures": self.fling_gestures}
+
+    def close(self):
+        """停止后台线程"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
@@ -0,0 +1,132 @@
+import itertools
+import threading
+from typing import Optional
+
+# scrcpy 单条 INJECT_TEXT 消息的最大字节数
+INJECT_TEXT_MAX_LENGTH = 300
+
+
+class TextInputEngine:
+    """文本输入管线
+
+    将短时间窗口内的按键合并为一条 TYPE_INJECT_TEXT 消息发送；
+    超过阈值的长文本（或含非ASCII字符的文本）改用 set_clipboard(paste=True)
+    一次性粘贴，并通过设备回传的序列号 ACK 确认送达。
+    """
+
+    def __init__(self, control, flush_interval: float = 0.03,
+                 paste_threshold: int = 64, ack_timeout: float = 1.0):
+        """
+        Args:
+            control: ControlSender 实例
+            flush_interval: 按键合并窗口（秒）
+            paste_threshold: 超过该字符数时使用剪贴板粘贴
+            ack_timeout: 等待剪贴板 ACK 的超时时间（秒）
+        """
+        self.control = control
+        self.flush_interval = flush_interval
+        self.paste_threshold = paste_threshold
+        self.ack_timeout = ack_timeout
+
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()  # 保证批次按顺序发出
+        self.buffer = []
+        self.flush_timer: Optional[threading.Timer] = None
+        self.sequence = itertools.count(1)
+        self.closed = False
+
+        # 统计信息
+        self.keys_buffered = 0
+        self.text_messages = 0
+        self.paste_messages = 0
+        self.paste_failures = 0
+
+    def feed(self, text: str) -> None:
+        """缓冲一次按键输入，在合并窗口结束后统一发送"""
+        if not text or self.closed:
+            return
+        with self.lock:
+            self.buffer.append(text)
+            self.keys_buffered += 1
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def flush(self) -> None:
+        """立即发送缓冲区中的文本（发送keycode前调用以保证顺序）"""
+        with self.send_lock:
+            with self.lock:
+                if self.flush_timer is not None:
+                    self.flush_timer.cancel()
+                    self.flush_timer = None
+                text = "".join(self.buffer)
+                self.buffer.clear()
+            if text:
+                self._send(text)
+
+    def send_text(self, text: str) -> bool:
+        """直接发送一段文本（脚本或粘贴场景），返回是否确认送达"""
+        self.flush()
+        with self.send_lock:
+            return self._send(text)
+
+    def _send(self, text: str) -> bool:
+        """根据文本长度和内容选择注入方式"""
+        try:
+            if len(text) > self.paste_threshold or not text.isascii():
+                return self._paste(text)
+            for chunk in self._split_text(text):
+                self.control.text(chunk)
+                self.text_messages += 1
+            return True
+        except Exception as e:
+            print(f"文本发送失败: {e}")
+            return False
+
+    def _paste(self, text: str) -> bool:
+        """通过设备剪贴板粘贴文本，并等待带序列号的ACK"""
+        sequence = next(self.sequence)
+        future = self.control.set_clipboard_async(text, paste=True, sequence=sequence)
+        self.paste_messages += 1
+        try:
+            future.result(self.ack_timeout)
+            acked = True
+        except Exception:
+            # 通过接收器撤销，避免待确认表中残留该序列号
+            self.control.parent.receiver.cancel(future)
+            acked = False
+        if not acked:
+            self.paste_failures += 1
+            print(f"剪贴板粘贴未收到确认: sequence={sequence}")
+        return acked
+
+    @staticmethod
+    def _split_text(text: str):
+        """按UTF-8字节上限切分文本，不拆开多字节字符"""
+        chunk = []
+        size = 0
+        for ch in text:
+            ch_size = len(ch.encode("utf-8"))
+            if size + ch_size > INJECT_TEXT_MAX_LENGTH and chunk:
+                yield "".join(chunk)
+                chunk = []
+                size = 0
+            chunk.append(ch)
+            size += ch_size
+        if chunk:
+            yield "".join(chunk)
+
+    def get_stats(self) -> dict:
+        """获取输入统计信息"""
+        return {
+            "keys_buffered": self.keys_buffered,
+            "text_messages": self.text_messages,
+            "paste_messages": self.paste_messages,
+            "paste_failures": self.paste_failures,
+        }
+
+    def close(self) -> None:
+        """发送剩余文本并停止定时器"""
+        self.flush()
+        self.closed = True
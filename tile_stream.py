@@ -0,0 +1,305 @@
+"""分块增量显示（dirty-rect）
+
+帧按固定网格分块，与上一次发送的帧做向量化比较，只编码并发送变化的分块
+（同一行相邻的变化分块合并为一个矩形）。浏览器端的合成页面把矩形绘制到
+画布的对应位置。闪烁的光标、跳动的时钟等场景只需传输很少的数据。
+
+路由（注册在旁路帧服务上）:
+    GET /tiles/<channel>      二进制 WebSocket，每条消息为一次更新
+    GET /tileview/<channel>   画布合成页面
+
+消息格式（大端）:
+    u8  类型（0=完整帧，1=增量）
+    u16 帧宽, u16 帧高, u16 矩形数量
+    每个矩形: u16 x, u16 y, u16 宽, u16 高, u32 长度, 编码后的图像
+"""
+import queue
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from frame_encoder import FrameEncoder, create_encoder
+from frame_server import FrameServer, get_frame_server, websocket_handshake, websocket_send
+
+
+UPDATE_FULL = 0
+UPDATE_DELTA = 1
+
+# 订阅者队列上限，超过时丢弃积压并重新发送完整帧
+SUBSCRIBER_QUEUE_SIZE = 30
+
+TILE_VIEW_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{channel}</title>
+<style>html,body{{margin:0;height:100%;background:#222}}canvas{{width:100%;height:100%;object-fit:contain}}</style>
+</head><body><canvas id="c"></canvas><script>
+const canvas = document.getElementById("c");
+const ctx = canvas.getContext("2d");
+const ws = new WebSocket(`ws://${{location.host}}/tiles/{channel}`);
+ws.binaryType = "arraybuffer";
+let chain = Promise.resolve();
+ws.onmessage = (e) => {{
+  // 按到达顺序合成，后到的矩形覆盖先到的
+  chain = chain.then(() => draw(e.data));
+}};
+async function draw(buffer) {{
+  const view = new DataView(buffer);
+  const width = view.getUint16(1), height = view.getUint16(3), count = view.getUint16(5);
+  if (canvas.width !== width || canvas.height !== height) {{
+    canvas.width = width; canvas.height = height;
+  }}
+  let offset = 7;
+  const rects = [];
+  for (let i = 0; i < count; i++) {{
+    const x = view.getUint16(offset), y = view.getUint16(offset + 2);
+    const length = view.getUint32(offset + 8);
+    const blob = new Blob([new Uint8Array(buffer, offset + 12, length)]);
+    rects.push(createImageBitmap(blob).then((bitmap) => [x, y, bitmap]));
+    offset += 12 + length;
+  }}
+  for (const [x, y, bitmap] of await Promise.all(rects)) {{
+    ctx.drawImage(bitmap, x, y);
+    bitmap.close();
+  }}
+}}
+</script></body></html>
+"""
+
+
+class TileStream:
+    """单个设备的分块增量流"""
+
+    def __init__(self, tile_size: int = 64, encoder: Optional[FrameEncoder] = None,
+                 quality: int = 80, full_refresh_ratio: float = 0.5):
+        """
+        Args:
+            tile_size: 分块边长（像素），建议为8的倍数以对齐JPEG块
+            encoder: 分块编码后端，默认自动选择JPEG后端
+            quality: 编码质量
+            full_refresh_ratio: 变化分块比例超过该值时直接发送完整帧
+        """
+        self.tile_size = tile_size
+        self.encoder = encoder or create_encoder("auto")
+        self.quality = quality
+        self.full_refresh_ratio = full_refresh_ratio
+
+        self.lock = threading.Lock()
+        self.last_frame: Optional[np.ndarray] = None
+        self.subscribers: List[queue.Queue] = []
+        # 设备关闭后置位，推送循环随之退出
+        self.closed = False
+
+        # 统计信息
+        self.frames = 0
+        self.skipped_frames = 0
+        self.tiles_sent = 0
+        self.tiles_total = 0
+        self.bytes_sent = 0
+        self.full_frames = 0
+
+    def changed_tiles(self, frame: np.ndarray, previous: np.ndarray) -> np.ndarray:
+        """向量化比较两帧，返回 (行, 列) 的分块变化掩码"""
+        height, width = frame.shape[:2]
+        tile = self.tile_size
+        rows = -(-height // tile)
+        cols = -(-width // tile)
+        diff = np.any(frame != previous, axis=2)
+        if rows * tile != height or cols * tile != width:
+            padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+            padded[:height, :width] = diff
+            diff = padded
+        return diff.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+    def dirty_rects(self, mask: np.ndarray, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+        """把变化掩码转为矩形列表，同一行相邻的变化分块合并"""
+        tile = self.tile_size
+        rects = []
+        for row, col_start, col_end in _row_runs(mask):
+            x = col_start * tile
+            y = row * tile
+            rects.append((x, y, min(col_end * tile, width) - x, min(y + tile, height) - y))
+        return rects
+
+    def _encode_message(self, update_type: int, frame: np.ndarray,
+                        rects: List[Tuple[int, int, int, int]]) -> bytes:
+        height, width = frame.shape[:2]
+        parts = [struct.pack(">BHHH", update_type, width, height, len(rects))]
+        for x, y, w, h in rects:
+            data = self.encoder.encode(np.ascontiguousarray(frame[y:y + h, x:x + w]), self.quality)
+            parts.append(struct.pack(">HHHHI", x, y, w, h, len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+    def _full_message(self, frame: np.ndarray) -> bytes:
+        height, width = frame.shape[:2]
+        return self._encode_message(UPDATE_FULL, frame, [(0, 0, width, height)])
+
+    def push(self, frame: np.ndarray) -> int:
+        """提交一帧，编码变化的分块并发送给订阅者
+
+        Returns:
+            发送的矩形数量，0表示画面未变化
+        """
+        self.frames += 1
+        # 基准帧替换与订阅者列表在同一锁内取得：之后订阅的查看者从新帧的完整画面开始，
+        # 之前订阅的查看者收到本帧的增量
+        with self.lock:
+            previous = self.last_frame
+            self.last_frame = frame.copy()
+            subscribers = list(self.subscribers)
+        height, width = frame.shape[:2]
+
+        if previous is None or previous.shape != frame.shape:
+            rects = None
+        else:
+            mask = self.changed_tiles(frame, previous)
+            self.tiles_total += mask.size
+            changed = int(mask.sum())
+            if not changed:
+                self.skipped_frames += 1
+                return 0
+            rects = None if changed > mask.size * self.full_refresh_ratio else self.dirty_rects(mask, width, height)
+            self.tiles_sent += changed
+
+        if not subscribers:
+            return 0
+
+        if rects is None:
+            self.full_frames += 1
+            message = self._full_message(frame)
+            count = 1
+        else:
+            message = self._encode_message(UPDATE_DELTA, frame, rects)
+            count = len(rects)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                self._resync(subscriber)
+        return count
+
+    def _resync(self, subscriber: queue.Queue):
+        """订阅者积压过多：清空队列并发送当前完整帧"""
+        while not subscriber.empty():
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        self._send_full(subscriber)
+
+    def _send_full(self, subscriber: queue.Queue):
+        with self.lock:
+            frame = self.last_frame
+        if frame is not None:
+            subscriber.put_nowait(self._full_message(frame))
+
+    def subscribe(self) -> queue.Queue:
+        subscriber = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        # 完整帧与加入订阅列表在同一锁内完成，不会错过或重复其间推送的增量
+        with self.lock:
+            if self.last_frame is not None:
+                subscriber.put_nowait(self._full_message(self.last_frame))
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def serve_websocket(self, handler: BaseHTTPRequestHandler, frame_server: FrameServer):
+        """在HTTP处理线程中推送更新，直到浏览器断开"""
+        handler.close_connection = True
+        if not websocket_handshake(handler):
+            return
+        subscriber = self.subscribe()
+        try:
+            while frame_server.running and not self.closed:
+                try:
+                    message = subscriber.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                websocket_send(handler.wfile, message)
+                self.bytes_sent += len(message)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+
+    def get_stats(self) -> dict:
+        """获取分块统计信息"""
+        return {
+            "frames": self.frames,
+            "skipped_frames": self.skipped_frames,
+            "full_frames": self.full_frames,
+            "tiles_sent": self.tiles_sent,
+            "tile_ratio": self.tiles_sent / self.tiles_total if self.tiles_total else 0.0,
+            "bytes_sent": self.bytes_sent,
+            "subscribers": len(self.subscribers),
+        }
+
+
+def _row_runs(mask: np.ndarray):
+    """逐行找出连续为True的区间 (行, 起始列, 结束列)"""
+    rows, cols = mask.shape
+    padded = np.zeros((rows, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    # argwhere 按行优先排序，每行的起点和终点一一对应
+    for (row, start), (_, end) in zip(starts, ends):
+        yield int(row), int(start), int(end)
+
+
+_streams: Dict[str, TileStream] = {}
+_streams_lock = threading.Lock()
+
+
+def _serve_tiles(handler: BaseHTTPRequestHandler, channel: str):
+    with _streams_lock:
+        stream = _streams.get(channel)
+    if stream is None:
+        handler.send_error(404, "Unknown channel")
+        return
+    stream.serve_websocket(handler, handler.server.frame_server)
+
+
+def _serve_tile_view(handler: BaseHTTPRequestHandler, channel: str):
+    body = TILE_VIEW_PAGE.format(channel=quote(channel)).encode("utf-8")
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/html; charset=utf-8")
+    handler.send_header("Cache-Control", "no-store")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def get_tile_stream(channel: str, frame_server: Optional[FrameServer] = None, **kwargs) -> TileStream:
+    """获取或创建设备的分块流，并注册 /tiles 与 /tileview 路由"""
+    frame_server = frame_server or get_frame_server()
+    frame_server.add_route("tiles", _serve_tiles)
+    frame_server.add_route("tileview", _serve_tile_view)
+    with _streams_lock:
+        stream = _streams.get(channel)
+        if stream is None:
+            stream = TileStream(**kwargs)
+            _streams[channel] = stream
+        return stream
+
+
+def remove_tile_stream(channel: str):
+    """移除设备的分块流，已连接的页面随之断开"""
+    with _streams_lock:
+        stream = _streams.pop(channel, None)
+    if stream is not None:
+        stream.closed = True
+
+
+def tile_view_url(channel: str, frame_server: Optional[FrameServer] = None, page=None) -> str:
+    """分块合成页面地址，page 为网页端的Flet页面时按其主机名生成"""
+    frame_server = frame_server or get_frame_server()
+    return f"{frame_server.base_url(page)}/tileview/{quote(channel)}"
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import flet as ft
+
+
+class UpdateDispatcher:
+    """线程安全的合并式UI更新调度器
+
+    任意线程（解码线程、定时器回调、UI事件处理）调用 schedule() 只登记需要更新的
+    控件并立即返回。第一次登记时在页面的事件循环上用 call_later 安排一个节拍后的
+    刷新（不占用执行器线程），节拍内对同一控件的多次登记合并为一次，所有控件在
+    一次 page.update(*controls) 中发送。
+    """
+
+    def __init__(self, page: ft.Page, tick: float = 1 / 60):
+        """
+        Args:
+            page: 所属页面
+            tick: 合并窗口（秒）
+        """
+        self.page = page
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.pending: "OrderedDict[int, ft.Control]" = OrderedDict()
+        self.pending_bytes = 0
+        self.flush_scheduled = False
+        self.closed = False
+
+        # 统计信息（累计）
+        self.scheduled = 0
+        self.merged = 0
+        self.batches = 0
+        self.controls_sent = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        # 每秒速率
+        self.window_start = time.time()
+        self.window_counts = [0, 0, 0]  # 控件更新数, 批次数, 字节数
+        self.rates = {"updates_per_sec": 0.0, "batches_per_sec": 0.0, "bytes_per_sec": 0.0}
+
+    def schedule(self, *controls: ft.Control, size: Optional[int] = None):
+        """登记需要更新的控件（任意线程调用，不阻塞）
+
+        Args:
+            controls: 需要更新的控件
+            size: 本次更新的数据量估计（字节），默认按图像的 src/src_base64 长度估计
+        """
+        if self.closed:
+            return
+        with self.lock:
+            for control in controls:
+                self.scheduled += 1
+                if id(control) in self.pending:
+                    self.merged += 1
+                    # 合并后只发送最新状态，替换之前的数据量估计
+                    self.pending_bytes -= _estimate_size(control)
+                self.pending[id(control)] = control
+            self.pending_bytes += size if size is not None else sum(_estimate_size(c) for c in controls)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        try:
+            self.page.loop.call_soon_threadsafe(self._arm_flush)
+        except Exception:
+            # 页面的事件循环已关闭
+            self.close()
+
+    def _arm_flush(self):
+        # 在事件循环线程中执行，call_later 不是线程安全的
+        self.page.loop.call_later(self.tick, self.flush)
+
+    def flush(self):
+        """立即发送所有已登记的更新"""
+        with self.lock:
+            controls = [c for c in self.pending.values() if c.page is not None]
+            size = max(self.pending_bytes, 0)
+            self.pending.clear()
+            self.pending_bytes = 0
+            self.flush_scheduled = False
+        if not controls or self.closed:
+            return
+        try:
+            self.page.update(*controls)
+        except Exception as e:
+            self.errors += 1
+            if "Event loop is closed" in str(e) or isinstance(e, ft.PageDisconnectedException):
+                print("检测到页面已断开，停止UI更新")
+                self.close()
+            else:
+                print(f"UI更新错误: {e}")
+            return
+        self.batches += 1
+        self.controls_sent += len(controls)
+        self.bytes_sent += size
+        self._count(len(controls), size)
+
+    def _count(self, controls: int, size: int):
+        now = time.time()
+        with self.lock:
+            self.window_counts[0] += controls
+            self.window_counts[1] += 1
+            self.window_counts[2] += size
+            elapsed = now - self.window_start
+            if elapsed >= 1.0:
+                updates, batches, size_total = self.window_counts
+                self.rates = {
+                    "updates_per_sec": updates / elapsed,
+                    "batches_per_sec": batches / elapsed,
+                    "bytes_per_sec": size_total / elapsed,
+                }
+                self.window_start = now
+                self.window_counts = [0, 0, 0]
+
+    def get_stats(self) -> dict:
+        """获取更新统计信息"""
+        stats = {
+            "scheduled": self.scheduled,
+            "merged": self.merged,
+            "batches": self.batches,
+            "controls_sent": self.controls_sent,
+            "bytes_sent": self.bytes_sent,
+            "errors": self.errors,
+        }
+        stats.update(self.rates)
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.pending.clear()
+
+
+def _estimate_size(control: ft.Control) -> int:
+    if isinstance(control, ft.Image):
+        return len(control.src_base64 or control.src or "")
+    return 0
+
+
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(page: ft.Page) -> UpdateDispatcher:
+    """获取页面的更新调度器（每个页面一个）"""
+    with _dispatchers_lock:
+        dispatcher = getattr(page, "update_dispatcher", None)
+        if dispatcher is None:
+            dispatcher = UpdateDispatcher(page)
+            setattr(page, "update_dispatcher", dispatcher)
+        return dispatcher
+
+
+def schedule_update(*controls: ft.Control, size: Optional[int] = None):
+    """登记控件更新，控件尚未添加到页面时忽略"""
+    for control in controls:
+        page = control.page
+        if page is not None:
+            get_dispatcher(page).schedule(control, size=size)
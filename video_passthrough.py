@@ -0,0 +1,510 @@
+"""H.264 直通播放（fMP4 over WebSocket）
+
+设备端编码的 H.264 包不在主机上解码和重新编码，只重新封装为 fragmented MP4：
+初始化段（ftyp+moov）由 PyAV 的 mp4 muxer 生成，之后每个视频包立即封装成
+一个 moof+mdat 片段推送给浏览器，由 Media Source Extensions 播放。
+
+路由（注册在旁路帧服务上）:
+    GET /fmp4/<channel>   WebSocket：文本消息为 MIME codec 字符串，二进制消息为初始化段/片段
+    GET /mse/<channel>    基于 MSE 的播放页面
+
+用法示例:
+    client = Client(device=serial, decode=False)
+    stream = attach_passthrough(client, serial)
+    client.start(threaded=True)
+    print(passthrough_url(serial))
+
+自检（使用 libx264 生成测试码流，重新封装后用 PyAV 解码验证）:
+    python video_passthrough.py
+"""
+import io
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+from fractions import Fraction
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import av
+
+from frame_server import FrameServer, get_frame_server, websocket_handshake, websocket_send
+
+# 添加scrcpy模块路径
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scrcpy'))
+import scrcpy.const as const
+
+
+# scrcpy 的 pts 单位为微秒，轨道时间刻度保持一致
+TIMESCALE = 1000000
+TRACK_ID = 1
+# 缺少下一帧时间戳时使用的帧时长估计（微秒）
+DEFAULT_FRAME_DURATION = 16667
+MAX_FRAME_DURATION = 100000
+
+SAMPLE_FLAGS_SYNC = 0x02000000  # sample_depends_on=2（不依赖其他帧）
+SAMPLE_FLAGS_NON_SYNC = 0x01010000  # sample_depends_on=1, is_non_sync_sample=1
+
+NAL_START_CODE = re.compile(b"\x00\x00\x01")
+
+# 订阅者队列上限（不含加入时回放的GOP缓存），超过说明浏览器跟不上，丢弃积压并从下一个关键帧重新开始
+SUBSCRIBER_QUEUE_SIZE = 120
+# GOP 缓存上限（字节），新订阅者可以立即从最近的关键帧开始播放
+GOP_CACHE_LIMIT = 8 * 1024 * 1024
+
+MSE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{channel}</title>
+<style>html,body{{margin:0;height:100%;background:#222}}video{{width:100%;height:100%;object-fit:contain}}</style>
+</head><body><video id="v" autoplay muted playsinline></video><script>
+const video = document.getElementById("v");
+let mediaSource = null, sourceBuffer = null, pending = [], codec = null;
+
+function reset(mime) {{
+  codec = mime; pending = []; sourceBuffer = null;
+  mediaSource = new MediaSource();
+  video.src = URL.createObjectURL(mediaSource);
+  mediaSource.addEventListener("sourceopen", () => {{
+    sourceBuffer = mediaSource.addSourceBuffer(codec);
+    sourceBuffer.mode = "sequence";
+    sourceBuffer.addEventListener("updateend", pump);
+    pump();
+  }});
+}}
+
+function pump() {{
+  if (!sourceBuffer || sourceBuffer.updating || !pending.length) return;
+  sourceBuffer.appendBuffer(pending.shift());
+  // 实时画面：播放位置始终贴近缓冲区末尾
+  const buffered = video.buffered;
+  if (buffered.length) {{
+    const end = buffered.end(buffered.length - 1);
+    if (end - video.currentTime > 0.15) video.currentTime = end - 0.01;
+    if (end - buffered.start(0) > 30 && !sourceBuffer.updating) sourceBuffer.remove(0, end - 10);
+  }}
+}}
+
+const ws = new WebSocket(`ws://${{location.host}}/fmp4/{channel}`);
+ws.binaryType = "arraybuffer";
+ws.onmessage = (e) => {{
+  if (typeof e.data === "string") {{ reset(e.data); return; }}
+  pending.push(e.data);
+  pump();
+  if (video.paused) video.play().catch(() => {{}});
+}};
+</script></body></html>
+"""
+
+
+def split_annexb(data: bytes) -> List[bytes]:
+    """按起始码拆分 Annex-B 码流，返回不含起始码的 NAL 单元"""
+    starts = [m.end() for m in NAL_START_CODE.finditer(data)]
+    nals = []
+    for i, start in enumerate(starts):
+        end = len(data) if i + 1 == len(starts) else starts[i + 1] - 3
+        # 4字节起始码多出的前导0属于上一个NAL的结尾
+        nal = data[start:end].rstrip(b"\x00") if i + 1 < len(starts) else data[start:end]
+        if nal:
+            nals.append(nal)
+    return nals
+
+
+def annexb_to_avcc(data: bytes) -> bytes:
+    """Annex-B 转为 MP4 使用的4字节长度前缀格式，去掉参数集和AUD"""
+    return b"".join(
+        struct.pack(">I", len(nal)) + nal
+        for nal in split_annexb(data)
+        if nal[0] & 0x1F not in (7, 8, 9)
+    )
+
+
+def codec_string(config: bytes) -> str:
+    """根据 SPS 生成 MSE 使用的 MIME 类型，如 video/mp4; codecs="avc1.64001f\""""
+    for nal in split_annexb(config):
+        if nal[0] & 0x1F == 7 and len(nal) >= 4:
+            return f'video/mp4; codecs="avc1.{nal[1:4].hex()}"'
+    raise ValueError("配置包中没有SPS")
+
+
+def _box(kind: bytes, *payload: bytes) -> bytes:
+    body = b"".join(payload)
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+def _full_box(kind: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return _box(kind, struct.pack(">I", (version << 24) | flags), *payload)
+
+
+class _SegmentWriter:
+    """PyAV 输出用的类文件对象，收集写入的字节"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+
+class Fmp4Remuxer:
+    """把 scrcpy 视频包重新封装为 fMP4，不解码也不编码
+
+    feed() 返回需要发送的 (类型, 数据) 列表，类型为 "codec"、"init" 或 "fragment"。
+    初始化段在收到参数集后的第一个关键帧时生成；参数集变化（例如屏幕旋转）时重新生成。
+    """
+
+    def __init__(self):
+        self.config: Optional[bytes] = None
+        self.codec: Optional[str] = None
+        self.init_segment: Optional[bytes] = None
+        self.sequence = 0
+        self.base_pts: Optional[int] = None
+        self.last_pts: Optional[int] = None
+        self.frame_duration = DEFAULT_FRAME_DURATION
+        self.config_changed = False
+
+    def feed(self, packet) -> List[Tuple[str, bytes]]:
+        """处理一个 VideoPacket"""
+        if packet.config:
+            if packet.data != self.config:
+                self.config = packet.data
+                self.config_changed = True
+            return []
+        if self.config is None:
+            return []
+
+        output = []
+        if self.config_changed or self.init_segment is None:
+            # 初始化段必须从关键帧开始
+            if not packet.key_frame:
+                return []
+            self.init_segment = self._build_init_segment(packet.data)
+            self.codec = codec_string(self.config)
+            self.config_changed = False
+            self.base_pts = packet.pts
+            self.last_pts = None
+            output.append(("codec", self.codec.encode("utf-8")))
+            output.append(("init", self.init_segment))
+
+        output.append(("fragment", self._build_fragment(packet)))
+        return output
+
+    def _build_init_segment(self, key_frame: bytes) -> bytes:
+        """用 PyAV 的 mp4 muxer 写出 ftyp+moov（空的moov，样本全部在片段中）"""
+        probe = av.open(io.BytesIO(self.config + key_frame), format="h264")
+        try:
+            writer = _SegmentWriter()
+            container = av.open(
+                writer, "w", format="mp4",
+                options={
+                    "movflags": "empty_moov+default_base_moof",
+                    "video_track_timescale": str(TIMESCALE),
+                },
+            )
+            container.add_stream(template=probe.streams.video[0])
+            container.start_encoding()
+            # 关闭时写入的尾部不属于初始化段
+            init_segment = bytes(writer.buffer)
+            container.close()
+            return init_segment
+        finally:
+            probe.close()
+
+    def _build_fragment(self, packet) -> bytes:
+        """为单个视频包生成 moof+mdat"""
+        pts = packet.pts
+        if self.last_pts is not None and pts > self.last_pts:
+            self.frame_duration = min(pts - self.last_pts, MAX_FRAME_DURATION)
+        self.last_pts = pts
+        decode_time = max(pts - self.base_pts, 0)
+        sample = annexb_to_avcc(packet.data)
+        flags = SAMPLE_FLAGS_SYNC if packet.key_frame else SAMPLE_FLAGS_NON_SYNC
+        self.sequence += 1
+
+        def moof(data_offset: int) -> bytes:
+            return _box(
+                b"moof",
+                _full_box(b"mfhd", 0, 0, struct.pack(">I", self.sequence)),
+                _box(
+                    b"traf",
+                    # default-base-is-moof
+                    _full_box(b"tfhd", 0, 0x020000, struct.pack(">I", TRACK_ID)),
+                    _full_box(b"tfdt", 1, 0, struct.pack(">Q", decode_time)),
+                    # data-offset, sample-duration, sample-size, sample-flags
+                    _full_box(
+                        b"trun", 0, 0x000701,
+                        struct.pack(">IiIII", 1, data_offset, self.frame_duration, len(sample), flags),
+                    ),
+                ),
+            )
+
+        header_size = len(moof(0))
+        return moof(header_size + 8) + _box(b"mdat", sample)
+
+
+class PassthroughStream:
+    """单个设备的直通流：接收 Client 的 packet 事件并分发给 WebSocket 订阅者"""
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client: Client 实例，用于在新订阅者需要关键帧时请求 reset_video
+        """
+        self.client = client
+        self.remuxer = Fmp4Remuxer()
+        self.lock = threading.Lock()
+        self.subscribers: List[queue.Queue] = []
+        # 流被移除（设备断开或重新连接）后置位，推送循环随之退出
+        self.closed = False
+        # 最近一个关键帧开始的片段（为空或第一个片段是关键帧），新订阅者先收到这些片段
+        self.gop: List[bytes] = []
+        self.gop_size = 0
+
+        # 统计信息
+        self.packets = 0
+        self.fragments = 0
+        self.bytes_sent = 0
+        self.dropped_subscribers = 0
+
+    def on_packet(self, packet):
+        """Client 的 packet 事件回调（视频线程）"""
+        self.packets += 1
+        try:
+            segments = self.remuxer.feed(packet)
+        except (av.AVError, ValueError) as e:
+            print(f"❌ 视频封装失败: {e}")
+            return
+        if not segments:
+            return
+        with self.lock:
+            for kind, data in segments:
+                if kind == "fragment":
+                    self.fragments += 1
+                    if packet.key_frame:
+                        self.gop = []
+                        self.gop_size = 0
+                    if self.gop_size + len(data) <= GOP_CACHE_LIMIT:
+                        self.gop.append(data)
+                        self.gop_size += len(data)
+                    else:
+                        # 关键帧间隔太长，缓存失效，新订阅者需要请求关键帧
+                        self.gop = []
+                        self.gop_size = GOP_CACHE_LIMIT + 1
+                elif kind == "init":
+                    self.gop = []
+                    self.gop_size = 0
+                for subscriber in list(self.subscribers):
+                    try:
+                        subscriber.put_nowait((kind, data))
+                    except queue.Full:
+                        self._resync(subscriber)
+
+    def _resync(self, subscriber: queue.Queue):
+        """订阅者积压过多：清空队列，重新发送初始化段并请求关键帧"""
+        self.dropped_subscribers += 1
+        while not subscriber.empty():
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        self._prime(subscriber, request_key_frame=True)
+
+    def _prime(self, subscriber: queue.Queue, request_key_frame: bool = False):
+        """向订阅者发送 codec、初始化段和GOP缓存（调用方持有锁）
+
+        GOP 必须从关键帧开始完整回放，否则浏览器无法解码；放不下时改为请求关键帧。
+        """
+        if self.remuxer.init_segment is None:
+            return
+        subscriber.put_nowait(("codec", self.remuxer.codec.encode("utf-8")))
+        subscriber.put_nowait(("init", self.remuxer.init_segment))
+        free = subscriber.maxsize - subscriber.qsize() if subscriber.maxsize > 0 else len(self.gop)
+        if self.gop and not request_key_frame and len(self.gop) <= free:
+            for fragment in self.gop:
+                subscriber.put_nowait(("fragment", fragment))
+        else:
+            self.request_key_frame()
+
+    def request_key_frame(self):
+        """请求设备重置视频流，使其立即发送参数集和关键帧"""
+        if self.client is not None and self.client.alive:
+            try:
+                self.client.control.reset_video()
+            except Exception as e:
+                print(f"❌ 请求关键帧失败: {e}")
+
+    def subscribe(self) -> queue.Queue:
+        with self.lock:
+            # 队列额外留出整个GOP缓存（codec、初始化段和关键帧起的所有片段）的空间
+            subscriber = queue.Queue(SUBSCRIBER_QUEUE_SIZE + len(self.gop) + 2)
+            self._prime(subscriber)
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def serve_websocket(self, handler: BaseHTTPRequestHandler, frame_server: FrameServer):
+        """在HTTP处理线程中推送片段，直到浏览器断开"""
+        handler.close_connection = True
+        if not websocket_handshake(handler):
+            return
+        subscriber = self.subscribe()
+        try:
+            while frame_server.running and not self.closed:
+                try:
+                    kind, data = subscriber.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                websocket_send(handler.wfile, data, opcode=0x1 if kind == "codec" else 0x2)
+                self.bytes_sent += len(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+
+    def get_stats(self) -> dict:
+        """获取直通流统计信息"""
+        return {
+            "packets": self.packets,
+            "fragments": self.fragments,
+            "bytes_sent": self.bytes_sent,
+            "subscribers": len(self.subscribers),
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+_streams: Dict[str, PassthroughStream] = {}
+_streams_lock = threading.Lock()
+
+
+def _serve_fmp4(handler: BaseHTTPRequestHandler, channel: str):
+    with _streams_lock:
+        stream = _streams.get(channel)
+    if stream is None:
+        handler.send_error(404, "Unknown channel")
+        return
+    stream.serve_websocket(handler, handler.server.frame_server)
+
+
+def _serve_mse_page(handler: BaseHTTPRequestHandler, channel: str):
+    body = MSE_PAGE.format(channel=quote(channel)).encode("utf-8")
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/html; charset=utf-8")
+    handler.send_header("Cache-Control", "no-store")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def attach_passthrough(client, channel: str, frame_server: Optional[FrameServer] = None) -> PassthroughStream:
+    """为 Client 创建直通流并注册到帧服务的 /fmp4 与 /mse 路由"""
+    frame_server = frame_server or get_frame_server()
+    frame_server.add_route("fmp4", _serve_fmp4)
+    frame_server.add_route("mse", _serve_mse_page)
+    stream = PassthroughStream(client)
+    with _streams_lock:
+        old = _streams.get(channel)
+        _streams[channel] = stream
+    _remove_listener(old)
+    client.add_listener(const.EVENT_PACKET, stream.on_packet)
+    return stream
+
+
+def detach_passthrough(channel: str):
+    """移除直通流并取消 Client 的 packet 监听"""
+    with _streams_lock:
+        stream = _streams.pop(channel, None)
+    _remove_listener(stream)
+
+
+def _remove_listener(stream: Optional[PassthroughStream]):
+    """停止被替换或移除的流：已连接的页面断开，packet 监听取消"""
+    if stream is None:
+        return
+    stream.closed = True
+    if stream.client is not None:
+        try:
+            stream.client.remove_listener(const.EVENT_PACKET, stream.on_packet)
+        except ValueError:
+            pass
+
+
+def passthrough_url(channel: str, frame_server: Optional[FrameServer] = None, page=None) -> str:
+    """MSE 播放页面地址，page 为网页端的Flet页面时按其主机名生成"""
+    frame_server = frame_server or get_frame_server()
+    return f"{frame_server.base_url(page)}/mse/{quote(channel)}"
+
+
+def verify_fmp4(data: bytes) -> dict:
+    """用 PyAV 解封装并解码 fMP4 数据，返回帧数、分辨率和时间戳"""
+    container = av.open(io.BytesIO(data), format="mp4")
+    try:
+        stream = container.streams.video[0]
+        frames = list(container.decode(stream))
+        return {
+            "codec": stream.codec_context.name,
+            "width": stream.codec_context.width,
+            "height": stream.codec_context.height,
+            "frames": len(frames),
+            "pts": [int(frame.pts * frame.time_base * TIMESCALE) for frame in frames],
+        }
+    finally:
+        container.close()
+
+
+def _self_check(frame_count: int = 90, width: int = 480, height: int = 800) -> bool:
+    """用 libx264 模拟 scrcpy 码流（配置包独立发送），封装后验证"""
+    import numpy as np
+    from scrcpy.core import VideoPacket
+
+    encoder = av.CodecContext.create("libx264", "w")
+    encoder.width = width
+    encoder.height = height
+    encoder.pix_fmt = "yuv420p"
+    encoder.time_base = Fraction(1, 60)
+    encoder.options = {"tune": "zerolatency", "bf": "0", "keyint": "30"}
+
+    packets = []
+    for i in range(frame_count + 1):
+        if i < frame_count:
+            image = np.zeros((height, width, 3), np.uint8)
+            image[:, : (i * 7) % width] = (40, 160, 220)
+            frame = av.VideoFrame.from_ndarray(image, format="bgr24")
+            frame.pts = i
+            encoded = encoder.encode(frame)
+        else:
+            encoded = encoder.encode(None)
+        for packet in encoded:
+            data = bytes(packet)
+            pts = int(packet.pts * packet.time_base * TIMESCALE)
+            nals = split_annexb(data)
+            config = [nal for nal in nals if nal[0] & 0x1F in (7, 8)]
+            if config:
+                packets.append(VideoPacket(b"".join(b"\x00\x00\x00\x01" + nal for nal in config), None, True, False))
+            media = b"".join(b"\x00\x00\x00\x01" + nal for nal in nals if nal[0] & 0x1F not in (7, 8))
+            packets.append(VideoPacket(media, pts, False, packet.is_keyframe))
+
+    remuxer = Fmp4Remuxer()
+    output = bytearray()
+    for packet in packets:
+        for kind, data in remuxer.feed(packet):
+            if kind != "codec":
+                output += data
+    result = verify_fmp4(bytes(output))
+    expected = [p.pts for p in packets if not p.config]
+    ok = (result["frames"] == frame_count and result["width"] == width
+          and result["height"] == height and result["pts"] == expected)
+    print(f"编码格式: {remuxer.codec}")
+    print(f"fMP4大小: {len(output)} 字节, 解码帧数: {result['frames']}/{frame_count}, "
+          f"分辨率: {result['width']}x{result['height']}")
+    print("✅ fMP4 封装验证通过" if ok else "❌ fMP4 封装验证失败")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if _self_check() else 1)